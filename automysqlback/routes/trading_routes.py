@@ -16,6 +16,8 @@ logger = logging.getLogger(__name__)
 
 INITIAL_CAPITAL = 30000.0
 LEVERAGE = 10.0
+# 与 trading/strategies/settings.py 的 MOMENTUM_LOOKBACK 保持一致
+MOMENTUM_LOOKBACK = 30
 
 
 def _get_conn():
@@ -425,6 +427,52 @@ def get_trading_account_summary():
         conn.close()
 
 
+_METRIC_FLOAT_FIELDS = (
+    "equity", "peak_equity", "drawdown", "max_drawdown", "total_return", "sharpe", "win_rate", "sum_trade_pnl_pct",
+)
+
+
+@trading_bp.route("/trading/account/metrics", methods=["GET"])
+def get_trading_account_metrics():
+    conn = _get_conn()
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        requested_date = request.args.get("date", "").strip()
+        sql = (
+            "SELECT record_date, trading_days, equity, peak_equity, drawdown, max_drawdown, total_return, "
+            "sharpe, closed_trades, win_trades, win_rate, sum_trade_pnl_pct, sector_pnl_json "
+            "FROM trading_account_metrics "
+        )
+        if requested_date:
+            cursor.execute(sql + "WHERE record_date<=%s ORDER BY record_date DESC LIMIT 1", (requested_date,))
+        else:
+            cursor.execute(sql + "ORDER BY record_date DESC LIMIT 1")
+        row = cursor.fetchone()
+        if not row:
+            return _ok({"metrics": None})
+
+        closed = int(row["closed_trades"])
+        sector_pnl = {k: float(v) for k, v in _parse_json(row["sector_pnl_json"]).items()}
+        metrics = {
+            "record_date": _date_str(row["record_date"]),
+            "trading_days": int(row["trading_days"]),
+            **{k: (float(row[k]) if row[k] is not None else None) for k in _METRIC_FLOAT_FIELDS},
+            "closed_trades": closed,
+            "win_trades": int(row["win_trades"]),
+            "avg_trade_pnl_pct": float(row["sum_trade_pnl_pct"]) / closed if closed else None,
+            "sector_pnl": [
+                {"sector": k, "pnl": v} for k, v in sorted(sector_pnl.items(), key=lambda kv: -kv[1])
+            ],
+        }
+        return _ok({"metrics": metrics})
+    except Exception as exc:
+        logger.error("获取账户指标失败: %s", exc)
+        return _err(f"获取失败: {exc}")
+    finally:
+        cursor.close()
+        conn.close()
+
+
 # ──────────────────────────────────────────────
 # 池子A品种列表
 # ──────────────────────────────────────────────
@@ -534,6 +582,35 @@ def patch_trading_pool_variety(variety_id):
 # 市场上下文（主力/散户/收盘价序列）
 # ──────────────────────────────────────────────
 
+def _optional_float(value):
+    return float(value) if value is not None else None
+
+
+def _context_features(rows, days):
+    """在按日期升序的原始行上补算 main_diff / retail_diff / m3 / main_score，口径与 compute_features 一致。
+
+    rows 需包含返回区间之前至少 MOMENTUM_LOOKBACK + 2 行历史（不足时即为全部历史），只返回最后 days 行。
+    """
+    main = [float(r["main_force"]) for r in rows]
+    retail = [float(r["retail"]) for r in rows]
+    m3 = [main[i] - main[i - 2] if i >= 2 else None for i in range(len(rows))]
+    out = []
+    for i, r in enumerate(rows):
+        hist = m3[i - MOMENTUM_LOOKBACK:i] if i >= MOMENTUM_LOOKBACK else []
+        score = None
+        if m3[i] is not None and len(hist) == MOMENTUM_LOOKBACK and None not in hist:
+            current = abs(m3[i])
+            score = sum(1 for v in hist if abs(v) <= current) / MOMENTUM_LOOKBACK
+        out.append({
+            **r,
+            "main_diff": main[i] - main[i - 1] if i >= 1 else None,
+            "retail_diff": retail[i] - retail[i - 1] if i >= 1 else None,
+            "m3": m3[i],
+            "main_score": score,
+        })
+    return out[-days:]
+
+
 @trading_bp.route("/trading/market-context", methods=["GET"])
 def get_trading_market_context():
     conn = _get_conn()
@@ -544,35 +621,78 @@ def get_trading_market_context():
             return _err("缺少 variety_id 参数")
         days = min(max(int(request.args.get("days", 10)), 3), 60)
         end_date = request.args.get("end_date", "").strip()
-        if not end_date:
-            cursor.execute(
-                "SELECT MAX(trade_date) AS d FROM fut_strength WHERE variety_id=%s",
-                (int(variety_id),),
-            )
-            row = cursor.fetchone()
-            end_date = _date_str(row["d"]) if row and row.get("d") else None
 
+        # end_date 可能不是交易日：以截至 end_date 的最后一个完整交易日作为两条路径共同的截止日
+        raw_where = (
+            "s.variety_id=%s AND s.main_force IS NOT NULL AND s.retail IS NOT NULL "
+            "AND c.close_price IS NOT NULL"
+        )
+        raw_args = [int(variety_id)]
+        if end_date:
+            raw_where += " AND s.trade_date<=%s"
+            raw_args.append(end_date)
         cursor.execute(
-            """
-            SELECT s.variety_id,
-                   COALESCE(v.name, CAST(s.variety_id AS CHAR)) AS variety_name,
-                   s.trade_date, s.main_force, s.retail, c.close_price
+            f"""
+            SELECT MAX(s.trade_date) AS d
             FROM fut_strength s
             INNER JOIN fut_daily_close c
                 ON s.variety_id=c.variety_id AND s.trade_date=c.trade_date
-            LEFT JOIN fut_variety v ON s.variety_id=v.id
-            WHERE s.variety_id=%s AND s.trade_date<=%s
-            ORDER BY s.trade_date DESC LIMIT %s
+            WHERE {raw_where}
             """,
-            (int(variety_id), end_date, days),
+            tuple(raw_args),
         )
-        rows = list(reversed(cursor.fetchall()))
+        row = cursor.fetchone()
+        last_date = _date_str(row["d"]) if row and row.get("d") else None
+        end_date = end_date or last_date
+
+        # 优先读取 trading_features 预计算特征；特征库缺表或尚未同步到截止日时由原始强度表补算同样的字段
+        rows = []
+        if last_date:
+            try:
+                cursor.execute(
+                    """
+                    SELECT f.variety_id,
+                           COALESCE(v.name, CAST(f.variety_id AS CHAR)) AS variety_name,
+                           f.trade_date, f.main_force, f.retail, f.close AS close_price,
+                           f.main_diff, f.retail_diff, f.m3, f.main_score
+                    FROM trading_features f
+                    LEFT JOIN fut_variety v ON f.variety_id=v.id
+                    WHERE f.variety_id=%s AND f.trade_date<=%s
+                    ORDER BY f.trade_date DESC LIMIT %s
+                    """,
+                    (int(variety_id), last_date, days),
+                )
+                rows = list(reversed(cursor.fetchall()))
+            except pymysql.err.ProgrammingError as exc:
+                if exc.args[0] != 1146:
+                    raise
+                logger.warning("trading_features 不存在，市场上下文回退原始强度表")
+        if last_date and (not rows or _date_str(rows[-1]["trade_date"]) != last_date):
+            cursor.execute(
+                f"""
+                SELECT s.variety_id,
+                       COALESCE(v.name, CAST(s.variety_id AS CHAR)) AS variety_name,
+                       s.trade_date, s.main_force, s.retail, c.close_price
+                FROM fut_strength s
+                INNER JOIN fut_daily_close c
+                    ON s.variety_id=c.variety_id AND s.trade_date=c.trade_date
+                LEFT JOIN fut_variety v ON s.variety_id=v.id
+                WHERE {raw_where}
+                ORDER BY s.trade_date DESC LIMIT %s
+                """,
+                (*raw_args, days + MOMENTUM_LOOKBACK + 2),
+            )
+            rows = _context_features(list(reversed(cursor.fetchall())), days)
         series = [
             {
                 "trade_date": _date_str(r["trade_date"]),
                 "main_force": float(r["main_force"]),
                 "retail": float(r["retail"]),
                 "close_price": float(r["close_price"]),
+                "main_diff": _optional_float(r["main_diff"]),
+                "retail_diff": _optional_float(r["retail_diff"]),
+                "m3": _optional_float(r["m3"]),
+                "main_score": _optional_float(r["main_score"]),
             }
             for r in rows
         ]
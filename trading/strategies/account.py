@@ -6,11 +6,13 @@ pnl_pct 存储无杠杆收益率，资金曲线 daily_pnl 乘以 LEVERAGE。
 from __future__ import annotations
 
 import logging
-from datetime import date
+from collections.abc import Callable
+from datetime import date, timedelta
 
 import pymysql
 
-from .settings import INITIAL_CAPITAL, LEVERAGE, SIZE_PCT
+from .account_metrics import load_metrics_before, next_metrics, rebuild_account_metrics, save_metrics
+from .settings import DEFAULT_SECTOR, INITIAL_CAPITAL, LEVERAGE, SIZE_PCT
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +38,72 @@ def _get_prev_close(conn: pymysql.Connection, variety_id: int, trade_date: date)
     return float(row["close_price"]) if row else None
 
 
+def _prefetch_close_prices(
+    conn: pymysql.Connection, variety_ids: list[int], trade_date: date
+) -> dict[int, float]:
+    """一次 IN 查询取回多个品种在 trade_date 的收盘价。"""
+    if not variety_ids:
+        return {}
+    vids = sorted(set(variety_ids))
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT variety_id, close_price FROM fut_daily_close "
+            f"WHERE trade_date=%s AND variety_id IN ({','.join(['%s'] * len(vids))})",
+            (trade_date, *vids),
+        )
+        return {int(r["variety_id"]): float(r["close_price"]) for r in cur.fetchall()}
+
+
+CLOSE_POSITION_SQL = (
+    "UPDATE trading_positions SET status='closed', close_date=%s, "
+    "close_price=%s, pnl_pct=%s, close_signal_id=%s WHERE id=%s"
+)
+
+_RELINK_POSITION_SQL = (
+    "UPDATE trading_positions SET operation_id=%s, open_operation_id=%s, "
+    "open_signal_id=%s, theory_cycle_id=%s WHERE id=%s"
+)
+
+_OPEN_POSITION_SQL = """
+    INSERT INTO trading_positions
+        (operation_id, open_operation_id, open_signal_id, theory_cycle_id,
+         variety_id, variety_name, sector, direction,
+         open_date, open_price, size_pct, status)
+    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,'open')
+"""
+
+UPSERT_ACCOUNT_SQL = """
+    INSERT INTO trading_account_daily (record_date, equity, cash, position_val, daily_pnl)
+    VALUES (%s,%s,%s,%s,%s)
+    ON DUPLICATE KEY UPDATE
+        equity=VALUES(equity), cash=VALUES(cash),
+        position_val=VALUES(position_val), daily_pnl=VALUES(daily_pnl)
+"""
+
+
+def match_close_signals(open_positions: list[dict], close_signals: list[dict]) -> list[tuple[dict, dict]]:
+    """按 (variety_id, direction, theory_cycle_id) 把开放持仓与当日理论平仓信号配对。"""
+    by_key: dict[tuple[int, str, str | None], dict] = {}
+    for r in close_signals:
+        by_key[(int(r["variety_id"]), r["direction"], r["cycle_id"])] = r
+    return [
+        (pos, by_key[key])
+        for pos in open_positions
+        if (key := (int(pos["variety_id"]), pos["direction"], pos.get("theory_cycle_id"))) in by_key
+    ]
+
+
+def close_pnl_pct(direction: str, open_price: float, close_price: float) -> float:
+    """无杠杆平仓收益率。"""
+    if direction == "LONG":
+        return (close_price - open_price) / open_price
+    return (open_price - close_price) / open_price
+
+
+def open_direction(op: dict) -> str:
+    return op["direction"] or ("LONG" if op["signal_type"] == "A_OPEN_LONG" else "SHORT")
+
+
 def execute_close_signals(conn: pymysql.Connection, signal_date: date) -> set[int]:
     with conn.cursor() as cur:
         cur.execute(
@@ -43,9 +111,7 @@ def execute_close_signals(conn: pymysql.Connection, signal_date: date) -> set[in
             "WHERE signal_date=%s AND signal_role='close'",
             (signal_date,),
         )
-        close_signals: dict[tuple[int, str, str | None], dict] = {}
-        for r in cur.fetchall():
-            close_signals[(int(r["variety_id"]), r["direction"], r["cycle_id"])] = r
+        close_signals = cur.fetchall()
 
         cur.execute(
             "SELECT id, variety_id, direction, open_price, theory_cycle_id "
@@ -53,47 +119,40 @@ def execute_close_signals(conn: pymysql.Connection, signal_date: date) -> set[in
         )
         open_positions = cur.fetchall()
 
+    to_close = match_close_signals(open_positions, close_signals)
+    prices = _prefetch_close_prices(conn, [int(pos["variety_id"]) for pos, _ in to_close], signal_date)
+
     # 读取阶段：计算所有平仓参数，不写库
     updates: list[tuple] = []
     closed_today: set[int] = set()
-    for pos in open_positions:
+    for pos, close_signal in to_close:
         vid = int(pos["variety_id"])
         direction = pos["direction"]
-        cycle_id = pos.get("theory_cycle_id")
-        close_signal = close_signals.get((vid, direction, cycle_id))
-        if close_signal is None:
-            continue
-
-        close_price = _get_close_price(conn, vid, signal_date)
+        close_price = prices.get(vid)
         if close_price is None:
             logger.warning("品种 %s 当日无收盘价，跳过平仓", vid)
             continue
 
-        open_price = float(pos["open_price"])
-        if direction == "LONG":
-            pnl_pct = (close_price - open_price) / open_price
-        else:
-            pnl_pct = (open_price - close_price) / open_price
-
+        pnl_pct = close_pnl_pct(direction, float(pos["open_price"]), close_price)
         updates.append((signal_date, close_price, pnl_pct, close_signal["id"], pos["id"]))
         closed_today.add(vid)
         logger.info("平仓 variety_id=%s direction=%s pnl_pct=%.4f", vid, direction, pnl_pct)
 
     # 写入阶段：批量提交，保证原子性
     if updates:
-        with conn.cursor() as cur:
-            for args in updates:
-                cur.execute(
-                    "UPDATE trading_positions SET status='closed', close_date=%s, "
-                    "close_price=%s, pnl_pct=%s, close_signal_id=%s WHERE id=%s",
-                    args,
-                )
-        conn.commit()
+        try:
+            with conn.cursor() as cur:
+                cur.executemany(CLOSE_POSITION_SQL, updates)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
 
     return closed_today
 
 
-def execute_open_operations(conn: pymysql.Connection, signal_date: date, closed_today: set[int]) -> None:
+def execute_open_operations(conn: pymysql.Connection, signal_date: date, closed_today: set[int]) -> int:
+    """按当日入选建议开仓，返回新开仓数（已有持仓的回填不计入）。"""
     with conn.cursor() as cur:
         cur.execute(
             "SELECT id, signal_id, variety_id, variety_name, sector, signal_type, "
@@ -104,37 +163,40 @@ def execute_open_operations(conn: pymysql.Connection, signal_date: date, closed_
         )
         selected = cur.fetchall()
 
+    candidates = [op for op in selected if int(op["variety_id"]) not in closed_today]
+    if not candidates:
+        return 0
+    vids = sorted({int(op["variety_id"]) for op in candidates})
+    prices = _prefetch_close_prices(conn, vids, signal_date)
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT id, variety_id FROM trading_positions "
+            f"WHERE open_date=%s AND status='open' AND variety_id IN ({','.join(['%s'] * len(vids))}) "
+            f"ORDER BY id",
+            (signal_date, *vids),
+        )
+        existing: dict[int, int] = {}
+        for r in cur.fetchall():
+            existing.setdefault(int(r["variety_id"]), int(r["id"]))
+
     # 读取阶段：准备所有开仓参数，不写库
+    relinks: list[tuple] = []
     inserts: list[tuple] = []
-    for op in selected:
+    for op in candidates:
         vid = int(op["variety_id"])
-        if vid in closed_today:
+
+        # 幂等保护：该品种当日已有 open 持仓则只回填来源字段，防止重跑时重复开仓
+        if vid in existing:
+            relinks.append((op["id"], op["id"], op["signal_id"], op["signal_cycle_id"], existing[vid]))
+            logger.debug("品种 %s 当日已有持仓，跳过重复开仓", vid)
             continue
 
-        # 幂等保护：该品种当日已有 open 持仓则跳过，防止重跑时重复开仓
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT id FROM trading_positions "
-                "WHERE variety_id=%s AND open_date=%s AND status='open'",
-                (vid, signal_date),
-            )
-            existing = cur.fetchone()
-            if existing:
-                cur.execute(
-                    "UPDATE trading_positions SET operation_id=%s, open_operation_id=%s, "
-                    "open_signal_id=%s, theory_cycle_id=%s WHERE id=%s",
-                    (op["id"], op["id"], op["signal_id"], op["signal_cycle_id"], existing["id"]),
-                )
-                conn.commit()
-                logger.debug("品种 %s 当日已有持仓，跳过重复开仓", vid)
-                continue
-
-        close_price = _get_close_price(conn, vid, signal_date)
+        close_price = prices.get(vid)
         if close_price is None:
             logger.warning("品种 %s 当日无收盘价，跳过开仓", vid)
             continue
 
-        direction = op["direction"] or ("LONG" if op["signal_type"] == "A_OPEN_LONG" else "SHORT")
+        direction = open_direction(op)
         inserts.append((
             op["id"], op["id"], op["signal_id"], op["signal_cycle_id"],
             vid, op["variety_name"], op["sector"], direction,
@@ -142,50 +204,37 @@ def execute_open_operations(conn: pymysql.Connection, signal_date: date, closed_
         ))
         logger.info("开仓 variety_id=%s direction=%s price=%.4f", vid, direction, close_price)
 
-    # 写入阶段：批量提交，保证原子性
-    if inserts:
-        with conn.cursor() as cur:
-            for args in inserts:
-                cur.execute(
-                    """
-                    INSERT INTO trading_positions
-                        (operation_id, open_operation_id, open_signal_id, theory_cycle_id,
-                         variety_id, variety_name, sector, direction,
-                         open_date, open_price, size_pct, status)
-                    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,'open')
-                    """,
-                    args,
-                )
-        conn.commit()
-
-
-def update_account_daily(conn: pymysql.Connection, signal_date: date) -> None:
-    # 只取当天之前的最新一行，避免同一天重跑时把今天已写入的 equity 当作 prev_equity
-    with conn.cursor() as cur:
-        cur.execute(
-            "SELECT equity FROM trading_account_daily "
-            "WHERE record_date<%s ORDER BY record_date DESC LIMIT 1",
-            (signal_date,),
-        )
-        last = cur.fetchone()
-        prev_equity = float(last["equity"]) if last else INITIAL_CAPITAL
-
-        # 仍开放的持仓：贡献 daily_pnl + position_val
-        cur.execute(
-            "SELECT variety_id, direction, open_price, open_date, size_pct "
-            "FROM trading_positions WHERE status='open'"
-        )
-        open_pos = cur.fetchall()
-
-        # 今日刚平仓的持仓：也要把 base_price→close_price 这段 daily_pnl 计入
-        # execute_close_signals 已将 status 改为 closed，这里单独捡回来
-        cur.execute(
-            "SELECT variety_id, direction, open_price, open_date, close_price, size_pct "
-            "FROM trading_positions WHERE status='closed' AND close_date=%s",
-            (signal_date,),
-        )
-        closed_today = cur.fetchall()
-
+    # 写入阶段：来源回填与新开仓在同一个事务内提交
+    if relinks or inserts:
+        try:
+            with conn.cursor() as cur:
+                if relinks:
+                    cur.executemany(_RELINK_POSITION_SQL, relinks)
+                if inserts:
+                    cur.executemany(_OPEN_POSITION_SQL, inserts)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return len(inserts)
+
+
+def account_day(
+    prev_equity: float,
+    signal_date: date,
+    open_pos: list[dict],
+    closed_today: list[dict],
+    close_price: Callable[[int], float | None],
+    prev_close: Callable[[int], float | None],
+    leverage: float = LEVERAGE,
+    sector_pnl: dict[str, float] | None = None,
+) -> tuple[float, float, float, float]:
+    """按资金曲线规则计算单日 (equity, cash, position_val, daily_pnl)。
+
+    open_pos 为当日仍开放的持仓，closed_today 为当日平仓的持仓；close_price / prev_close 按品种返回
+    signal_date 当日收盘价和此前最近一条收盘价，没有时返回 None。
+    传入 sector_pnl 时按持仓的 sector 累加各自贡献的 daily_pnl。
+    """
     daily_pnl = 0.0
     position_val = 0.0
 
@@ -195,7 +244,7 @@ def update_account_daily(conn: pymysql.Connection, signal_date: date) -> None:
         if pos["open_date"] == signal_date:
             base_price = float(pos["open_price"])
         else:
-            prev_price = _get_prev_close(conn, int(pos["variety_id"]), signal_date)
+            prev_price = prev_close(int(pos["variety_id"]))
             if prev_price is None or prev_price == 0:
                 return None
             base_price = prev_price
@@ -203,9 +252,15 @@ def update_account_daily(conn: pymysql.Connection, signal_date: date) -> None:
             return None
         return direction_sign * (end_price - base_price) / base_price
 
+    def _add_pnl(pos, pnl: float) -> None:
+        nonlocal daily_pnl
+        daily_pnl += pnl
+        if sector_pnl is not None:
+            sector = pos.get("sector") or DEFAULT_SECTOR
+            sector_pnl[sector] = sector_pnl.get(sector, 0.0) + pnl
+
     for pos in open_pos:
-        vid = int(pos["variety_id"])
-        cur_price = _get_close_price(conn, vid, signal_date)
+        cur_price = close_price(int(pos["variety_id"]))
         if cur_price is None:
             continue
 
@@ -214,35 +269,81 @@ def update_account_daily(conn: pymysql.Connection, signal_date: date) -> None:
 
         ret = _daily_ret(pos, cur_price)
         if ret is not None:
-            daily_pnl += prev_equity * size_pct * ret * LEVERAGE
+            _add_pnl(pos, prev_equity * size_pct * ret * leverage)
 
         direction_sign = 1 if pos["direction"] == "LONG" else -1
         float_ret = direction_sign * (cur_price - open_price) / open_price
-        position_val += prev_equity * size_pct * (1 + float_ret * LEVERAGE)
+        position_val += prev_equity * size_pct * (1 + float_ret * leverage)
 
     for pos in closed_today:
-        close_price = float(pos["close_price"])
+        end_price = float(pos["close_price"])
         size_pct = float(pos["size_pct"])
 
-        ret = _daily_ret(pos, close_price)
+        ret = _daily_ret(pos, end_price)
         if ret is not None:
-            daily_pnl += prev_equity * size_pct * ret * LEVERAGE
+            _add_pnl(pos, prev_equity * size_pct * ret * leverage)
 
     # equity 严格按 daily_pnl 累计，不再被 prev_equity 锁死
     equity = prev_equity + daily_pnl
     cash = equity - position_val
+    return equity, cash, position_val, daily_pnl
 
+
+def update_account_daily(conn: pymysql.Connection, signal_date: date) -> None:
+    # 只取当天之前的最新一行，避免同一天重跑时把今天已写入的 equity 当作 prev_equity
     with conn.cursor() as cur:
         cur.execute(
-            """
-            INSERT INTO trading_account_daily (record_date, equity, cash, position_val, daily_pnl)
-            VALUES (%s,%s,%s,%s,%s)
-            ON DUPLICATE KEY UPDATE
-                equity=VALUES(equity), cash=VALUES(cash),
-                position_val=VALUES(position_val), daily_pnl=VALUES(daily_pnl)
-            """,
-            (signal_date, equity, cash, position_val, daily_pnl),
+            "SELECT equity FROM trading_account_daily "
+            "WHERE record_date<%s ORDER BY record_date DESC LIMIT 1",
+            (signal_date,),
+        )
+        last = cur.fetchone()
+        prev_equity = float(last["equity"]) if last else INITIAL_CAPITAL
+
+        # 仍开放的持仓：贡献 daily_pnl + position_val
+        cur.execute(
+            "SELECT variety_id, direction, open_price, open_date, size_pct, sector "
+            "FROM trading_positions WHERE status='open'"
         )
+        open_pos = cur.fetchall()
+
+        # 今日刚平仓的持仓：也要把 base_price→close_price 这段 daily_pnl 计入
+        # execute_close_signals 已将 status 改为 closed，这里单独捡回来
+        cur.execute(
+            "SELECT variety_id, direction, open_price, open_date, close_price, size_pct, sector "
+            "FROM trading_positions WHERE status='closed' AND close_date=%s",
+            (signal_date,),
+        )
+        closed_today = cur.fetchall()
+        prev_metrics = load_metrics_before(cur, signal_date)
+
+    if prev_metrics is None and last is not None:
+        # 已有资金曲线但没有前一天的指标行（如指标表上线后的第一次运行）：先按历史补建，累计值不能从零起算
+        logger.warning("%s 之前缺少 trading_account_metrics 行，按资金曲线与持仓补建", signal_date)
+        rebuild_account_metrics(conn, end=signal_date - timedelta(days=1))
+        with conn.cursor() as cur:
+            prev_metrics = load_metrics_before(cur, signal_date)
+
+    sector_pnl: dict[str, float] = {}
+    equity, cash, position_val, daily_pnl = account_day(
+        prev_equity,
+        signal_date,
+        open_pos,
+        closed_today,
+        lambda vid: _get_close_price(conn, vid, signal_date),
+        lambda vid: _get_prev_close(conn, vid, signal_date),
+        sector_pnl=sector_pnl,
+    )
+    metrics = next_metrics(
+        prev_metrics, signal_date, prev_equity, equity, daily_pnl,
+        [close_pnl_pct(p["direction"], float(p["open_price"]), float(p["close_price"])) for p in closed_today],
+        sector_pnl,
+    )
+
+    with conn.cursor() as cur:
+        cur.execute(UPSERT_ACCOUNT_SQL, (signal_date, equity, cash, position_val, daily_pnl))
+        # 指标行与资金曲线同一事务，只依赖前一天的指标行
+        save_metrics(cur, metrics)
     conn.commit()
     logger.info(
         "资金曲线更新 date=%s equity=%.2f daily_pnl=%.2f position_val=%.2f cash=%.2f",
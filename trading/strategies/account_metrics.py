@@ -0,0 +1,231 @@
+"""
+账户风险与绩效指标。
+trading_account_metrics 每个 record_date 一行，保存截至当日的累计状态：历史最高权益与回撤、日收益率的累加和 / 平方和
+（夏普由此 O(1) 得出）、已平仓笔数与盈利笔数、各板块累计 daily_pnl。
+update_account_daily 写资金曲线时读取前一天的指标行、叠加当天增量后写入当天一行，与资金曲线同一事务。
+历史数据用 rebuild_account_metrics 按 trading_account_daily + trading_positions 批量重建。
+
+运行：python -m trading.strategies.account_metrics [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import pymysql
+
+from trading.strategies.settings import INITIAL_CAPITAL
+
+logger = logging.getLogger("account_metrics")
+
+TRADING_DAYS_PER_YEAR = 252
+
+METRIC_COLUMNS = (
+    "record_date", "trading_days", "equity", "peak_equity", "drawdown", "max_drawdown", "total_return",
+    "sum_ret", "sum_ret_sq", "sharpe", "closed_trades", "win_trades", "win_rate", "sum_trade_pnl_pct",
+    "sector_pnl_json",
+)
+
+_SELECT_METRICS_SQL = f"SELECT {', '.join(METRIC_COLUMNS)} FROM trading_account_metrics"
+INSERT_METRICS_SQL = (
+    f"INSERT INTO trading_account_metrics ({', '.join(METRIC_COLUMNS)}) "
+    f"VALUES ({','.join(['%s'] * len(METRIC_COLUMNS))})"
+)
+_UPSERT_METRICS_SQL = INSERT_METRICS_SQL + " ON DUPLICATE KEY UPDATE " + ", ".join(
+    f"{c}=VALUES({c})" for c in METRIC_COLUMNS[1:]
+)
+
+
+def next_metrics(
+    prev: dict | None,
+    record_date: date,
+    prev_equity: float,
+    equity: float,
+    daily_pnl: float,
+    closed_pnl_pcts: list[float],
+    sector_pnl: dict[str, float],
+) -> dict:
+    """在前一天的指标行 prev 上叠加当天增量，返回当天的指标行；prev 为空时从 prev_equity 起算。"""
+    if prev is None:
+        prev = {
+            "trading_days": 0, "peak_equity": prev_equity, "max_drawdown": 0.0, "sum_ret": 0.0, "sum_ret_sq": 0.0,
+            "closed_trades": 0, "win_trades": 0, "sum_trade_pnl_pct": 0.0, "sector_pnl_json": None,
+        }
+    ret = daily_pnl / prev_equity if prev_equity > 0 else 0.0
+    days = int(prev["trading_days"]) + 1
+    sum_ret = float(prev["sum_ret"]) + ret
+    sum_ret_sq = float(prev["sum_ret_sq"]) + ret * ret
+    peak = max(float(prev["peak_equity"]), equity)
+    drawdown = 1 - equity / peak if peak > 0 else 0.0
+    closed = int(prev["closed_trades"]) + len(closed_pnl_pcts)
+    wins = int(prev["win_trades"]) + sum(1 for p in closed_pnl_pcts if p > 0)
+
+    sharpe = None
+    if days >= 2:
+        var = (sum_ret_sq - sum_ret * sum_ret / days) / (days - 1)
+        if var > 0:
+            sharpe = sum_ret / days / math.sqrt(var) * math.sqrt(TRADING_DAYS_PER_YEAR)
+
+    sectors = _parse_sector_pnl(prev["sector_pnl_json"])
+    for sector, pnl in sector_pnl.items():
+        sectors[sector] = sectors.get(sector, 0.0) + pnl
+
+    return {
+        "record_date": record_date,
+        "trading_days": days,
+        "equity": equity,
+        "peak_equity": peak,
+        "drawdown": drawdown,
+        "max_drawdown": max(float(prev["max_drawdown"]), drawdown),
+        "total_return": equity / INITIAL_CAPITAL - 1,
+        "sum_ret": sum_ret,
+        "sum_ret_sq": sum_ret_sq,
+        "sharpe": sharpe,
+        "closed_trades": closed,
+        "win_trades": wins,
+        "win_rate": wins / closed if closed else None,
+        "sum_trade_pnl_pct": float(prev["sum_trade_pnl_pct"]) + sum(closed_pnl_pcts),
+        "sector_pnl_json": json.dumps(dict(sorted(sectors.items())), ensure_ascii=False),
+    }
+
+
+def _parse_sector_pnl(value) -> dict[str, float]:
+    if not value:
+        return {}
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode("utf-8")
+    return dict(json.loads(value)) if isinstance(value, str) else dict(value)
+
+
+def load_metrics_before(cur, record_date: date) -> dict | None:
+    """读取 record_date 之前最近的一行指标（同日重跑时不会读到自己）。"""
+    cur.execute(
+        _SELECT_METRICS_SQL + " WHERE record_date<%s ORDER BY record_date DESC LIMIT 1",
+        (record_date,),
+    )
+    return cur.fetchone()
+
+
+def save_metrics(cur, row: dict) -> None:
+    cur.execute(_UPSERT_METRICS_SQL, tuple(row[c] for c in METRIC_COLUMNS))
+
+
+def rebuild_account_metrics(conn: pymysql.Connection, start: date | None = None, end: date | None = None) -> int:
+    """按 trading_account_daily 与 trading_positions 重建 [start, end] 的指标行，返回写入行数。
+
+    权益与 daily_pnl 取资金曲线已存的值；板块归因按 account_day 的同一规则逐日分摊到持仓。
+    start 之前最近一行指标作为起点，区间内旧记录先删除再批量写入，整个过程一个事务。
+    end 之后已有指标行时重建延伸到最后一行指标，避免后续累计值仍基于旧的前序指标。
+    """
+    from trading.strategies.account import account_day, close_pnl_pct
+    from trading.strategies.data_loader import load_close_series
+    from trading.strategies.simulator import PriceBook
+
+    with conn.cursor() as cur:
+        if end is not None:
+            cur.execute("SELECT MAX(record_date) AS last_date FROM trading_account_metrics")
+            row = cur.fetchone()
+            latest = row["last_date"] if row else None
+            if latest is not None and latest > end:
+                logger.info("%s 之后已有指标行，重建延伸至 %s", end, latest)
+                end = latest
+        clauses, args = [], []
+        if start is not None:
+            clauses.append("record_date>=%s")
+            args.append(start)
+        if end is not None:
+            clauses.append("record_date<=%s")
+            args.append(end)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        cur.execute(
+            f"SELECT record_date, equity, daily_pnl FROM trading_account_daily {where}ORDER BY record_date",
+            tuple(args),
+        )
+        curve = list(cur.fetchall())
+        if not curve:
+            return 0
+        first, last = curve[0]["record_date"], curve[-1]["record_date"]
+        prev = load_metrics_before(cur, first)
+        cur.execute(
+            "SELECT equity FROM trading_account_daily WHERE record_date<%s ORDER BY record_date DESC LIMIT 1",
+            (first,),
+        )
+        row = cur.fetchone()
+        prev_equity = float(row["equity"]) if row else INITIAL_CAPITAL
+        cur.execute(
+            "SELECT variety_id, sector, direction, open_date, open_price, size_pct, status, close_date, close_price "
+            "FROM trading_positions WHERE open_date<=%s AND (close_date IS NULL OR close_date>=%s) ORDER BY id",
+            (last, first),
+        )
+        positions = list(cur.fetchall())
+
+    prices = PriceBook(load_close_series(conn, [int(p["variety_id"]) for p in positions], last))
+    rows = []
+    for r in curve:
+        d = r["record_date"]
+        open_pos = [
+            p for p in positions
+            if p["open_date"] <= d and (p["status"] == "open" or p["close_date"] is None or p["close_date"] > d)
+        ]
+        closed = [p for p in positions if p["status"] == "closed" and p["close_date"] == d]
+        sector_pnl: dict[str, float] = {}
+        account_day(
+            prev_equity, d, open_pos, closed,
+            lambda vid: prices.close(vid, d),
+            lambda vid: prices.prev_close(vid, d),
+            sector_pnl=sector_pnl,
+        )
+        equity = float(r["equity"])
+        prev = next_metrics(
+            prev, d, prev_equity, equity, float(r["daily_pnl"]),
+            [close_pnl_pct(p["direction"], float(p["open_price"]), float(p["close_price"])) for p in closed],
+            sector_pnl,
+        )
+        rows.append(tuple(prev[c] for c in METRIC_COLUMNS))
+        prev_equity = equity
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM trading_account_metrics WHERE record_date BETWEEN %s AND %s", (first, last))
+            cur.executemany(INSERT_METRICS_SQL, rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info("账户指标重建 %s ~ %s，共 %d 天", first, last, len(rows))
+    return len(rows)
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description="按资金曲线与持仓重建 trading_account_metrics")
+    parser.add_argument("--start", type=_parse_date, default=None, help="起始日期，默认资金曲线第一天")
+    parser.add_argument("--end", type=_parse_date, default=None, help="结束日期，默认资金曲线最后一天")
+    args = parser.parse_args()
+
+    from trading.strategies.db import get_connection
+
+    conn = get_connection()
+    try:
+        rebuild_account_metrics(conn, args.start, args.end)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
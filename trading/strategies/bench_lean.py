@@ -0,0 +1,101 @@
+"""
+紧凑模式基准：DataFrame + compute_signals vs float32/int32 数组 + compute_signals_lean，
+对比耗时与 tracemalloc 统计的峰值内存，并校验两条路径的开平仓信号一致。
+运行：python -m trading.strategies.bench_lean [品种数] [每品种行数]
+      python -m trading.strategies.bench_lean --db     # 使用真实库，含装载阶段
+"""
+from __future__ import annotations
+
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import numpy as np
+import pandas as pd
+
+from trading.strategies.data_loader import LEAN_DAY_DTYPE, LEAN_VALUE_DTYPE
+from trading.strategies.signals import SIGNAL_TYPES, compute_signals, compute_signals_lean
+
+
+def measure(fn) -> tuple[object, float, float]:
+    """执行 fn，返回 (结果, 耗时秒, 峰值内存 MB)。"""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def synthetic_lean(varieties: int, rows: int) -> dict[int, dict[str, np.ndarray]]:
+    rng = np.random.default_rng(0)
+    data = {}
+    for vid in range(1, varieties + 1):
+        t = np.arange(rows)
+        main_force = 20 * np.sin(t / rng.uniform(3, 8)) + rng.normal(0, 4, rows)
+        data[vid] = {
+            "days": (18000 + np.cumsum(rng.choice([1, 1, 1, 3], size=rows))).astype(LEAN_DAY_DTYPE),
+            "main_force": main_force.astype(LEAN_VALUE_DTYPE),
+            "retail": (-0.5 * main_force + rng.normal(0, 3, rows)).astype(LEAN_VALUE_DTYPE),
+            "close": (1000 + np.cumsum(rng.normal(0, 5, rows))).astype(LEAN_VALUE_DTYPE),
+        }
+    return data
+
+
+def to_frames(lean: dict[int, dict[str, np.ndarray]]) -> dict[int, pd.DataFrame]:
+    # 模拟 DictCursor 路径：FLOAT 经文本解析为 float64
+    return {
+        vid: pd.DataFrame(
+            {
+                "trade_date": pd.to_datetime(a["days"].astype("datetime64[D]")),
+                "main_force": [float(str(v)) for v in a["main_force"]],
+                "retail": [float(str(v)) for v in a["retail"]],
+                "close": [float(str(v)) for v in a["close"]],
+            }
+        )
+        for vid, a in lean.items()
+    }
+
+
+def _report(name: str, elapsed: float, peak: float) -> None:
+    print(f"{name:<10}: {elapsed * 1000:9.1f} ms  峰值 {peak:8.1f} MB")
+
+
+def main() -> None:
+    if "--db" in sys.argv:
+        from trading.strategies.data_loader import load_all_varieties_data, load_all_varieties_lean
+        from trading.strategies.db import get_connection
+
+        conn = get_connection()
+        try:
+            frames, t_std, m_std = measure(
+                lambda: {vid: compute_signals(df, vid) for vid, df in load_all_varieties_data(conn).items()}
+            )
+            lean, t_lean, m_lean = measure(
+                lambda: {vid: compute_signals_lean(a) for vid, a in load_all_varieties_lean(conn).items()}
+            )
+        finally:
+            conn.close()
+    else:
+        varieties = int(sys.argv[1]) if len(sys.argv) > 1 else 55
+        rows = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+        raw = synthetic_lean(varieties, rows)
+        std_input = to_frames(raw)
+        frames, t_std, m_std = measure(lambda: {vid: compute_signals(df, vid) for vid, df in std_input.items()})
+        lean, t_lean, m_lean = measure(lambda: {vid: compute_signals_lean(a) for vid, a in raw.items()})
+        print(f"varieties={varieties} rows={rows}")
+
+    for vid, sig in frames.items():
+        for stype in SIGNAL_TYPES:
+            if not np.array_equal(sig[stype].to_numpy(dtype=bool), lean[vid][stype]):
+                raise SystemExit(f"品种 {vid} 的 {stype} 不一致")
+    _report("标准模式", t_std, m_std)
+    _report("紧凑模式", t_lean, m_lean)
+
+
+if __name__ == "__main__":
+    main()
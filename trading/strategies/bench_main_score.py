@@ -0,0 +1,64 @@
+"""
+main_score 动量分位分微基准：逐行 pandas 切片实现 vs rolling_percentile。
+运行：python -m trading.strategies.bench_main_score [行数] [回看窗口]
+"""
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import numpy as np
+import pandas as pd
+
+from trading.strategies.rolling import rolling_percentile
+from trading.strategies.settings import MOMENTUM_LOOKBACK
+
+
+def legacy_main_score(abs_m3: pd.Series, lookback: int) -> list[float]:
+    scores: list[float] = []
+    for i in range(len(abs_m3)):
+        current = abs_m3.iloc[i]
+        hist = abs_m3.iloc[max(0, i - lookback) : i].dropna()
+        if pd.isna(current) or len(hist) < lookback:
+            scores.append(np.nan)
+            continue
+        scores.append(float(hist.le(current).sum() / lookback))
+    return scores
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    lookback = int(sys.argv[2]) if len(sys.argv) > 2 else MOMENTUM_LOOKBACK
+
+    rng = np.random.default_rng(0)
+    main_force = pd.Series(np.cumsum(rng.normal(0, 5, n)))
+    abs_m3 = (main_force - main_force.shift(2)).abs()
+    values = abs_m3.to_numpy(dtype=float)
+
+    expected = np.asarray(legacy_main_score(abs_m3, lookback))
+    actual = rolling_percentile(values, lookback)
+    if not np.array_equal(expected, actual, equal_nan=True):
+        raise SystemExit("结果不一致")
+
+    t_legacy = _best_of(lambda: legacy_main_score(abs_m3, lookback), 1)
+    t_fast = _best_of(lambda: rolling_percentile(values, lookback), 20)
+    print(f"rows={n} lookback={lookback}")
+    print(f"逐行实现        : {t_legacy * 1000:9.2f} ms")
+    print(f"rolling_percentile: {t_fast * 1000:9.2f} ms")
+    print(f"加速比          : {t_legacy / t_fast:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
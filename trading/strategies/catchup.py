@@ -0,0 +1,214 @@
+"""
+多日补跑。
+采集延迟若干天后，用一次运行补齐 [start, end] 内每个交易日的 daily_run 结果：
+行情只装载一次、每个品种只算一次全历史信号，信号按日期分块批量写入后，
+操作建议 → 平仓 → 开仓 → 资金曲线 / 累计指标在内存中逐日推进（simulator.simulate_rows）再批量写回；
+信号与账户结果在同一个事务内提交，被拒绝或中途失败的补跑不改动任何数据。
+结果与对区间内每个交易日依次运行 daily_run 相同；区间内已有的旧结果（包括中途失败留下的部分结果）先被清除再重建。
+
+运行：python -m trading.strategies.daily_run --start YYYY-MM-DD --end YYYY-MM-DD [--workers N]
+"""
+from __future__ import annotations
+
+import bisect
+import logging
+import time
+from datetime import date
+
+import pymysql
+
+from .account import CLOSE_POSITION_SQL, UPSERT_ACCOUNT_SQL
+from .account_metrics import INSERT_METRICS_SQL, METRIC_COLUMNS, load_metrics_before
+from .operations import INSERT_OPERATION_SQL, get_pool_varieties, operation_row
+from .settings import INITIAL_CAPITAL
+
+logger = logging.getLogger(__name__)
+
+_INSERT_POSITION_SQL = """
+    INSERT INTO trading_positions
+        (operation_id, open_operation_id, open_signal_id, close_signal_id, theory_cycle_id,
+         variety_id, variety_name, sector, direction,
+         open_date, open_price, size_pct, status, close_date, close_price, pnl_pct)
+    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+"""
+
+
+def _check_no_later_results(conn: pymysql.Connection, end: date) -> None:
+    """end 之后已有资金曲线记录时抛 RuntimeError，避免把后续日期建立在被改写的历史之上。"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT MAX(record_date) AS last_date FROM trading_account_daily")
+        row = cur.fetchone()
+    if row and row["last_date"] is not None and row["last_date"] > end:
+        raise RuntimeError(f"{end} 之后已有资金曲线记录（最新 {row['last_date']}），补跑区间需覆盖到最新日期")
+
+
+def catch_up_account(conn: pymysql.Connection, dates: list[date], commit: bool = True) -> dict[str, int]:
+    """在 trading_signals 已写好的前提下，补跑 dates（升序交易日）的 Step 2~5，返回各表写入行数。
+
+    起点状态取 dates[0] 之前的资金曲线、指标行和仍开放（或在区间内才平仓）的持仓；
+    区间之后已有运行结果时拒绝执行。commit=False 时不提交也不回滚，由调用方统一处理事务。
+    """
+    from .data_loader import load_close_series
+    from .simulator import PriceBook, simulate_rows
+
+    if not dates:
+        return {"operations": 0, "positions": 0, "closed": 0, "days": 0}
+    start, end = dates[0], dates[-1]
+    _check_no_later_results(conn, end)
+
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT id, signal_date, variety_id, variety_name, signal_type, signal_role, direction, cycle_id, "
+            "main_score FROM trading_signals WHERE signal_date BETWEEN %s AND %s ORDER BY signal_date, id",
+            (start, end),
+        )
+        signal_book: dict[date, list[dict]] = {}
+        for r in cur.fetchall():
+            signal_book.setdefault(r["signal_date"], []).append(r)
+
+        cur.execute(
+            "SELECT equity FROM trading_account_daily WHERE record_date<%s ORDER BY record_date DESC LIMIT 1",
+            (start,),
+        )
+        row = cur.fetchone()
+        initial_equity = float(row["equity"]) if row else INITIAL_CAPITAL
+        initial_metrics = load_metrics_before(cur, start)
+
+        # 区间内才平仓的老持仓按开放状态载入，由回放重新决定是否平仓
+        cur.execute(
+            "SELECT id, operation_id, open_signal_id, theory_cycle_id, variety_id, variety_name, sector, "
+            "direction, open_date, open_price, size_pct FROM trading_positions "
+            "WHERE open_date<%s AND (status='open' OR close_date>=%s) ORDER BY id",
+            (start, start),
+        )
+        initial_positions = list(cur.fetchall())
+
+    pool = get_pool_varieties(conn)
+    vids = sorted(set(pool) | {int(p["variety_id"]) for p in initial_positions})
+    prices = PriceBook(load_close_series(conn, vids, end))
+
+    t0 = time.perf_counter()
+    result = simulate_rows(
+        signal_book, prices, pool, dates, initial_equity, initial_positions,
+        initial_metrics=initial_metrics, track_metrics=True,
+    )
+    logger.info("内存推进 %d 个交易日，耗时 %.3f 秒", len(dates), time.perf_counter() - t0)
+
+    operations = result["operations"]
+    op_keys = {op["id"]: (op["signal_date"], op["variety_id"], op["signal_type"]) for op in operations}
+    reopened = [p for p in result["trades"] if p["open_date"] < start]
+    closes = [
+        (p["close_date"], p["close_price"], p["pnl_pct"], p["close_signal_id"], p["id"])
+        for p in reopened if p["status"] == "closed"
+    ]
+    opened = [p for p in result["trades"] if p["open_date"] >= start]
+
+    try:
+        with conn.cursor() as cur:
+            # 清除区间内旧结果：建议、区间内开仓的持仓；区间内平仓的老持仓恢复为开放
+            cur.execute("DELETE FROM trading_operations WHERE signal_date BETWEEN %s AND %s", (start, end))
+            cur.execute("DELETE FROM trading_positions WHERE open_date BETWEEN %s AND %s", (start, end))
+            cur.execute(
+                "UPDATE trading_positions SET status='open', close_date=NULL, close_price=NULL, pnl_pct=NULL, "
+                "close_signal_id=NULL WHERE close_date BETWEEN %s AND %s",
+                (start, end),
+            )
+            cur.execute("DELETE FROM trading_account_daily WHERE record_date BETWEEN %s AND %s", (start, end))
+            cur.execute("DELETE FROM trading_account_metrics WHERE record_date BETWEEN %s AND %s", (start, end))
+            # 台账记录的是被替换掉的运行，一并清除，之后单日重跑会完整执行
+            cur.execute("DELETE FROM trading_run_ledger WHERE run_date BETWEEN %s AND %s", (start, end))
+
+            op_ids: dict[tuple, int] = {}
+            if operations:
+                cur.executemany(INSERT_OPERATION_SQL, [operation_row(op["signal_date"], op) for op in operations])
+                cur.execute(
+                    "SELECT id, signal_date, variety_id, signal_type FROM trading_operations "
+                    "WHERE signal_date BETWEEN %s AND %s",
+                    (start, end),
+                )
+                op_ids = {
+                    (r["signal_date"], int(r["variety_id"]), r["signal_type"]): int(r["id"]) for r in cur.fetchall()
+                }
+            if closes:
+                cur.executemany(CLOSE_POSITION_SQL, closes)
+            if opened:
+                rows = []
+                for p in opened:
+                    op_id = op_ids[op_keys[p["operation_id"]]]
+                    rows.append((
+                        op_id, op_id, p["open_signal_id"], p["close_signal_id"], p["theory_cycle_id"],
+                        p["variety_id"], p["variety_name"], p["sector"], p["direction"],
+                        p["open_date"], p["open_price"], p["size_pct"], p["status"],
+                        p["close_date"], p["close_price"], p["pnl_pct"],
+                    ))
+                cur.executemany(_INSERT_POSITION_SQL, rows)
+            cur.executemany(UPSERT_ACCOUNT_SQL, result["equity"])
+            cur.executemany(INSERT_METRICS_SQL, [tuple(m[c] for c in METRIC_COLUMNS) for m in result["metrics"]])
+        if commit:
+            conn.commit()
+    except Exception:
+        if commit:
+            conn.rollback()
+        raise
+
+    logger.info(
+        "补跑写入 %s ~ %s：建议 %d 条，新开仓 %d 笔，老持仓平仓 %d 笔，资金曲线 %d 天",
+        start, end, len(operations), len(opened), len(closes), len(result["equity"]),
+    )
+    return {"operations": len(operations), "positions": len(opened), "closed": len(closes), "days": len(dates)}
+
+
+def run_catchup(
+    conn: pymysql.Connection,
+    start: date,
+    end: date,
+    workers: int = 1,
+    chunk_days: int = 30,
+) -> dict[str, int]:
+    """补跑 [start, end] 内池子 A 品种有行情的每个交易日，返回各表写入行数。
+
+    写入前先检查 end 之后没有运行结果，并对每个交易日做与单日运行相同的数据完整性校验，任一项失败则不写任何数据；
+    信号、理论状态与 Step 2~5 的结果在同一个事务内写入，任一步失败整体回滚。
+    """
+    from .data_loader import check_data_completeness
+    from .replay import collect_signal_rows, compute_signal_frames, write_signal_rows
+    from .signals import theory_state_row
+
+    _check_no_later_results(conn, end)
+    t0 = time.perf_counter()
+    names, sig_frames = compute_signal_frames(conn, workers)
+    pool = get_pool_varieties(conn)
+    dates = sorted({
+        d for vid in pool if vid in sig_frames
+        for d in sig_frames[vid]["trade_date"].dt.date if start <= d <= end
+    })
+    logger.info("信号计算完成：%d 个品种，耗时 %.3f 秒，待补跑交易日 %d 个", len(sig_frames), time.perf_counter() - t0, len(dates))
+    if not dates:
+        return {"signals": 0, "operations": 0, "positions": 0, "closed": 0, "days": 0}
+
+    problems = []
+    for d in dates:
+        ok, msg = check_data_completeness(conn, d.isoformat())
+        if not ok:
+            problems.append(f"{d}: {msg}")
+    if problems:
+        raise RuntimeError("数据完整性校验失败，未写入任何数据：" + "；".join(problems))
+
+    # 单日运行只在运行日写信号；理论状态取每个品种最后一个有数据的运行日
+    run_days = set(dates)
+    rows = [args for args in collect_signal_rows(sig_frames, names, start, end) if args[0] in run_days]
+    state_rows = []
+    for vid, sig_df in sig_frames.items():
+        if sig_df.empty:
+            continue
+        i = bisect.bisect_right(dates, sig_df["trade_date"].iloc[-1].date())
+        if i and (row := theory_state_row(dates[i - 1], vid, sig_df)) is not None:
+            state_rows.append(row)
+    try:
+        written = write_signal_rows(conn, rows, start, end, sorted(sig_frames), chunk_days, state_rows, commit=False)
+        summary = catch_up_account(conn, dates, commit=False)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {"signals": written, **summary}
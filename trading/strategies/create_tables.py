@@ -112,12 +112,80 @@ CREATE_STMTS = [
     ) COMMENT='自动化账户每日净值曲线（单账户）'
     """,
     """
+    CREATE TABLE IF NOT EXISTS trading_account_metrics (
+        id                INT AUTO_INCREMENT PRIMARY KEY,
+        record_date       DATE NOT NULL,
+        trading_days      INT NOT NULL COMMENT '累计记录天数',
+        equity            DOUBLE NOT NULL,
+        peak_equity       DOUBLE NOT NULL COMMENT '截至当日的最高权益',
+        drawdown          DOUBLE NOT NULL COMMENT '当前回撤 1 - equity / peak_equity',
+        max_drawdown      DOUBLE NOT NULL,
+        total_return      DOUBLE NOT NULL COMMENT 'equity / INITIAL_CAPITAL - 1',
+        sum_ret           DOUBLE NOT NULL COMMENT '日收益率 daily_pnl / prev_equity 累加',
+        sum_ret_sq        DOUBLE NOT NULL COMMENT '日收益率平方累加',
+        sharpe            DOUBLE COMMENT '年化夏普（252 日，无风险利率 0）',
+        closed_trades     INT NOT NULL DEFAULT 0,
+        win_trades        INT NOT NULL DEFAULT 0,
+        win_rate          DOUBLE,
+        sum_trade_pnl_pct DOUBLE NOT NULL DEFAULT 0 COMMENT '已平仓 pnl_pct 累加（无杠杆）',
+        sector_pnl_json   JSON COMMENT '各板块累计 daily_pnl',
+        created_at        DATETIME DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY uk_date (record_date)
+    ) COMMENT='自动化账户累计风险与绩效指标（每日一行，随资金曲线增量维护）'
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS trading_run_ledger (
+        id          INT AUTO_INCREMENT PRIMARY KEY,
+        run_date    DATE NOT NULL,
+        step        VARCHAR(32) NOT NULL COMMENT 'signals / operations / close / open / account',
+        status      ENUM('running','done','failed') NOT NULL,
+        started_at  DATETIME NOT NULL,
+        finished_at DATETIME,
+        duration_ms INT COMMENT '步骤耗时（毫秒）',
+        row_count   INT COMMENT '步骤写入或处理的行数',
+        error_msg   VARCHAR(500),
+        attempts    INT NOT NULL DEFAULT 1 COMMENT '该日该步骤累计执行次数',
+        UNIQUE KEY uk_date_step (run_date, step),
+        KEY idx_step (step, run_date)
+    ) COMMENT='daily_run 运行台账（断点续跑与步骤耗时）'
+    """,
+    """
     CREATE TABLE IF NOT EXISTS trading_signal_state (
         variety_id  INT NOT NULL,
         state_date  DATE NOT NULL COMMENT '该状态对应的信号日期',
         state       ENUM('none','long','short') NOT NULL DEFAULT 'none',
+        cycle_id    VARCHAR(64) COMMENT '当前未平理论周期ID（state=none 时为空）',
+        open_date   DATE COMMENT '当前未平理论周期的开仓日期',
         PRIMARY KEY (variety_id, state_date)
-    ) COMMENT='旧理论状态快照缓存（不作为业务事实源）'
+    ) COMMENT='理论状态快照缓存（供增量信号计算恢复状态，不作为业务事实源）'
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS trading_features (
+        variety_id   INT NOT NULL,
+        trade_date   DATE NOT NULL,
+        main_force   DOUBLE NOT NULL,
+        retail       DOUBLE NOT NULL,
+        close        DOUBLE NOT NULL,
+        date_cont    TINYINT(1) NOT NULL COMMENT '与上一条记录间隔 <= 7 天',
+        main_diff    DOUBLE,
+        retail_diff  DOUBLE,
+        cont7        TINYINT(1) NOT NULL,
+        cont3        TINYINT(1) NOT NULL,
+        bg1          DOUBLE,
+        bg2          DOUBLE,
+        bg3          DOUBLE,
+        bg4          DOUBLE,
+        bg5          DOUBLE,
+        m3           DOUBLE,
+        main_score   DOUBLE COMMENT '按 MOMENTUM_LOOKBACK 计算的 |m3| 分位',
+        PRIMARY KEY (variety_id, trade_date)
+    ) COMMENT='A通道中间特征库（由 fut_strength + fut_daily_close 派生，按水位线增量追加）'
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS trading_feature_sync (
+        source_table VARCHAR(32) NOT NULL PRIMARY KEY COMMENT 'fut_strength / fut_daily_close',
+        collected_at DATETIME NOT NULL COMMENT '特征库已同步到的来源行 collected_at 水位线'
+    ) COMMENT='A通道特征库的来源数据水位线（用于发现水位线之前被修订或迟到的行情）'
     """,
 ]
 
@@ -256,6 +324,9 @@ def run_migrations(conn) -> None:
         _add_column_if_missing(cur, "trading_operations", "signal_cycle_id", "signal_cycle_id VARCHAR(64) COMMENT '来源理论信号周期ID' AFTER direction")
         _add_column_if_missing(cur, "trading_operations", "selection_rank", "selection_rank INT COMMENT '同日开仓候选排序' AFTER reject_reason")
 
+        _add_column_if_missing(cur, "trading_signal_state", "cycle_id", "cycle_id VARCHAR(64) COMMENT '当前未平理论周期ID（state=none 时为空）' AFTER state")
+        _add_column_if_missing(cur, "trading_signal_state", "open_date", "open_date DATE COMMENT '当前未平理论周期的开仓日期' AFTER cycle_id")
+
         _add_column_if_missing(cur, "trading_positions", "open_operation_id", "open_operation_id INT COMMENT '真实开仓来源建议ID' AFTER operation_id")
         _add_column_if_missing(cur, "trading_positions", "open_signal_id", "open_signal_id INT COMMENT '真实开仓来源理论信号ID' AFTER open_operation_id")
         _add_column_if_missing(cur, "trading_positions", "close_signal_id", "close_signal_id INT COMMENT '真实平仓来源理论信号ID' AFTER open_signal_id")
@@ -269,8 +340,10 @@ def reset_strategy_results(conn) -> None:
         "trading_operations",
         "trading_positions",
         "trading_account_daily",
+        "trading_account_metrics",
         "trading_signals",
         "trading_signal_state",
+        "trading_run_ledger",
     ]
     with conn.cursor() as cur:
         for table in tables:
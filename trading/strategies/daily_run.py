@@ -7,11 +7,25 @@
   4. 执行平仓（先于开仓）
   5. 执行开仓
   6. 更新资金曲线 → 写 trading_account_daily
-
-运行：python -m trading.strategies.daily_run [YYYY-MM-DD]
+后五步（Step 1~5）的状态、耗时与行数记入 trading_run_ledger；重跑同一日期时跳过已完成的步骤，
+从第一个未完成的步骤接着执行，其后的步骤全部重跑。
+
+运行：python -m trading.strategies.daily_run [YYYY-MM-DD] [--incremental] [--check-incremental] [--workers N] [--features] [--profile-sql]
+                                          [--force] [--from-step N]
+      python -m trading.strategies.daily_run --start YYYY-MM-DD --end YYYY-MM-DD [--workers N] [--profile-sql]
+  --incremental        从 trading_signal_state 恢复理论状态，只计算新日期（无快照的品种自动回退全量）
+  --check-incremental  信号写表后对比全量与增量计算结果，不一致时打印告警
+  --workers N          全量信号计算使用 N 个进程并行（默认 1，父进程统一写库）
+  --features           先把新增或修订行情的特征同步到 trading_features，再基于特征库计算信号
+  --profile-sql        按步骤统计每条 SQL 的执行次数与耗时，结束时打印汇总
+  --force              忽略运行台账，重跑当日全部步骤
+  --from-step N        跳过 Step 1~N-1，从 Step N 起全部重跑
+  --start / --end      补跑区间内每个交易日：行情只装载一次、信号只算一次，Step 2~5 在内存中逐日推进后批量写库，
+                       结果与逐日运行相同（见 catchup.py）；--incremental / --features / --force / --from-step 不生效
 """
 from __future__ import annotations
 
+import argparse
 import logging
 import sys
 from datetime import date, datetime
@@ -26,6 +40,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger("daily_run")
 
+# (序号, 台账 step, 步骤名称)；步骤名称同时用作 SQL 统计分组
+STEPS = (
+    (1, "signals", "Step 1 计算信号"),
+    (2, "operations", "Step 2 生成操作建议"),
+    (3, "close", "Step 3 执行平仓"),
+    (4, "open", "Step 4 执行开仓"),
+    (5, "account", "Step 5 更新资金曲线"),
+)
+
 
 def parse_date(arg: str | None) -> date:
     if arg:
@@ -33,54 +56,161 @@ def parse_date(arg: str | None) -> date:
     return date.today()
 
 
-def main() -> None:
-    run_date = parse_date(sys.argv[1] if len(sys.argv) > 1 else None)
-    logger.info("========== 开始每日运行，日期: %s ==========", run_date)
-
-    from trading.strategies.db import get_connection
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="trading 策略每日批处理")
+    parser.add_argument("date", nargs="?", default=None, help="运行日期 YYYY-MM-DD，默认今天")
+    parser.add_argument("--incremental", action="store_true", help="增量计算信号")
+    parser.add_argument("--check-incremental", action="store_true", help="校验增量与全量信号一致性")
+    parser.add_argument("--workers", type=int, default=1, help="全量信号计算的并行进程数")
+    parser.add_argument("--features", action="store_true", help="同步特征库并基于预计算特征计算信号")
+    parser.add_argument("--profile-sql", action="store_true", help="按步骤统计 SQL 次数与耗时并在结束时打印")
+    parser.add_argument("--force", action="store_true", help="忽略运行台账，重跑当日全部步骤")
+    parser.add_argument("--from-step", type=int, default=1, choices=range(1, len(STEPS) + 1),
+                        metavar="N", help="从第 N 步（1-5）开始重跑，之前的步骤跳过")
+    parser.add_argument("--start", type=parse_date, default=None, help="补跑起始日期 YYYY-MM-DD")
+    parser.add_argument("--end", type=parse_date, default=None, help="补跑结束日期 YYYY-MM-DD")
+    args = parser.parse_args(argv)
+    if (args.start is None) != (args.end is None):
+        parser.error("--start 与 --end 需同时给出")
+    if args.start is not None and args.date is not None:
+        parser.error("补跑模式不接受单日日期参数")
+    if args.start is not None and args.start > args.end:
+        parser.error("--start 不能晚于 --end")
+    return args
+
+
+def run_day(conn, run_date: date, args: argparse.Namespace, stats) -> None:
+    """执行单日批处理的全部步骤；stats 为 QueryStats，用于按步骤归集 SQL 统计。"""
     from trading.strategies.data_loader import check_data_completeness
-    from trading.strategies.signals import run_signals_for_all
-    from trading.strategies.operations import generate_operations
-    from trading.strategies.account import execute_close_signals, execute_open_operations, update_account_daily
     from trading.strategies.create_tables import sync_pool_with_varieties
+    from trading.strategies.run_ledger import load_ledger, record_step
 
-    conn = get_connection()
-    try:
+    with stats.step("同步 trading_pool"):
         added = sync_pool_with_varieties(conn)
-        if added:
-            logger.info("trading_pool 补齐 %d 个未激活品种（is_active=0）", added)
+    if added:
+        logger.info("trading_pool 补齐 %d 个未激活品种（is_active=0）", added)
 
+    with stats.step("数据完整性校验"):
         ok, msg = check_data_completeness(conn, run_date.isoformat())
-        if not ok:
-            logger.error("数据完整性校验失败，终止运行: %s", msg)
-            sys.exit(1)
-        logger.info("数据完整性校验通过: %s", msg)
+    if not ok:
+        logger.error("数据完整性校验失败，终止运行: %s", msg)
+        sys.exit(1)
+    logger.info("数据完整性校验通过: %s", msg)
+
+    if args.features:
+        from trading.strategies.features import sync_features
+
+        logger.info("Step 0: 同步 A 通道特征库")
+        with stats.step("Step 0 同步特征库"):
+            sync_features(conn)
+
+    ledger = load_ledger(conn, run_date)
+    state: dict = {}
+    # --from-step 之后的步骤一律重跑；某一步重跑后，其下游步骤也必须重跑
+    rerun = args.force or args.from_step > 1
+    for no, step, label in STEPS:
+        if no < args.from_step:
+            logger.info("%s: 跳过（--from-step %d）", label, args.from_step)
+            continue
+        done = ledger.get(step)
+        if not rerun and done and done["status"] == "done":
+            logger.info(
+                "%s: 当日已完成，跳过（耗时 %.2fs，行数 %s）",
+                label, (done["duration_ms"] or 0) / 1000, done["row_count"],
+            )
+            continue
+        rerun = True
+        logger.info("%s", label)
+        with stats.step(label), record_step(conn, run_date, step) as rec:
+            rec["rows"] = _run_step(conn, run_date, step, args, stats, state)
+
+
+def _run_step(conn, run_date: date, step: str, args: argparse.Namespace, stats, state: dict) -> int:
+    """执行一个台账步骤，返回写入或处理的行数；state 在步骤之间传递当日平仓集合。"""
+    from trading.strategies.signals import check_incremental_consistency, run_signals_for_all
+    from trading.strategies.operations import get_closed_today, generate_operations
+    from trading.strategies.account import execute_close_signals, execute_open_operations, update_account_daily
 
-        logger.info("Step 1: 计算全品种 A 通道信号")
-        triggered = run_signals_for_all(conn, run_date)
+    if step == "signals":
+        triggered = run_signals_for_all(
+            conn, run_date, incremental=args.incremental, workers=args.workers,
+            use_features=args.features,
+        )
         logger.info("触发信号的品种数: %d", len(triggered))
         for vname, stypes in triggered.items():
             logger.info("  %s → %s", vname, stypes)
+        if args.check_incremental:
+            with stats.step("增量一致性校验"):
+                mismatches = check_incremental_consistency(conn, run_date)
+            for item in mismatches:
+                logger.warning("增量/全量不一致: %s", item)
+            logger.info("增量一致性校验完成，不一致项: %d", len(mismatches))
+        return sum(len(stypes) for stypes in triggered.values())
+
+    if step == "operations":
+        return generate_operations(conn, run_date)
+
+    if step == "close":
+        state["closed_today"] = execute_close_signals(conn, run_date)
+        logger.info("今日平仓品种数: %d", len(state["closed_today"]))
+        return len(state["closed_today"])
+
+    if step == "open":
+        # Step 3 已在之前的运行中完成时，从持仓表恢复当日平仓集合
+        closed_today = state.get("closed_today")
+        if closed_today is None:
+            closed_today = get_closed_today(conn, run_date)
+        return execute_open_operations(conn, run_date, closed_today)
+
+    update_account_daily(conn, run_date)
+    return 1
+
+
+def run_range(conn, start: date, end: date, args: argparse.Namespace, stats) -> None:
+    """补跑 [start, end] 内的全部交易日（catchup.run_catchup）。"""
+    from trading.strategies.catchup import run_catchup
+    from trading.strategies.create_tables import sync_pool_with_varieties
 
-        logger.info("Step 2: 生成池子A操作建议")
-        generate_operations(conn, run_date)
+    with stats.step("同步 trading_pool"):
+        added = sync_pool_with_varieties(conn)
+    if added:
+        logger.info("trading_pool 补齐 %d 个未激活品种（is_active=0）", added)
 
-        logger.info("Step 3: 执行平仓信号")
-        closed_today = execute_close_signals(conn, run_date)
-        logger.info("今日平仓品种数: %d", len(closed_today))
+    with stats.step("补跑"):
+        summary = run_catchup(conn, start, end, workers=args.workers)
+    logger.info(
+        "补跑完成：%d 个交易日，信号 %d 条，建议 %d 条，新开仓 %d 笔",
+        summary["days"], summary["signals"], summary["operations"], summary["positions"],
+    )
 
-        logger.info("Step 4: 执行开仓建议")
-        execute_open_operations(conn, run_date, closed_today)
 
-        logger.info("Step 5: 更新资金曲线")
-        update_account_daily(conn, run_date)
+def main() -> None:
+    args = parse_args()
+    if args.start is not None:
+        logger.info("========== 开始补跑，区间: %s ~ %s ==========", args.start, args.end)
+    else:
+        run_date = parse_date(args.date)
+        logger.info("========== 开始每日运行，日期: %s ==========", run_date)
+
+    from trading.strategies.db import InstrumentedConnection, QueryStats, close_pool, pooled_connection
 
+    stats = QueryStats()
+    try:
+        with pooled_connection() as raw_conn:
+            conn = InstrumentedConnection(raw_conn, stats) if args.profile_sql else raw_conn
+            if args.start is not None:
+                run_range(conn, args.start, args.end, args, stats)
+            else:
+                run_day(conn, run_date, args, stats)
         logger.info("========== 每日运行完成 ==========")
     except Exception as exc:
         logger.exception("每日运行异常: %s", exc)
         sys.exit(1)
     finally:
-        conn.close()
+        if args.profile_sql:
+            for line in stats.summary():
+                logger.info("[SQL] %s", line)
+        close_pool()
 
 
 if __name__ == "__main__":
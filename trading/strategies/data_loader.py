@@ -1,10 +1,25 @@
 from __future__ import annotations
 
+import logging
+from datetime import date
+
+import numpy as np
 import pandas as pd
 import pymysql
 
 from .db import get_connection
 
+logger = logging.getLogger(__name__)
+
+# SSCursor 每批拉取的行数
+_BULK_FETCH_SIZE = 10000
+
+# 紧凑模式：日期为 1970-01-01 起的 int32 日序号，数值列为 float32（与 MySQL FLOAT 精度一致）
+LEAN_DAY_DTYPE = np.int32
+LEAN_VALUE_DTYPE = np.float32
+_LEAN_COLUMNS = ("main_force", "retail", "close")
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
 
 def load_variety_map(conn: pymysql.Connection) -> pd.DataFrame:
     with conn.cursor() as cur:
@@ -36,7 +51,190 @@ def load_variety_data(conn: pymysql.Connection, variety_id: int) -> pd.DataFrame
     return df.sort_values("trade_date").reset_index(drop=True)
 
 
-def load_all_pool_data(conn: pymysql.Connection) -> dict[str, tuple[int, pd.DataFrame]]:
+def load_variety_tail(
+    conn: pymysql.Connection, variety_id: int, end_date: date, bars: int
+) -> pd.DataFrame:
+    """读取某品种截至 end_date（含）的最近 bars 条强度 + 收盘价，口径与 load_variety_data 一致。"""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT s.trade_date, s.main_force, s.retail, c.close_price AS close "
+            "FROM fut_strength s "
+            "INNER JOIN fut_daily_close c ON c.variety_id=s.variety_id AND c.trade_date=s.trade_date "
+            "WHERE s.variety_id=%s AND s.trade_date<=%s "
+            "ORDER BY s.trade_date DESC LIMIT %s",
+            (variety_id, end_date, bars),
+        )
+        df = pd.DataFrame(cur.fetchall())
+
+    if df.empty:
+        return pd.DataFrame()
+
+    df = df.dropna()
+    df["trade_date"] = pd.to_datetime(df["trade_date"])
+    return df.sort_values("trade_date").reset_index(drop=True)
+
+
+def load_variety_since(
+    conn: pymysql.Connection, variety_id: int, after: date, context_bars: int
+) -> pd.DataFrame:
+    """读取某品种 after 之后的全部强度 + 收盘价，并带上 after（含）之前最近 context_bars 条作为滚动计算的上下文。
+
+    after 之后没有新数据时返回空表；口径与 load_variety_data 一致（缺值行不计入上下文条数）。
+    """
+    sql = (
+        "SELECT s.trade_date, s.main_force, s.retail, c.close_price AS close "
+        "FROM fut_strength s "
+        "INNER JOIN fut_daily_close c ON c.variety_id=s.variety_id AND c.trade_date=s.trade_date "
+        "WHERE s.variety_id=%s AND s.main_force IS NOT NULL AND s.retail IS NOT NULL AND c.close_price IS NOT NULL "
+    )
+    with conn.cursor() as cur:
+        cur.execute(sql + "AND s.trade_date>%s ORDER BY s.trade_date", (variety_id, after))
+        new = list(cur.fetchall())
+        if not new:
+            return pd.DataFrame()
+        cur.execute(sql + "AND s.trade_date<=%s ORDER BY s.trade_date DESC LIMIT %s", (variety_id, after, context_bars))
+        context = list(cur.fetchall())
+
+    df = pd.DataFrame([*context, *new])
+    df["trade_date"] = pd.to_datetime(df["trade_date"])
+    return df.sort_values("trade_date").reset_index(drop=True)
+
+
+def load_varieties_bulk(conn: pymysql.Connection, variety_ids: list[int]) -> dict[int, pd.DataFrame]:
+    """一条 JOIN 查询读取多个品种的强度 + 收盘价，口径与逐品种 load_variety_data 一致。
+
+    使用无缓冲的 SSCursor 分批拉取结果，避免一次性在客户端缓存整张结果集；拉取完成后按 variety_id 拆分。
+    """
+    if not variety_ids:
+        return {}
+    marks = ",".join(["%s"] * len(variety_ids))
+    columns = ["variety_id", "trade_date", "main_force", "retail", "close"]
+    records: list[tuple] = []
+    with conn.cursor(pymysql.cursors.SSCursor) as cur:
+        cur.execute(
+            "SELECT s.variety_id, s.trade_date, s.main_force, s.retail, c.close_price AS close "
+            "FROM fut_strength s "
+            "INNER JOIN fut_daily_close c ON c.variety_id=s.variety_id AND c.trade_date=s.trade_date "
+            f"WHERE s.variety_id IN ({marks}) "
+            "ORDER BY s.variety_id, s.trade_date",
+            tuple(variety_ids),
+        )
+        while True:
+            chunk = cur.fetchmany(_BULK_FETCH_SIZE)
+            if not chunk:
+                break
+            records.extend(chunk)
+
+    df = pd.DataFrame.from_records(records, columns=columns).dropna()
+    if df.empty:
+        return {}
+    df["trade_date"] = pd.to_datetime(df["trade_date"])
+    return {
+        int(vid): group.drop(columns="variety_id").reset_index(drop=True)
+        for vid, group in df.groupby("variety_id", sort=True)
+    }
+
+
+def load_varieties_data(
+    conn: pymysql.Connection, variety_ids: list[int], use_store: bool = True
+) -> dict[int, pd.DataFrame]:
+    """读取多个品种的强度 + 收盘价：镜像开启时同步并读取该连接对应的本地行情镜像，否则或镜像不可用时走 MySQL 批量查询。"""
+    if use_store:
+        from .market_store import load_local_varieties, store_dir, sync_market_store
+
+        if store_dir() is not None:
+            try:
+                root = store_dir(conn)
+                sync_market_store(conn, root=root)
+                return load_local_varieties(variety_ids, root)
+            except Exception as exc:
+                logger.warning("本地行情镜像不可用，回退 MySQL: %s", exc)
+    return load_varieties_bulk(conn, variety_ids)
+
+
+def _lean_arrays(days: np.ndarray, values: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """转换为紧凑 dtype 并删除含空值的行。"""
+    arrays = {"days": days.astype(LEAN_DAY_DTYPE, copy=False)}
+    valid = np.ones(len(days), dtype=bool)
+    for col in _LEAN_COLUMNS:
+        arrays[col] = values[col].astype(LEAN_VALUE_DTYPE, copy=False)
+        valid &= ~np.isnan(arrays[col])
+    if not valid.all():
+        arrays = {k: v[valid] for k, v in arrays.items()}
+    return arrays
+
+
+def load_varieties_lean(conn: pymysql.Connection, variety_ids: list[int]) -> dict[int, dict[str, np.ndarray]]:
+    """与 load_varieties_bulk 同一条查询，但逐批直接写入紧凑数组，不经过 DataFrame。
+
+    返回 {variety_id: {"days", "main_force", "retail", "close"}}，days 为 int32 日序号，数值列为 float32。
+    """
+    if not variety_ids:
+        return {}
+    marks = ",".join(["%s"] * len(variety_ids))
+    parts: dict[str, list[np.ndarray]] = {"vid": [], "days": [], **{c: [] for c in _LEAN_COLUMNS}}
+    with conn.cursor(pymysql.cursors.SSCursor) as cur:
+        cur.execute(
+            "SELECT s.variety_id, s.trade_date, s.main_force, s.retail, c.close_price AS close "
+            "FROM fut_strength s "
+            "INNER JOIN fut_daily_close c ON c.variety_id=s.variety_id AND c.trade_date=s.trade_date "
+            f"WHERE s.variety_id IN ({marks}) "
+            "ORDER BY s.variety_id, s.trade_date",
+            tuple(variety_ids),
+        )
+        while True:
+            chunk = cur.fetchmany(_BULK_FETCH_SIZE)
+            if not chunk:
+                break
+            n = len(chunk)
+            parts["vid"].append(np.fromiter((r[0] for r in chunk), dtype=np.int32, count=n))
+            parts["days"].append(
+                np.fromiter((r[1].toordinal() - _EPOCH_ORDINAL for r in chunk), dtype=LEAN_DAY_DTYPE, count=n)
+            )
+            for i, col in enumerate(_LEAN_COLUMNS, start=2):
+                parts[col].append(np.array([r[i] for r in chunk], dtype=LEAN_VALUE_DTYPE))
+
+    if not parts["vid"]:
+        return {}
+    merged = {k: np.concatenate(v) for k, v in parts.items()}
+    vids = merged.pop("vid")
+    starts = np.flatnonzero(np.r_[True, vids[1:] != vids[:-1]])
+    ends = np.r_[starts[1:], len(vids)]
+    result: dict[int, dict[str, np.ndarray]] = {}
+    for start, end in zip(starts, ends):
+        arrays = _lean_arrays(merged["days"][start:end], {c: merged[c][start:end] for c in _LEAN_COLUMNS})
+        if len(arrays["days"]):
+            result[int(vids[start])] = arrays
+    return result
+
+
+def load_all_varieties_lean(conn: pymysql.Connection, use_store: bool = True) -> dict[int, dict[str, np.ndarray]]:
+    """紧凑模式的 load_all_varieties_data：镜像开启时同样读本地行情镜像，不可用时回退 MySQL。"""
+    variety_df = load_variety_map(conn)
+    if variety_df.empty:
+        return {}
+    variety_ids = [int(vid) for vid in variety_df["id"]]
+    if use_store:
+        from .market_store import load_local_arrays, store_dir, sync_market_store
+
+        if store_dir() is not None:
+            try:
+                root = store_dir(conn)
+                sync_market_store(conn, root=root)
+                result = {}
+                for vid, raw in load_local_arrays(variety_ids, root).items():
+                    arrays = _lean_arrays(raw["days"], raw)
+                    if len(arrays["days"]):
+                        result[vid] = arrays
+                return result
+            except Exception as exc:
+                logger.warning("本地行情镜像不可用，回退 MySQL: %s", exc)
+    return load_varieties_lean(conn, variety_ids)
+
+
+def load_all_pool_data(
+    conn: pymysql.Connection, use_store: bool = True
+) -> dict[str, tuple[int, pd.DataFrame]]:
     variety_df = load_variety_map(conn)
     if variety_df.empty:
         return {}
@@ -44,53 +242,93 @@ def load_all_pool_data(conn: pymysql.Connection) -> dict[str, tuple[int, pd.Data
 
     from .settings import TARGET_VARIETIES
 
-    result: dict[str, tuple[int, pd.DataFrame]] = {}
-    for name in TARGET_VARIETIES:
-        vid = name_to_id.get(name)
-        if vid is None:
-            continue
-        df = load_variety_data(conn, int(vid))
-        if not df.empty:
-            result[name] = (int(vid), df)
-    return result
+    targets = {name: int(name_to_id[name]) for name in TARGET_VARIETIES if name in name_to_id}
+    frames = load_varieties_data(conn, list(targets.values()), use_store)
+    return {name: (vid, frames[vid]) for name, vid in targets.items() if vid in frames}
 
 
-def load_all_varieties_data(conn: pymysql.Connection) -> dict[int, pd.DataFrame]:
+def load_all_varieties_data(conn: pymysql.Connection, use_store: bool = True) -> dict[int, pd.DataFrame]:
     variety_df = load_variety_map(conn)
     if variety_df.empty:
         return {}
-    result: dict[int, pd.DataFrame] = {}
-    for _, row in variety_df.iterrows():
-        df = load_variety_data(conn, int(row["id"]))
-        if not df.empty:
-            result[int(row["id"])] = df
-    return result
+    return load_varieties_data(conn, [int(vid) for vid in variety_df["id"]], use_store)
 
 
-def check_data_completeness(conn: pymysql.Connection, trade_date: str) -> tuple[bool, str]:
-    from .settings import TARGET_VARIETIES
+def load_close_series(
+    conn: pymysql.Connection, variety_ids: list[int], end_date: date | None = None
+) -> dict[int, pd.DataFrame]:
+    """一次 IN 查询读取多个品种的收盘价序列，返回 {variety_id: DataFrame(trade_date, close_price)}，trade_date 升序。"""
+    if not variety_ids:
+        return {}
+    vids = sorted(set(variety_ids))
+    sql = (
+        f"SELECT variety_id, trade_date, close_price FROM fut_daily_close "
+        f"WHERE variety_id IN ({','.join(['%s'] * len(vids))})"
+    )
+    args: tuple = tuple(vids)
+    if end_date is not None:
+        sql += " AND trade_date<=%s"
+        args += (end_date,)
+    with conn.cursor() as cur:
+        cur.execute(sql + " ORDER BY variety_id, trade_date", args)
+        df = pd.DataFrame(cur.fetchall(), columns=["variety_id", "trade_date", "close_price"])
+    return {int(vid): g.drop(columns="variety_id").reset_index(drop=True) for vid, g in df.groupby("variety_id")}
+
+
+_COMPLETENESS_SQL = """
+SELECT v.id AS variety_id, v.name,
+       COALESCE(s.has_day, 0) AS has_strength, s.latest AS strength_latest,
+       COALESCE(c.has_day, 0) AS has_close, c.latest AS close_latest
+FROM fut_variety v
+LEFT JOIN (
+    SELECT variety_id, MAX(trade_date) AS latest, MAX(trade_date=%s) AS has_day
+    FROM fut_strength WHERE trade_date<=%s GROUP BY variety_id
+) s ON s.variety_id=v.id
+LEFT JOIN (
+    SELECT variety_id, MAX(trade_date) AS latest, MAX(trade_date=%s) AS has_day
+    FROM fut_daily_close WHERE trade_date<=%s GROUP BY variety_id
+) c ON c.variety_id=v.id
+ORDER BY v.name
+"""
+
 
+def load_completeness_report(conn: pymysql.Connection, trade_date: str) -> list[dict]:
+    """一条聚合查询返回每个品种在 trade_date 是否有强度 / 收盘价数据，以及截至该日两张表各自的最新日期。"""
     with conn.cursor() as cur:
-        cur.execute(
-            "SELECT COUNT(DISTINCT variety_id) AS cnt FROM fut_strength WHERE trade_date=%s",
-            (trade_date,),
-        )
-        row = cur.fetchone()
-        actual = row["cnt"] if row else 0
+        cur.execute(_COMPLETENESS_SQL, (trade_date,) * 4)
+        rows = cur.fetchall()
+    return [
+        {
+            "variety_id": int(r["variety_id"]),
+            "name": r["name"],
+            "has_strength": bool(r["has_strength"]),
+            "strength_latest": r["strength_latest"],
+            "has_close": bool(r["has_close"]),
+            "close_latest": r["close_latest"],
+        }
+        for r in rows
+    ]
 
-        cur.execute("SELECT COUNT(*) AS cnt FROM fut_variety")
-        row = cur.fetchone()
-        total = row["cnt"] if row else 0
 
-        cur.execute(
-            "SELECT v.name FROM fut_variety v "
-            "LEFT JOIN fut_strength s ON s.variety_id=v.id AND s.trade_date=%s "
-            "WHERE s.variety_id IS NULL ORDER BY v.name",
-            (trade_date,),
-        )
-        missing = [r["name"] for r in cur.fetchall()]
+def check_data_completeness(conn: pymysql.Connection, trade_date: str) -> tuple[bool, str]:
+    """池子A品种当日缺少强度或收盘价任一数据即校验失败（收盘价缺失会导致后续开平仓和净值计算失败）。"""
+    from .settings import TARGET_VARIETIES
 
-    pool_missing = [n for n in TARGET_VARIETIES if n in missing]
-    if pool_missing:
-        return False, f"池子A品种数据缺失：{pool_missing}"
-    return True, f"数据完整，共 {actual}/{total} 个品种有当日数据"
+    report = load_completeness_report(conn, trade_date)
+    total = len(report)
+    strength_cnt = sum(r["has_strength"] for r in report)
+    close_cnt = sum(r["has_close"] for r in report)
+
+    pool = set(TARGET_VARIETIES)
+    problems = []
+    for r in report:
+        if r["name"] not in pool:
+            continue
+        missing = [label for label, ok in (("强度", r["has_strength"]), ("收盘价", r["has_close"])) if not ok]
+        if missing:
+            problems.append(
+                f"{r['name']}({'/'.join(missing)}，最新强度 {r['strength_latest']}，最新收盘价 {r['close_latest']})"
+            )
+    if problems:
+        return False, f"池子A品种数据缺失：{problems}"
+    return True, f"数据完整，强度 {strength_cnt}/{total}、收盘价 {close_cnt}/{total} 个品种有当日数据"
@@ -1,7 +1,13 @@
 from __future__ import annotations
 
 import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator
 
 import pymysql
 import pymysql.cursors
@@ -34,3 +40,171 @@ def get_connection() -> pymysql.Connection:
         charset="utf8mb4",
         cursorclass=pymysql.cursors.DictCursor,
     )
+
+
+_pool: list[pymysql.Connection] = []
+_pool_lock = threading.Lock()
+
+
+def _pool_size() -> int:
+    _ensure_env()
+    return int(os.getenv("DB_POOL_SIZE", 4))
+
+
+def _release(conn: pymysql.Connection) -> None:
+    if conn.open:
+        with _pool_lock:
+            if len(_pool) < _pool_size():
+                _pool.append(conn)
+                return
+        conn.close()
+
+
+@contextmanager
+def pooled_connection() -> Iterator[pymysql.Connection]:
+    """从进程内连接池借出连接，退出时回滚未提交事务并归还；池中连接失效时自动重连。"""
+    with _pool_lock:
+        conn = _pool.pop() if _pool else None
+    if conn is None:
+        conn = get_connection()
+    else:
+        conn.ping(reconnect=True)
+    try:
+        yield conn
+    finally:
+        try:
+            conn.rollback()
+        except pymysql.Error:
+            # 连接已断开，不再归还
+            pass
+        else:
+            _release(conn)
+
+
+def close_pool() -> None:
+    """关闭池中全部空闲连接。"""
+    with _pool_lock:
+        conns = list(_pool)
+        _pool.clear()
+    for conn in conns:
+        conn.close()
+
+
+_IN_LIST = re.compile(r"IN \((?:%s\s*,\s*)*%s\)")
+
+
+def _sql_key(sql: str) -> str:
+    sql = " ".join(sql.split())
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return sql if len(sql) <= 120 else sql[:117] + "..."
+
+
+class QueryStats:
+    """按步骤统计 SQL 次数与耗时（execute/executemany 及随后的 fetch 时间）。"""
+
+    def __init__(self) -> None:
+        self.current_step = "(未分步)"
+        self.steps: dict[str, dict[str, list]] = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        previous, self.current_step = self.current_step, name
+        try:
+            yield
+        finally:
+            self.current_step = previous
+
+    def record(self, sql: str, seconds: float, count: int = 1) -> None:
+        entry = self.steps[self.current_step][_sql_key(sql)]
+        entry[0] += count
+        entry[1] += seconds
+
+    def add_time(self, sql: str, seconds: float) -> None:
+        self.record(sql, seconds, count=0)
+
+    def summary(self, top: int = 5) -> list[str]:
+        """每个步骤一行合计，附耗时最高的 top 条语句。"""
+        lines: list[str] = []
+        total_n, total_t = 0, 0.0
+        for step, stmts in self.steps.items():
+            n = sum(v[0] for v in stmts.values())
+            t = sum(v[1] for v in stmts.values())
+            total_n, total_t = total_n + n, total_t + t
+            lines.append(f"{step}: {n} 条 SQL，{t * 1000:.1f} ms")
+            for sql, (cnt, sec) in sorted(stmts.items(), key=lambda kv: -kv[1][1])[:top]:
+                lines.append(f"    {cnt:6d} 次 {sec * 1000:9.1f} ms  {sql}")
+        lines.append(f"合计: {total_n} 条 SQL，{total_t * 1000:.1f} ms")
+        return lines
+
+
+class _InstrumentedCursor:
+    def __init__(self, cursor, stats: QueryStats) -> None:
+        self._cursor = cursor
+        self._stats = stats
+        self._last_sql = ""
+
+    def __enter__(self) -> _InstrumentedCursor:
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._cursor.__exit__(exc_type, exc, tb)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, sql, args=None):
+        self._last_sql = sql
+        t0 = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, args)
+        finally:
+            self._stats.record(sql, time.perf_counter() - t0)
+
+    def executemany(self, sql, args):
+        self._last_sql = sql
+        t0 = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, args)
+        finally:
+            self._stats.record(sql, time.perf_counter() - t0)
+
+    def _timed_fetch(self, method: str, *args):
+        t0 = time.perf_counter()
+        try:
+            return getattr(self._cursor, method)(*args)
+        finally:
+            self._stats.add_time(self._last_sql, time.perf_counter() - t0)
+
+    def fetchone(self):
+        return self._timed_fetch("fetchone")
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch("fetchmany", size) if size is not None else self._timed_fetch("fetchmany")
+
+    def fetchall(self):
+        return self._timed_fetch("fetchall")
+
+
+class InstrumentedConnection:
+    """包装 pymysql 连接，所有游标的语句计入 stats；其余属性透传给原连接。"""
+
+    def __init__(self, conn: pymysql.Connection, stats: QueryStats | None = None) -> None:
+        self._conn = conn
+        self.stats = stats or QueryStats()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs) -> _InstrumentedCursor:
+        return _InstrumentedCursor(self._conn.cursor(*args, **kwargs), self.stats)
+
+    def commit(self) -> None:
+        t0 = time.perf_counter()
+        try:
+            self._conn.commit()
+        finally:
+            self.stats.record("COMMIT", time.perf_counter() - t0)
@@ -0,0 +1,188 @@
+"""
+流式 A 通道信号引擎。
+逐 bar 调用 SignalEngine.update，每个品种只保留固定长度的环形缓冲（7 日主力窗口、最近 3 个散户值、
+MOMENTUM_LOOKBACK 个 |m3|）和连续性计数，单次更新与历史长度无关；输出与 compute_signals 对应行一致。
+引擎状态可经 to_dict / from_dict 序列化为 JSON，OCR 结果落库前即可计算当日信号，无需从 MySQL 装载历史。
+"""
+from __future__ import annotations
+
+import math
+from collections import deque
+from datetime import date, datetime
+
+from .settings import MOMENTUM_LOOKBACK
+from .signals import make_cycle_id
+
+# 主力窗口：当前值 + bg1..bg5 所需的前 6 个值
+_MAIN_WINDOW = 7
+# 散户窗口：当前值与前两个值，用于 retail_diff(t) / retail_diff(t-1)
+_RETAIL_WINDOW = 3
+_CONT7_RUN = 6
+_CONT3_RUN = 2
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def _new_variety_state(momentum_lookback: int) -> dict:
+    return {
+        "last_date": None,
+        "run": 0,
+        "main": deque(maxlen=_MAIN_WINDOW),
+        "retail": deque(maxlen=_RETAIL_WINDOW),
+        "abs_m3": deque(maxlen=momentum_lookback),
+        "state": "none",
+        "cycle_id": None,
+        "open_date": None,
+    }
+
+
+class SignalEngine:
+    """按品种维护滚动状态的 A 通道信号引擎，update 必须按 trade_date 严格递增调用。"""
+
+    def __init__(self, momentum_lookback: int = MOMENTUM_LOOKBACK) -> None:
+        if momentum_lookback <= 0:
+            raise ValueError("momentum_lookback 必须为正整数")
+        self.momentum_lookback = momentum_lookback
+        self._varieties: dict[int, dict] = {}
+
+    def update(self, variety_id: int, trade_date, main_force: float, retail: float, close: float) -> dict:
+        """推入一条 bar，返回该 bar 的四个 A 通道信号、理论状态变迁与 main_score。"""
+        trade_date = _as_date(trade_date)
+        st = self._varieties.get(variety_id)
+        if st is None:
+            st = self._varieties[variety_id] = _new_variety_state(self.momentum_lookback)
+        if st["last_date"] is not None and trade_date <= st["last_date"]:
+            raise ValueError(f"品种 {variety_id} 的 trade_date 必须递增：{trade_date} <= {st['last_date']}")
+
+        date_cont = st["last_date"] is None or (trade_date - st["last_date"]).days <= 7
+        # 连续性计数封顶在 cont7 所需长度，状态大小固定
+        st["run"] = min(st["run"] + 1, _CONT7_RUN) if date_cont else 0
+        st["last_date"] = trade_date
+
+        main, retail_buf = st["main"], st["retail"]
+        main.append(float(main_force))
+        retail_buf.append(float(retail))
+        nan = math.nan
+        m = [nan] * (_MAIN_WINDOW - len(main)) + list(main)  # m[6] 为当前值，m[6-k] 为 shift(k)
+        r = [nan] * (_RETAIL_WINDOW - len(retail_buf)) + list(retail_buf)
+
+        main_diff, main_diff_t1 = m[6] - m[5], m[5] - m[4]
+        retail_diff, retail_diff_t1 = r[2] - r[1], r[1] - r[0]
+        bg1, bg2, bg3, bg4, bg5 = m[0], m[1], m[2], m[3], m[4]
+        m3 = m[6] - bg5
+        cont7 = st["run"] >= _CONT7_RUN
+        cont3 = st["run"] >= _CONT3_RUN
+
+        # NaN 参与比较恒为 False，与 pandas 的 gt/lt 语义一致
+        bgs = (bg1, bg2, bg3, bg4)
+        long_bg = all(v < 0 for v in (*bgs, bg5)) and all(bg5 < v for v in bgs)
+        short_bg = all(v > 0 for v in (*bgs, bg5)) and all(bg5 > v for v in bgs)
+        open_long = (cont7 and long_bg and main_diff_t1 > 0 and main_diff > 0
+                     and retail_diff_t1 < 0 and retail_diff < 0)
+        open_short = (cont7 and short_bg and main_diff_t1 < 0 and main_diff < 0
+                      and retail_diff_t1 > 0 and retail_diff > 0)
+        close_long = cont3 and m3 < 0
+        close_short = cont3 and m3 > 0
+
+        abs_m3 = st["abs_m3"]
+        main_score = nan
+        if len(abs_m3) == self.momentum_lookback and not math.isnan(m3) \
+                and not any(math.isnan(v) for v in abs_m3):
+            main_score = sum(1 for v in abs_m3 if v <= abs(m3)) / self.momentum_lookback
+        abs_m3.append(abs(m3))
+
+        result = self._advance_state(st, variety_id, trade_date, open_long, open_short, close_long, close_short)
+        result.update(
+            {
+                "variety_id": variety_id,
+                "trade_date": trade_date,
+                "close": float(close),
+                "A_OPEN_LONG": open_long,
+                "A_OPEN_SHORT": open_short,
+                "m3": m3,
+                "main_score": main_score,
+            }
+        )
+        return result
+
+    @staticmethod
+    def _advance_state(
+        st: dict,
+        variety_id: int,
+        trade_date: date,
+        open_long: bool,
+        open_short: bool,
+        close_long: bool,
+        close_short: bool,
+    ) -> dict:
+        """理论状态机单步，规则与 signals._scan_theory_state 一致。"""
+        state_before = st["state"]
+        role = direction = cycle_id = related_open_date = None
+        if close_long and state_before == "long":
+            role, direction, cycle_id, related_open_date = "close", "LONG", st["cycle_id"], st["open_date"]
+            st["state"], st["cycle_id"], st["open_date"] = "none", None, None
+        elif close_short and state_before == "short":
+            role, direction, cycle_id, related_open_date = "close", "SHORT", st["cycle_id"], st["open_date"]
+            st["state"], st["cycle_id"], st["open_date"] = "none", None, None
+        elif open_long or open_short:
+            role, direction = "open", "LONG" if open_long else "SHORT"
+            cycle_id = make_cycle_id(variety_id, direction, trade_date)
+            st["state"] = "long" if open_long else "short"
+            st["cycle_id"], st["open_date"] = cycle_id, trade_date
+        return {
+            "A_CLOSE_LONG": role == "close" and direction == "LONG",
+            "A_CLOSE_SHORT": role == "close" and direction == "SHORT",
+            "signal_role": role,
+            "direction": direction,
+            "cycle_id": cycle_id,
+            "related_open_date": related_open_date,
+            "theory_state_before": state_before,
+            "theory_state_after": st["state"],
+        }
+
+    def to_dict(self) -> dict:
+        """导出可 JSON 序列化的引擎状态（日期为 ISO 字符串，NaN 为 None）。"""
+        def _iso(d: date | None) -> str | None:
+            return d.isoformat() if d is not None else None
+
+        def _floats(buf: deque) -> list[float | None]:
+            return [None if math.isnan(v) else v for v in buf]
+
+        return {
+            "momentum_lookback": self.momentum_lookback,
+            "varieties": {
+                str(vid): {
+                    "last_date": _iso(st["last_date"]),
+                    "run": st["run"],
+                    "main": _floats(st["main"]),
+                    "retail": _floats(st["retail"]),
+                    "abs_m3": _floats(st["abs_m3"]),
+                    "state": st["state"],
+                    "cycle_id": st["cycle_id"],
+                    "open_date": _iso(st["open_date"]),
+                }
+                for vid, st in self._varieties.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> SignalEngine:
+        """从 to_dict 的结果恢复引擎。"""
+        engine = cls(int(data["momentum_lookback"]))
+        for vid, raw in data["varieties"].items():
+            st = _new_variety_state(engine.momentum_lookback)
+            st["last_date"] = _as_date(raw["last_date"]) if raw["last_date"] else None
+            st["run"] = int(raw["run"])
+            for key in ("main", "retail", "abs_m3"):
+                st[key].extend(math.nan if v is None else float(v) for v in raw[key])
+            st["state"] = raw["state"]
+            st["cycle_id"] = raw["cycle_id"]
+            st["open_date"] = _as_date(raw["open_date"]) if raw["open_date"] else None
+            engine._varieties[int(vid)] = st
+        return engine
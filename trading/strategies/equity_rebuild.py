@@ -0,0 +1,201 @@
+"""
+资金曲线重建。
+一次装载 trading_positions 与相关品种的 fut_daily_close，用 (持仓 × 日期) 矩阵一次算出区间内每天的
+daily_pnl / position_val，再按 equity_t = equity_{t-1} × (1 + 当日收益率) 累乘得到整条曲线，批量写回 trading_account_daily。
+口径与逐日 update_account_daily 一致（杠杆、size_pct、base_price 约定相同）。
+
+运行：python -m trading.strategies.equity_rebuild [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import numpy as np
+import pandas as pd
+import pymysql
+
+from trading.strategies.data_loader import load_close_series
+from trading.strategies.settings import INITIAL_CAPITAL, LEVERAGE
+
+logger = logging.getLogger("equity_rebuild")
+
+
+def compute_equity_curve(
+    positions: pd.DataFrame,
+    closes: dict[int, pd.DataFrame],
+    dates: np.ndarray,
+    start_equity: float,
+) -> pd.DataFrame:
+    """按 update_account_daily 的规则计算 dates 上每天的 equity / cash / position_val / daily_pnl。
+
+    positions 需含 variety_id, direction, open_date, open_price, size_pct, status, close_date, close_price；
+    closes 为 {variety_id: DataFrame(trade_date, close_price)}，trade_date 升序；dates 为升序的 datetime64[D]。
+    某天 d 的持仓视角与当天运行 daily_run 时一致：open_date <= d 且未在 d 之前平仓的为持仓中，close_date == d 的为当日平仓。
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    n_days = len(dates)
+    if n_days == 0:
+        return pd.DataFrame(columns=["record_date", "equity", "cash", "position_val", "daily_pnl"])
+
+    m = len(positions)
+    cur = np.full((m, n_days), np.nan)
+    prev = np.full((m, n_days), np.nan)
+    series_cache: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+    for i, vid in enumerate(positions["variety_id"].astype(int)):
+        if vid not in series_cache:
+            s = closes.get(vid)
+            if s is None or s.empty:
+                day_price = prev_price = np.full(n_days, np.nan)
+            else:
+                cdates = s["trade_date"].to_numpy(dtype="datetime64[D]")
+                cprices = s["close_price"].to_numpy(dtype=float)
+                pos = np.searchsorted(cdates, dates, side="left")
+                at = np.minimum(pos, len(cdates) - 1)
+                day_price = np.where((pos < len(cdates)) & (cdates[at] == dates), cprices[at], np.nan)
+                # 严格早于 d 的最近一条收盘价（_get_prev_close）
+                prev_price = np.where(pos > 0, cprices[np.maximum(pos - 1, 0)], np.nan)
+            series_cache[vid] = (day_price, prev_price)
+        cur[i], prev[i] = series_cache[vid]
+
+    open_date = positions["open_date"].to_numpy(dtype="datetime64[D]")[:, None]
+    close_date = positions["close_date"].to_numpy(dtype="datetime64[D]")[:, None]
+    is_closed = (positions["status"].to_numpy() == "closed")[:, None]
+    open_price = positions["open_price"].to_numpy(dtype=float)[:, None]
+    close_price = positions["close_price"].to_numpy(dtype=float)[:, None]
+    size_pct = positions["size_pct"].to_numpy(dtype=float)[:, None]
+    sign = np.where(positions["direction"].to_numpy() == "LONG", 1.0, -1.0)[:, None]
+    day = dates[None, :]
+
+    started = open_date <= day
+    closed_before_or_on = is_closed & (close_date <= day)
+    holding = started & ~closed_before_or_on & ~np.isnan(cur)
+    closed_today = is_closed & (close_date == day)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        base = np.where(open_date == day, open_price, prev)
+        end = np.where(closed_today, close_price, cur)
+        valid = (holding | closed_today) & ~np.isnan(base) & (base != 0)
+        ret = np.where(valid, sign * (end - base) / base, 0.0)
+        float_ret = np.where(holding, sign * (cur - open_price) / open_price, 0.0)
+
+    pnl_rate = (size_pct * ret * LEVERAGE).sum(axis=0)
+    val_rate = np.where(holding, size_pct * (1 + float_ret * LEVERAGE), 0.0).sum(axis=0)
+
+    equity = start_equity * np.cumprod(1 + pnl_rate)
+    prev_equity = np.concatenate([[start_equity], equity[:-1]])
+    daily_pnl = prev_equity * pnl_rate
+    position_val = prev_equity * val_rate
+    return pd.DataFrame(
+        {
+            "record_date": dates.astype(object),
+            "equity": equity,
+            "cash": equity - position_val,
+            "position_val": position_val,
+            "daily_pnl": daily_pnl,
+        }
+    )
+
+
+def _load_positions(conn: pymysql.Connection, end: date) -> pd.DataFrame:
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT variety_id, direction, open_date, open_price, size_pct, status, close_date, close_price "
+            "FROM trading_positions WHERE open_date<=%s ORDER BY id",
+            (end,),
+        )
+        rows = cur.fetchall()
+    return pd.DataFrame(
+        rows,
+        columns=["variety_id", "direction", "open_date", "open_price", "size_pct", "status", "close_date", "close_price"],
+    )
+
+
+def rebuild_account_daily(conn: pymysql.Connection, start: date | None = None, end: date | None = None) -> int:
+    """重建 [start, end] 区间的 trading_account_daily，返回写入行数。
+
+    曲线日期取区间内 fut_daily_close 出现过的交易日；起始权益为 start 之前最近一条记录，没有时为 INITIAL_CAPITAL。
+    区间内旧记录先删除再批量写入，整个过程一个事务。
+    """
+    with conn.cursor() as cur:
+        if start is None:
+            cur.execute("SELECT MIN(open_date) AS d FROM trading_positions")
+            row = cur.fetchone()
+            start = row["d"] if row and row["d"] else None
+        if end is None:
+            cur.execute("SELECT MAX(trade_date) AS d FROM fut_daily_close")
+            row = cur.fetchone()
+            end = row["d"] if row and row["d"] else None
+        if start is None or end is None or start > end:
+            return 0
+        cur.execute(
+            "SELECT DISTINCT trade_date FROM fut_daily_close WHERE trade_date BETWEEN %s AND %s ORDER BY trade_date",
+            (start, end),
+        )
+        dates = np.array([r["trade_date"] for r in cur.fetchall()], dtype="datetime64[D]")
+        cur.execute(
+            "SELECT equity FROM trading_account_daily WHERE record_date<%s ORDER BY record_date DESC LIMIT 1",
+            (start,),
+        )
+        row = cur.fetchone()
+        start_equity = float(row["equity"]) if row else INITIAL_CAPITAL
+
+    positions = _load_positions(conn, end)
+    closes = load_close_series(conn, [int(v) for v in positions["variety_id"]], end)
+    curve = compute_equity_curve(positions, closes, dates, start_equity)
+
+    rows = [
+        (r.record_date, float(r.equity), float(r.cash), float(r.position_val), float(r.daily_pnl))
+        for r in curve.itertuples(index=False)
+    ]
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM trading_account_daily WHERE record_date BETWEEN %s AND %s", (start, end))
+            if rows:
+                cur.executemany(
+                    "INSERT INTO trading_account_daily (record_date, equity, cash, position_val, daily_pnl) "
+                    "VALUES (%s,%s,%s,%s,%s)",
+                    rows,
+                )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if rows:
+        logger.info(
+            "资金曲线重建 %s ~ %s，共 %d 天，期末 equity=%.2f", start, end, len(rows), rows[-1][1]
+        )
+    return len(rows)
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description="按 trading_positions 重建 trading_account_daily 资金曲线")
+    parser.add_argument("--start", type=_parse_date, default=None, help="起始日期，默认最早开仓日")
+    parser.add_argument("--end", type=_parse_date, default=None, help="结束日期，默认最新收盘价日期")
+    args = parser.parse_args()
+
+    from trading.strategies.db import get_connection
+
+    conn = get_connection()
+    try:
+        rebuild_account_daily(conn, args.start, args.end)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
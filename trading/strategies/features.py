@@ -0,0 +1,226 @@
+"""
+A 通道特征库。
+把 compute_features 产出的 (variety_id, trade_date) 级中间特征持久化到 trading_features。
+trading_feature_sync 记录两张来源表已同步到的 collected_at 水位线：每次同步找出水位线（含）之后写入或修订过的行，
+按品种从最早变动日期起重算（带 warmup_bars 条上下文），水位线之前被修订或迟到的行情也会反映到特征库。
+信号引擎（run_signals_for_all(use_features=True)）、extra_json 与 /trading/market-context 直接读取特征。
+
+运行：python -m trading.strategies.features [--rebuild]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import numpy as np
+import pandas as pd
+import pymysql
+
+from trading.strategies.settings import MOMENTUM_LOOKBACK
+from trading.strategies.signals import FEATURE_COLUMNS, compute_features, warmup_bars
+
+logger = logging.getLogger("features")
+
+STORE_COLUMNS = ("main_force", "retail", "close", *FEATURE_COLUMNS)
+_BOOL_COLUMNS = ("date_cont", "cont7", "cont3")
+
+_SOURCE_TABLES = ("fut_strength", "fut_daily_close")
+_UPSERT_SOURCE_SQL = (
+    "INSERT INTO trading_feature_sync (source_table, collected_at) VALUES (%s, %s) "
+    "ON DUPLICATE KEY UPDATE collected_at=VALUES(collected_at)"
+)
+
+_UPSERT_FEATURE_SQL = (
+    f"INSERT INTO trading_features (variety_id, trade_date, {', '.join(STORE_COLUMNS)}) "
+    f"VALUES (%s, %s, {', '.join(['%s'] * len(STORE_COLUMNS))}) "
+    f"ON DUPLICATE KEY UPDATE {', '.join(f'{c}=VALUES({c})' for c in STORE_COLUMNS)}"
+)
+
+
+def load_feature_watermarks(conn: pymysql.Connection) -> dict[int, date]:
+    """各品种已入库特征的最大 trade_date。"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT variety_id, MAX(trade_date) AS d FROM trading_features GROUP BY variety_id")
+        return {int(r["variety_id"]): r["d"] for r in cur.fetchall()}
+
+
+def load_source_watermarks(conn: pymysql.Connection) -> dict[str, object]:
+    """特征库已同步到的来源表 collected_at 水位线 {表名: collected_at}。"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT source_table, collected_at FROM trading_feature_sync")
+        return {r["source_table"]: r["collected_at"] for r in cur.fetchall()}
+
+
+def _latest_collected(conn: pymysql.Connection) -> dict[str, object]:
+    with conn.cursor() as cur:
+        marks = {}
+        for table in _SOURCE_TABLES:
+            cur.execute(f"SELECT MAX(collected_at) AS last_collected FROM {table}")
+            row = cur.fetchone()
+            marks[table] = row["last_collected"] if row else None
+    return marks
+
+
+def _changed_since(conn: pymysql.Connection, source_marks: dict[str, object]) -> tuple[dict[int, date], dict[str, object]]:
+    """各品种在来源水位线（含）之后写入或修订过的最早 trade_date，以及两张来源表新的水位线。"""
+    changed: dict[int, date] = {}
+    marks: dict[str, object] = {}
+    with conn.cursor() as cur:
+        for table in _SOURCE_TABLES:
+            # >=：同一秒内晚于上次同步写入的行也能取到，重复发现只会多重算几行
+            cur.execute(
+                f"SELECT variety_id, MIN(trade_date) AS first_date, MAX(collected_at) AS last_collected "
+                f"FROM {table} WHERE collected_at >= %s GROUP BY variety_id",
+                (source_marks[table],),
+            )
+            rows = cur.fetchall()
+            marks[table] = max((r["last_collected"] for r in rows), default=source_marks[table])
+            for r in rows:
+                vid = int(r["variety_id"])
+                changed[vid] = min(changed.get(vid, r["first_date"]), r["first_date"])
+    return changed, marks
+
+
+def feature_rows(variety_id: int, feat_df: pd.DataFrame, after: date | None = None) -> list[tuple]:
+    """把特征表中 trade_date > after 的行转换为 trading_features 的写入参数（NaN 写 NULL）。"""
+    if feat_df.empty:
+        return []
+    mask = np.ones(len(feat_df), dtype=bool)
+    if after is not None:
+        mask = (feat_df["trade_date"].to_numpy() > np.datetime64(after)).astype(bool)
+    if not mask.any():
+        return []
+    sub = feat_df.loc[mask]
+    columns = []
+    for col in STORE_COLUMNS:
+        if col in _BOOL_COLUMNS:
+            columns.append(sub[col].astype(int).tolist())
+        else:
+            values = sub[col].to_numpy(dtype=float)
+            columns.append([None if np.isnan(v) else float(v) for v in values])
+    dates = sub["trade_date"].dt.date.tolist()
+    return [(variety_id, d, *vals) for d, *vals in zip(dates, *columns)]
+
+
+def sync_features(conn: pymysql.Connection, rebuild: bool = False, batch_size: int = 5000) -> int:
+    """把来源水位线之后写入或修订过的强度 / 收盘价数据同步到 trading_features，返回写入行数。
+
+    变动品种只读取 min(特征水位线, 最早变动日期前一天) 之前 warmup_bars 条上下文和之后的数据，在这段尾部上计算特征
+    （滚动窗口所需的历史已齐全，结果与全历史计算一致），先删除该日期之后的旧特征再写入；尚无特征的品种按全历史计算。
+    rebuild=True 或尚无来源水位线时清空后全部重写。特征与来源水位线在一个事务内写入。
+    """
+    from trading.strategies.data_loader import load_all_varieties_data, load_varieties_data, load_variety_since
+
+    source_marks = load_source_watermarks(conn)
+    if not rebuild and any(table not in source_marks for table in _SOURCE_TABLES):
+        logger.info("trading_feature_sync 尚无来源水位线，按全历史重建一次")
+        rebuild = True
+
+    after: dict[int, date] = {}
+    if rebuild:
+        # 先取水位线再装载数据：装载期间新写入的行下次同步会再次被发现
+        new_marks = _latest_collected(conn)
+        watermarks: dict[int, date] = {}
+        frames = load_all_varieties_data(conn)
+    else:
+        changed, new_marks = _changed_since(conn, source_marks)
+        if not changed:
+            logger.info("来源数据在水位线之后没有变动，trading_features 无需同步")
+            return 0
+        watermarks = load_feature_watermarks(conn)
+        fresh = [vid for vid in changed if vid not in watermarks]
+        frames = load_varieties_data(conn, fresh) if fresh else {}
+        context = warmup_bars(MOMENTUM_LOOKBACK)
+        for vid, first_date in changed.items():
+            if vid not in watermarks:
+                continue
+            after[vid] = min(watermarks[vid], first_date - timedelta(days=1))
+            tail = load_variety_since(conn, vid, after[vid], context)
+            if not tail.empty:
+                frames[vid] = tail
+
+    rows: list[tuple] = []
+    for vid, df in frames.items():
+        rows.extend(feature_rows(vid, compute_features(df), after.get(vid)))
+
+    try:
+        with conn.cursor() as cur:
+            if rebuild:
+                cur.execute("DELETE FROM trading_features")
+            elif after:
+                # 修订后变为空值的行不会再产出特征，先删掉重算起点之后的旧行
+                cur.executemany(
+                    "DELETE FROM trading_features WHERE variety_id=%s AND trade_date>%s", list(after.items())
+                )
+            for start in range(0, len(rows), batch_size):
+                cur.executemany(_UPSERT_FEATURE_SQL, rows[start : start + batch_size])
+            cur.executemany(_UPSERT_SOURCE_SQL, [(t, m) for t, m in new_marks.items() if m is not None])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info("trading_features 写入 %d 行（%d 个品种）", len(rows), len(frames))
+    return len(rows)
+
+
+def load_features(
+    conn: pymysql.Connection,
+    end_date: date | None = None,
+    variety_ids: list[int] | None = None,
+) -> dict[int, pd.DataFrame]:
+    """读取特征库，返回 {variety_id: DataFrame}，列与 compute_features 的结果一致。"""
+    sql = f"SELECT variety_id, trade_date, {', '.join(STORE_COLUMNS)} FROM trading_features"
+    where: list[str] = []
+    params: list = []
+    if end_date is not None:
+        where.append("trade_date<=%s")
+        params.append(end_date)
+    if variety_ids:
+        where.append(f"variety_id IN ({','.join(['%s'] * len(variety_ids))})")
+        params.extend(variety_ids)
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY variety_id, trade_date"
+
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        df = pd.DataFrame(cur.fetchall(), columns=["variety_id", "trade_date", *STORE_COLUMNS])
+
+    if df.empty:
+        return {}
+    df["trade_date"] = pd.to_datetime(df["trade_date"])
+    for col in STORE_COLUMNS:
+        df[col] = df[col].astype(bool) if col in _BOOL_COLUMNS else df[col].astype(float)
+
+    result: dict[int, pd.DataFrame] = {}
+    for vid, group in df.groupby("variety_id", sort=True):
+        result[int(vid)] = group.drop(columns="variety_id").reset_index(drop=True)
+    return result
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description="同步 A 通道特征库 trading_features")
+    parser.add_argument("--rebuild", action="store_true", help="清空后按全历史重建")
+    args = parser.parse_args()
+
+    from trading.strategies.db import get_connection
+
+    conn = get_connection()
+    try:
+        sync_features(conn, rebuild=args.rebuild)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
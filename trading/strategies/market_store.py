@@ -0,0 +1,225 @@
+"""
+fut_strength / fut_daily_close 的本地列式镜像。
+每个品种每张表一个 .npz（trade_date 按天编码为 int64，数值列为 float64），meta.json 记录两张表已同步的
+collected_at 水位线。同步只拉取 collected_at >= 水位线的行并按 trade_date 覆盖合并，重复同步是幂等的。
+镜像默认关闭；开启后 data_loader 的多品种装载先同步再读本地镜像，镜像不可用时回退 MySQL。
+每个 MySQL 库（host_port_db）各用一个子目录，连接不同的库不会读到彼此的数据。
+
+目录：环境变量 TRADING_MARKET_STORE=on 时使用 trading/.market_store，其他非空值视为目录路径；未设置或 off 为关闭。
+运行：python -m trading.strategies.market_store [--rebuild]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import numpy as np
+import pandas as pd
+import pymysql
+import pymysql.cursors
+
+logger = logging.getLogger("market_store")
+
+_DEFAULT_DIR = Path(__file__).resolve().parent.parent / ".market_store"
+_META_FILE = "meta.json"
+_FETCH_SIZE = 10000
+
+# 表名 → (文件前缀, 数值列在 MySQL 中的列名, 本地列名)
+_TABLES = {
+    "fut_strength": ("strength", ("main_force", "retail"), ("main_force", "retail")),
+    "fut_daily_close": ("close", ("close_price",), ("close",)),
+}
+
+
+def store_dir(conn: pymysql.Connection | None = None) -> Path | None:
+    """本地镜像目录；TRADING_MARKET_STORE 未设置或为 off 时返回 None。传入 conn 时返回该库对应的子目录。"""
+    value = os.getenv("TRADING_MARKET_STORE", "").strip()
+    if not value or value.lower() == "off":
+        return None
+    root = _DEFAULT_DIR if value.lower() == "on" else Path(value)
+    return root if conn is None else root / connection_key(conn)
+
+
+def connection_key(conn: pymysql.Connection) -> str:
+    """连接对应的镜像子目录名 host_port_db；无法识别 host / db 时抛出 RuntimeError。"""
+    host, db = getattr(conn, "host", None), getattr(conn, "db", None)
+    if isinstance(db, bytes):
+        db = db.decode()
+    if not host or not db:
+        raise RuntimeError("无法从连接识别 host / db，不能确定镜像目录")
+    return re.sub(r"[^\w.-]", "_", f"{host}_{getattr(conn, 'port', 3306)}_{db}")
+
+
+def _read_meta(root: Path) -> dict:
+    path = root / _META_FILE
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _atomic_write_json(path: Path, data: dict) -> None:
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _table_path(root: Path, prefix: str, variety_id: int) -> Path:
+    return root / f"{prefix}_{variety_id}.npz"
+
+
+def _read_table(path: Path, cols: tuple[str, ...]) -> dict[str, np.ndarray] | None:
+    if not path.exists():
+        return None
+    with np.load(path) as data:
+        return {"days": data["days"], **{c: data[c] for c in cols}}
+
+
+def _write_table(path: Path, arrays: dict[str, np.ndarray]) -> None:
+    tmp = path.with_name(path.stem + ".tmp.npz")
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+def _merge(old: dict[str, np.ndarray] | None, new: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """按 days 合并，同一天以新数据为准，结果按 days 升序。"""
+    if old is None:
+        merged = new
+    else:
+        merged = {k: np.concatenate([old[k], new[k]]) for k in new}
+    # 反转后 np.unique 取到的首次出现即原序列中最后一次出现
+    _, first_rev = np.unique(merged["days"][::-1], return_index=True)
+    keep = len(merged["days"]) - 1 - first_rev
+    return {k: v[keep] for k, v in merged.items()}
+
+
+def _to_days(values: list) -> np.ndarray:
+    return np.array(values, dtype="datetime64[D]").astype(np.int64)
+
+
+def _sync_table(cur, root: Path, table: str, watermark: str | None) -> tuple[int, str | None]:
+    prefix, sql_cols, cols = _TABLES[table]
+    sql = f"SELECT variety_id, trade_date, {', '.join(sql_cols)}, collected_at FROM {table}"
+    params: tuple = ()
+    if watermark:
+        # >=：同一秒内晚于上次同步写入的行也能取到，重复行由合并去重
+        sql += " WHERE collected_at >= %s"
+        params = (watermark,)
+    cur.execute(sql + " ORDER BY variety_id, trade_date", params)
+
+    records: list[tuple] = []
+    while True:
+        chunk = cur.fetchmany(_FETCH_SIZE)
+        if not chunk:
+            break
+        records.extend(chunk)
+    if not records:
+        return 0, watermark
+
+    df = pd.DataFrame.from_records(records, columns=["variety_id", "trade_date", *cols, "collected_at"])
+    for vid, group in df.groupby("variety_id", sort=True):
+        new = {"days": _to_days(group["trade_date"].tolist())}
+        for c in cols:
+            new[c] = group[c].to_numpy(dtype=float)
+        path = _table_path(root, prefix, int(vid))
+        _write_table(path, _merge(_read_table(path, cols), new))
+
+    latest = max(records, key=lambda r: r[-1])[-1]
+    latest = latest.strftime("%Y-%m-%d %H:%M:%S") if isinstance(latest, datetime) else str(latest)
+    return len(records), latest
+
+
+def sync_market_store(conn: pymysql.Connection, rebuild: bool = False, root: Path | None = None) -> dict[str, int]:
+    """把两张行情表在水位线之后新增或更新的行合并进本地镜像，返回 {表名: 拉取行数}。
+
+    rebuild=True 时清空镜像后全量拉取（MySQL 中删除过数据时使用，增量同步无法感知删除）。
+    各品种文件先落盘，meta.json 最后更新；中途失败下次会从旧水位线重新拉取。
+    """
+    root = root or store_dir(conn)
+    if root is None:
+        raise RuntimeError("本地行情镜像未开启（TRADING_MARKET_STORE 未设置或为 off）")
+    root.mkdir(parents=True, exist_ok=True)
+    if rebuild:
+        # 只删除镜像自身的文件，目录可能由 TRADING_MARKET_STORE 指向共享位置
+        for path in [root / _META_FILE, *root.glob("strength_*.npz"), *root.glob("close_*.npz")]:
+            path.unlink(missing_ok=True)
+
+    meta = _read_meta(root)
+    counts: dict[str, int] = {}
+    with conn.cursor(pymysql.cursors.SSCursor) as cur:
+        for table in _TABLES:
+            counts[table], meta[table] = _sync_table(cur, root, table, meta.get(table))
+    _atomic_write_json(root / _META_FILE, meta)
+    return counts
+
+
+def load_local_arrays(variety_ids: list[int], root: Path) -> dict[int, dict[str, np.ndarray]]:
+    """从 root 镜像读取多个品种的原始数组：days（1970-01-01 起的日序号）与 main_force/retail/close，已内连接、未去空值。"""
+    if not (root / _META_FILE).exists():
+        raise RuntimeError("本地行情镜像尚未同步")
+    strength_cols = _TABLES["fut_strength"][2]
+    close_cols = _TABLES["fut_daily_close"][2]
+
+    result: dict[int, dict[str, np.ndarray]] = {}
+    for vid in variety_ids:
+        strength = _read_table(_table_path(root, "strength", vid), strength_cols)
+        close = _read_table(_table_path(root, "close", vid), close_cols)
+        if strength is None or close is None:
+            continue
+        days, si, ci = np.intersect1d(strength["days"], close["days"], return_indices=True)
+        result[int(vid)] = {
+            "days": days,
+            "main_force": strength["main_force"][si],
+            "retail": strength["retail"][si],
+            "close": close["close"][ci],
+        }
+    return result
+
+
+def load_local_varieties(variety_ids: list[int], root: Path) -> dict[int, pd.DataFrame]:
+    """从本地镜像读取多个品种，口径与 data_loader.load_variety_data 一致（内连接 + 删除空值）。"""
+    result: dict[int, pd.DataFrame] = {}
+    for vid, arrays in load_local_arrays(variety_ids, root).items():
+        df = pd.DataFrame(
+            {
+                "trade_date": pd.to_datetime(arrays["days"].astype("datetime64[D]")),
+                "main_force": arrays["main_force"],
+                "retail": arrays["retail"],
+                "close": arrays["close"],
+            }
+        ).dropna()
+        if not df.empty:
+            result[vid] = df.reset_index(drop=True)
+    return result
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description="同步 fut_strength / fut_daily_close 本地镜像")
+    parser.add_argument("--rebuild", action="store_true", help="清空镜像后全量拉取")
+    args = parser.parse_args()
+
+    from trading.strategies.db import get_connection
+
+    conn = get_connection()
+    try:
+        counts = sync_market_store(conn, rebuild=args.rebuild)
+        for table, n in counts.items():
+            logger.info("%s 同步 %d 行", table, n)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,15 @@
 操作建议生成模块。
 输入：当日全品种信号（trading_signals）+ trading_pool + 当前持仓
 过滤逻辑严格对照 simulate_portfolio 中的组合约束步骤。
+
+区间批量重建：python -m trading.strategies.operations --start YYYY-MM-DD --end YYYY-MM-DD
 """
 from __future__ import annotations
 
+import argparse
 import json
 import logging
-from datetime import date
+from datetime import date, datetime
 
 import pymysql
 
@@ -15,6 +18,14 @@ from .settings import MAX_SLOTS
 
 logger = logging.getLogger(__name__)
 
+INSERT_OPERATION_SQL = """
+    INSERT INTO trading_operations
+        (signal_id, signal_date, variety_id, variety_name, sector, signal_type,
+         operation_type, direction, signal_cycle_id, main_score, is_selected,
+         reject_reason, selection_rank, extra_json)
+    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+"""
+
 
 def _get_open_positions(conn: pymysql.Connection, signal_date: date) -> list[dict]:
     # 只取 signal_date 之前开仓的持仓，当天新开的不计入已有槽位
@@ -27,7 +38,7 @@ def _get_open_positions(conn: pymysql.Connection, signal_date: date) -> list[dic
         return list(cur.fetchall())
 
 
-def _get_pool_varieties(conn: pymysql.Connection) -> dict[int, dict]:
+def get_pool_varieties(conn: pymysql.Connection) -> dict[int, dict]:
     with conn.cursor() as cur:
         cur.execute(
             "SELECT variety_id, variety_name, sector FROM trading_pool WHERE is_active=1"
@@ -47,7 +58,7 @@ def _get_today_signals(conn: pymysql.Connection, signal_date: date) -> list[dict
         return list(cur.fetchall())
 
 
-def _get_closed_today(conn: pymysql.Connection, signal_date: date) -> set[int]:
+def get_closed_today(conn: pymysql.Connection, signal_date: date) -> set[int]:
     with conn.cursor() as cur:
         cur.execute(
             "SELECT variety_id FROM trading_positions WHERE close_date=%s AND status='closed'",
@@ -56,20 +67,17 @@ def _get_closed_today(conn: pymysql.Connection, signal_date: date) -> set[int]:
         return {int(r["variety_id"]) for r in cur.fetchall()}
 
 
-def generate_operations(conn: pymysql.Connection, signal_date: date) -> None:
-    pool = _get_pool_varieties(conn)
-    open_positions = _get_open_positions(conn, signal_date)
-    closed_today = _get_closed_today(conn, signal_date)
-    open_signals = _get_today_signals(conn, signal_date)
-
-    # 先清除当日所有记录，确保重跑结果可预期（池子调整、重新计算均干净覆盖）
-    with conn.cursor() as cur:
-        cur.execute("DELETE FROM trading_operations WHERE signal_date=%s", (signal_date,))
-    conn.commit()
-
+def select_operations(
+    pool: dict[int, dict],
+    open_positions: list[dict],
+    closed_today: set[int],
+    open_signals: list[dict],
+    max_slots: int = MAX_SLOTS,
+) -> list[dict]:
+    """对当日开仓信号应用组合约束，返回全部候选；选中的 is_selected=1，其余带 reject_reason。"""
     held_variety_ids = {int(p["variety_id"]) for p in open_positions}
     start_sectors = {p["sector"] for p in open_positions}
-    entry_capacity = MAX_SLOTS - len(held_variety_ids)
+    entry_capacity = max_slots - len(held_variety_ids)
 
     candidates: list[dict] = []
     rejected: list[dict] = []
@@ -99,8 +107,10 @@ def generate_operations(conn: pymysql.Connection, signal_date: date) -> None:
         candidates.append(candidate)
 
     if entry_capacity <= 0:
-        _save_all_rejected(conn, signal_date, rejected + candidates, "capacity_full")
-        return
+        return [
+            {**c, "is_selected": 0, "reject_reason": c.get("reject_reason", "capacity_full")}
+            for c in rejected + candidates
+        ]
 
     sector_filtered: list[dict] = []
     sector_rejected: list[dict] = []
@@ -133,89 +143,130 @@ def generate_operations(conn: pymysql.Connection, signal_date: date) -> None:
         selected.append(c)
         used_sectors.add(c["sector"])
 
+    return [{**c, "is_selected": 1, "reject_reason": None} for c in selected] + [
+        {**c, "is_selected": 0} for c in rejected + sector_rejected + remaining_rejected
+    ]
+
+
+def operation_row(signal_date: date, c: dict) -> tuple:
+    if c["is_selected"]:
+        extra = {"rank_note": "selected", "selection_rank": c["selection_rank"]}
+    else:
+        extra = {"rank_note": c["reject_reason"]}
+    return (
+        c["signal_id"],
+        signal_date,
+        c["variety_id"],
+        c["variety_name"],
+        c["sector"],
+        c["signal_type"],
+        c["operation_type"],
+        c["direction"],
+        c["signal_cycle_id"],
+        None if c["main_score"] != c["main_score"] else c["main_score"],
+        c["is_selected"],
+        c["reject_reason"],
+        c["selection_rank"],
+        json.dumps(extra, ensure_ascii=False),
+    )
+
+
+def _replace_operations(conn: pymysql.Connection, start: date, end: date, rows: list[tuple]) -> None:
+    """删除 [start, end] 的旧建议并多行写入新建议，同一事务内完成，失败时整体回滚。"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM trading_operations WHERE signal_date BETWEEN %s AND %s", (start, end))
+            if rows:
+                # executemany 对 INSERT ... VALUES 会合并为多行 INSERT
+                cur.executemany(INSERT_OPERATION_SQL, rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def generate_operations(conn: pymysql.Connection, signal_date: date) -> int:
+    """重建 signal_date 的操作建议，返回写入行数。"""
+    pool = get_pool_varieties(conn)
+    open_positions = _get_open_positions(conn, signal_date)
+    closed_today = get_closed_today(conn, signal_date)
+    open_signals = _get_today_signals(conn, signal_date)
+
+    # 当日旧记录与新记录在同一事务中替换，重跑结果可预期，中途失败也不会留下空白日
+    ops = select_operations(pool, open_positions, closed_today, open_signals)
+    _replace_operations(conn, signal_date, signal_date, [operation_row(signal_date, c) for c in ops])
+    return len(ops)
+
+
+def generate_operations_range(conn: pymysql.Connection, start: date, end: date) -> int:
+    """批量重建 [start, end] 每个信号日的操作建议，返回写入行数。
+
+    池子、区间内开仓信号和相关持仓各只查询一次；持仓按日期推进维护在内存中，
+    每天的视角与 daily_run 当天执行 Step 2 时一致（早于 Step 3 平仓）：
+    open_date < d 且未在 d 之前平仓的为已有持仓（d 当天平仓的仍占槽位），当日平仓集合为空。
+    """
+    pool = get_pool_varieties(conn)
     with conn.cursor() as cur:
-        for c in selected:
-            cur.execute(
-                """
-                INSERT INTO trading_operations
-                    (signal_id, signal_date, variety_id, variety_name, sector, signal_type,
-                     operation_type, direction, signal_cycle_id, main_score, is_selected,
-                     reject_reason, selection_rank, extra_json)
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,1,NULL,%s,%s)
-                """,
-                (
-                    c["signal_id"],
-                    signal_date,
-                    c["variety_id"],
-                    c["variety_name"],
-                    c["sector"],
-                    c["signal_type"],
-                    c["operation_type"],
-                    c["direction"],
-                    c["signal_cycle_id"],
-                    None if c["main_score"] != c["main_score"] else c["main_score"],
-                    c["selection_rank"],
-                    json.dumps({"rank_note": "selected", "selection_rank": c["selection_rank"]}, ensure_ascii=False),
-                ),
-            )
-        for c in rejected + sector_rejected + remaining_rejected:
-            cur.execute(
-                """
-                INSERT INTO trading_operations
-                    (signal_id, signal_date, variety_id, variety_name, sector, signal_type,
-                     operation_type, direction, signal_cycle_id, main_score, is_selected,
-                     reject_reason, selection_rank, extra_json)
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,0,%s,%s,%s)
-                """,
-                (
-                    c["signal_id"],
-                    signal_date,
-                    c["variety_id"],
-                    c["variety_name"],
-                    c["sector"],
-                    c["signal_type"],
-                    c["operation_type"],
-                    c["direction"],
-                    c["signal_cycle_id"],
-                    None if c["main_score"] != c["main_score"] else c["main_score"],
-                    c["reject_reason"],
-                    c["selection_rank"],
-                    json.dumps({"rank_note": c["reject_reason"]}, ensure_ascii=False),
-                ),
-            )
-    conn.commit()
-
-
-def _save_all_rejected(
-    conn: pymysql.Connection,
-    signal_date: date,
-    candidates: list[dict],
-    reason: str,
-) -> None:
-    with conn.cursor() as cur:
-        for c in candidates:
-            cur.execute(
-                """
-                INSERT INTO trading_operations
-                    (signal_id, signal_date, variety_id, variety_name, sector, signal_type,
-                     operation_type, direction, signal_cycle_id, main_score, is_selected,
-                     reject_reason, selection_rank, extra_json)
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,0,%s,%s,%s)
-                """,
-                (
-                    c["signal_id"],
-                    signal_date,
-                    c["variety_id"],
-                    c["variety_name"],
-                    c["sector"],
-                    c["signal_type"],
-                    c["operation_type"],
-                    c["direction"],
-                    c["signal_cycle_id"],
-                    None if c["main_score"] != c["main_score"] else c["main_score"],
-                    c.get("reject_reason", reason),
-                    c.get("selection_rank"),
-                    json.dumps({"rank_note": c.get("reject_reason", reason)}, ensure_ascii=False),
-                ),
-            )
-    conn.commit()
+        cur.execute(
+            "SELECT id, signal_date, variety_id, variety_name, signal_type, direction, cycle_id, main_score "
+            "FROM trading_signals WHERE signal_date BETWEEN %s AND %s "
+            "AND signal_role='open' ORDER BY signal_date, id",
+            (start, end),
+        )
+        signals = cur.fetchall()
+        cur.execute(
+            "SELECT id, variety_id, variety_name, direction, sector, open_date, close_date "
+            "FROM trading_positions WHERE open_date <= %s AND (close_date IS NULL OR close_date >= %s) "
+            "ORDER BY open_date, id",
+            (end, start),
+        )
+        positions = list(cur.fetchall())
+
+    signals_by_date: dict[date, list[dict]] = {}
+    for sig in signals:
+        signals_by_date.setdefault(sig["signal_date"], []).append(sig)
+
+    active: dict[int, dict] = {}
+    next_pos = 0
+    rows: list[tuple] = []
+    for d in sorted(signals_by_date):
+        while next_pos < len(positions) and positions[next_pos]["open_date"] < d:
+            active[positions[next_pos]["id"]] = positions[next_pos]
+            next_pos += 1
+        for pid, pos in list(active.items()):
+            if pos["close_date"] is not None and pos["close_date"] < d:
+                del active[pid]
+        ops = select_operations(pool, list(active.values()), set(), signals_by_date[d])
+        rows.extend(operation_row(d, c) for c in ops)
+
+    _replace_operations(conn, start, end, rows)
+    logger.info("操作建议批量重建 %s ~ %s：%d 个信号日，%d 条建议", start, end, len(signals_by_date), len(rows))
+    return len(rows)
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description="按区间批量重建 trading_operations")
+    parser.add_argument("--start", required=True, type=_parse_date, help="起始日期 YYYY-MM-DD")
+    parser.add_argument("--end", required=True, type=_parse_date, help="结束日期 YYYY-MM-DD")
+    args = parser.parse_args()
+
+    from .db import get_connection
+
+    conn = get_connection()
+    try:
+        generate_operations_range(conn, args.start, args.end)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+全品种面板信号计算。
+输入按 (variety_id, trade_date) 索引堆叠的强度 + 收盘价面板，用分组感知的 NumPy 位移一次算完全部 A 通道特征，
+再按品种切片运行理论状态机，输出与逐品种 compute_signals 完全一致的信号表。
+"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from .rolling import group_all_true, rolling_percentile
+from .settings import BACKGROUND_WINDOW, MOMENTUM_LOOKBACK
+from .signals import apply_theory_state
+
+PANEL_INDEX = ["variety_id", "trade_date"]
+
+
+def stack_variety_frames(frames: dict[int, pd.DataFrame]) -> pd.DataFrame:
+    """把 {variety_id: load_variety_data 结果} 堆叠为 (variety_id, trade_date) 索引的面板。"""
+    parts = [df.assign(variety_id=vid) for vid, df in frames.items() if not df.empty]
+    if not parts:
+        return pd.DataFrame(
+            columns=["main_force", "retail", "close"],
+            index=pd.MultiIndex.from_arrays([[], pd.DatetimeIndex([])], names=PANEL_INDEX),
+        )
+    panel = pd.concat(parts, ignore_index=True)
+    return panel.set_index(PANEL_INDEX).sort_index()
+
+
+def _group_shift(values: np.ndarray, pos: np.ndarray, k: int) -> np.ndarray:
+    """组内 shift(k)：跨品种边界的位置填 NaN。"""
+    out = np.full(len(values), np.nan)
+    if k < len(values):
+        out[k:] = values[: len(values) - k]
+    out[pos < k] = np.nan
+    return out
+
+
+def compute_panel_signals(
+    panel: pd.DataFrame,
+    momentum_lookback: int = MOMENTUM_LOOKBACK,
+    background_window: int = BACKGROUND_WINDOW,
+) -> dict[int, pd.DataFrame]:
+    """一次性计算面板内全部品种的 A 通道信号，返回 {variety_id: compute_signals 同构结果}。
+
+    background_window 为背景段长度 W：bg1..bgW 取 shift(W+1)..shift(2)，连续性窗口随之取 W+1 根；
+    W=5（默认）时与 compute_signals 完全一致，其他取值供参数扫描使用。
+    """
+    if panel.empty:
+        return {}
+    panel = panel.sort_index()
+    vids = panel.index.get_level_values("variety_id").to_numpy()
+    dates = panel.index.get_level_values("trade_date")
+    n = len(panel)
+
+    starts = np.flatnonzero(np.r_[True, vids[1:] != vids[:-1]])
+    ends = np.r_[starts[1:], n]
+    pos = np.arange(n) - np.repeat(starts, ends - starts)
+
+    # 与 _mark_breakpoints 一致：相邻记录自然日间隔 <= 7 视为连续，每组首行视为连续
+    ts = dates.to_numpy()
+    gap_days = np.ones(n, dtype=np.int64)
+    gap_days[1:] = (ts[1:] - ts[:-1]) // np.timedelta64(1, "D")
+    date_cont = (pos == 0) | (gap_days <= 7)
+    cont7 = group_all_true(date_cont, pos, background_window + 1)
+    cont3 = group_all_true(date_cont, pos, 2)
+
+    main = panel["main_force"].to_numpy(dtype=float)
+    retail = panel["retail"].to_numpy(dtype=float)
+    main_diff = main - _group_shift(main, pos, 1)
+    retail_diff = retail - _group_shift(retail, pos, 1)
+    main_diff_t1 = _group_shift(main_diff, pos, 1)
+    retail_diff_t1 = _group_shift(retail_diff, pos, 1)
+
+    bgs = [_group_shift(main, pos, k) for k in range(background_window + 1, 1, -1)]
+    last = bgs[-1]
+
+    trigger_main_up = (main_diff_t1 > 0) & (main_diff > 0)
+    trigger_main_down = (main_diff_t1 < 0) & (main_diff < 0)
+    trigger_retail_down = (retail_diff_t1 < 0) & (retail_diff < 0)
+    trigger_retail_up = (retail_diff_t1 > 0) & (retail_diff > 0)
+
+    # 最后一根背景值必须是背景段极值，确保转折点唯一性（避免连续触发）
+    long_bg = np.logical_and.reduce([b < 0 for b in bgs] + [last < b for b in bgs[:-1]])
+    short_bg = np.logical_and.reduce([b > 0 for b in bgs] + [last > b for b in bgs[:-1]])
+
+    open_long = cont7 & long_bg & trigger_main_up & trigger_retail_down
+    open_short = cont7 & short_bg & trigger_main_down & trigger_retail_up
+
+    m3 = main - last
+    close_long = cont3 & (m3 < 0)
+    close_short = cont3 & (m3 > 0)
+
+    # 跨组窗口只出现在组内位置 < lookback 的行，这些行本就应为 NaN
+    main_score = rolling_percentile(np.abs(m3), momentum_lookback)
+    main_score[pos < momentum_lookback] = np.nan
+
+    columns = {
+        "date_cont": date_cont,
+        "main_diff": main_diff,
+        "retail_diff": retail_diff,
+        "cont7": cont7,
+        "cont3": cont3,
+        **{f"bg{k}": b for k, b in enumerate(bgs, start=1)},
+        "m3": m3,
+        "main_score": main_score,
+        "A_OPEN_LONG": open_long,
+        "A_OPEN_SHORT": open_short,
+        "A_CLOSE_LONG": close_long,
+        "A_CLOSE_SHORT": close_short,
+    }
+    base = {col: panel[col].to_numpy() for col in panel.columns}
+
+    results: dict[int, pd.DataFrame] = {}
+    for start, end in zip(starts, ends):
+        vid = int(vids[start])
+        sl = slice(start, end)
+        frame = pd.DataFrame(
+            {
+                "trade_date": dates[sl],
+                **{col: values[sl] for col, values in base.items()},
+                **{col: values[sl] for col, values in columns.items()},
+            }
+        )
+        apply_theory_state(frame, vid, None)
+        results[vid] = frame
+    return results
@@ -0,0 +1,218 @@
+"""
+理论信号历史回放。
+逻辑调整后重建 trading_signals：每个品种只计算一次全历史信号，再把区间内每天的信号分块批量写入，
+平仓信号的 related_open_signal_id 在写入过程中按理论周期回填。
+
+运行：python -m trading.strategies.replay --start YYYY-MM-DD --end YYYY-MM-DD [--chunk-days 30] [--workers N]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import numpy as np
+import pandas as pd
+import pymysql
+
+from trading.strategies.signals import (
+    INSERT_SIGNAL_SQL,
+    RELATED_ID_POS,
+    SIGNAL_TYPES,
+    UPSERT_STATE_SQL,
+    compute_frames,
+    compute_frames_parallel,
+    extra_json_columns,
+    prefetch_open_signal_ids,
+    signal_rows,
+    theory_state_row,
+)
+
+logger = logging.getLogger("replay")
+
+
+def collect_signal_rows(
+    sig_frames: dict[int, pd.DataFrame],
+    names: dict[int, str],
+    start: date,
+    end: date,
+) -> list[list]:
+    """收集区间 [start, end] 内全部品种触发的信号行（INSERT 参数），按 (signal_date, variety_id) 排序。"""
+    start_ts, end_ts = np.datetime64(start), np.datetime64(end + timedelta(days=1))
+    rows: list[list] = []
+    for vid, sig_df in sig_frames.items():
+        if sig_df.empty:
+            continue
+        ts = sig_df["trade_date"].to_numpy()
+        triggered = np.zeros(len(sig_df), dtype=bool)
+        for stype in SIGNAL_TYPES:
+            triggered |= sig_df[stype].to_numpy(dtype=bool)
+        positions = np.flatnonzero(triggered & (ts >= start_ts) & (ts < end_ts))
+        if len(positions) == 0:
+            continue
+        cols = extra_json_columns(sig_df)
+        vname = names.get(vid, str(vid))
+        for idx_pos in positions:
+            rows.extend(signal_rows(sig_df, int(idx_pos), vid, vname, cols))
+    rows.sort(key=lambda args: (args[0], args[1]))
+    return rows
+
+
+def _date_chunks(start: date, end: date, chunk_days: int) -> list[tuple[date, date]]:
+    chunks = []
+    cur = start
+    while cur <= end:
+        chunk_end = min(cur + timedelta(days=chunk_days - 1), end)
+        chunks.append((cur, chunk_end))
+        cur = chunk_end + timedelta(days=1)
+    return chunks
+
+
+def write_signal_rows(
+    conn: pymysql.Connection,
+    rows: list[list],
+    start: date,
+    end: date,
+    variety_ids: list[int],
+    chunk_days: int = 30,
+    state_rows: list[tuple] | None = None,
+    commit: bool = True,
+) -> int:
+    """按日期分块、每块一个事务写入信号行。
+
+    每块：一条 DELETE 清除这些品种在块内日期的旧信号 → executemany 插入开仓信号 →
+    一次查询取回块内开仓信号 id → 回填平仓信号的 related_open_signal_id 后 executemany 插入。
+    区间开始前已存在的开仓信号在第一块前一次性预取。state_rows 随最后一块一起写入。
+    commit=False 时各块不单独提交，由调用方在同一事务内统一提交或回滚。
+    """
+    if not variety_ids:
+        return 0
+    vid_marks = ",".join(["%s"] * len(variety_ids))
+
+    with conn.cursor() as cur:
+        open_ids = prefetch_open_signal_ids(
+            cur, [args for args in rows if args[4] == "close" and args[8] is not None and args[8] < start]
+        )
+
+    chunks = _date_chunks(start, end, chunk_days)
+    written = 0
+    pos = 0
+    for n, (chunk_start, chunk_end) in enumerate(chunks, start=1):
+        chunk_rows: list[list] = []
+        while pos < len(rows) and rows[pos][0] <= chunk_end:
+            chunk_rows.append(rows[pos])
+            pos += 1
+        opens = [args for args in chunk_rows if args[4] != "close"]
+        closes = [args for args in chunk_rows if args[4] == "close"]
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"DELETE FROM trading_signals WHERE signal_date BETWEEN %s AND %s "
+                    f"AND variety_id IN ({vid_marks})",
+                    (chunk_start, chunk_end, *variety_ids),
+                )
+                if opens:
+                    cur.executemany(INSERT_SIGNAL_SQL, opens)
+                    cur.execute(
+                        "SELECT id, variety_id, cycle_id FROM trading_signals "
+                        "WHERE signal_role='open' AND signal_date BETWEEN %s AND %s "
+                        "ORDER BY signal_date, id",
+                        (chunk_start, chunk_end),
+                    )
+                    for r in cur.fetchall():
+                        open_ids[(int(r["variety_id"]), r["cycle_id"])] = int(r["id"])
+                for args in closes:
+                    if args[6]:
+                        args[RELATED_ID_POS] = open_ids.get((args[1], args[6]))
+                if closes:
+                    cur.executemany(INSERT_SIGNAL_SQL, closes)
+                if state_rows and n == len(chunks):
+                    cur.executemany(UPSERT_STATE_SQL, state_rows)
+            if commit:
+                conn.commit()
+        except Exception:
+            if commit:
+                conn.rollback()
+            raise
+        written += len(chunk_rows)
+        logger.info("块 %d/%d [%s ~ %s] 写入 %d 条信号", n, len(chunks), chunk_start, chunk_end, len(chunk_rows))
+    return written
+
+
+def compute_signal_frames(conn: pymysql.Connection, workers: int = 1) -> tuple[dict[int, str], dict[int, pd.DataFrame]]:
+    """一次装载全部品种并各算一次全历史信号，返回 (names, sig_frames)；计算失败的品种记录告警后跳过。"""
+    from trading.strategies.data_loader import load_all_varieties_data, load_variety_map
+
+    variety_df = load_variety_map(conn)
+    if variety_df.empty:
+        return {}, {}
+    names = {int(vid): str(name) for vid, name in zip(variety_df["id"], variety_df["name"])}
+
+    frames = load_all_varieties_data(conn)
+    computed = compute_frames_parallel(frames, workers) if workers > 1 else compute_frames(frames)
+    sig_frames: dict[int, pd.DataFrame] = {}
+    for vid, res in computed.items():
+        if isinstance(res, str):
+            logger.warning("品种 %s 信号计算失败: %s", names.get(vid, vid), res)
+            continue
+        sig_frames[vid] = res
+    return names, sig_frames
+
+
+def replay_signals(
+    conn: pymysql.Connection,
+    start: date,
+    end: date,
+    chunk_days: int = 30,
+    workers: int = 1,
+) -> int:
+    """重建 [start, end] 区间的 trading_signals，并把 end 当日的理论状态写入 trading_signal_state。"""
+    names, sig_frames = compute_signal_frames(conn, workers)
+    if not names:
+        return 0
+
+    rows = collect_signal_rows(sig_frames, names, start, end)
+    state_rows = [
+        row for vid, sig_df in sig_frames.items()
+        if (row := theory_state_row(end, vid, sig_df)) is not None
+    ]
+    logger.info("共 %d 个品种、%d 条信号待写入", len(sig_frames), len(rows))
+    return write_signal_rows(conn, rows, start, end, sorted(sig_frames), chunk_days, state_rows)
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description="回放历史理论信号，重建 trading_signals")
+    parser.add_argument("--start", required=True, type=_parse_date, help="起始日期 YYYY-MM-DD")
+    parser.add_argument("--end", required=True, type=_parse_date, help="结束日期 YYYY-MM-DD")
+    parser.add_argument("--chunk-days", type=int, default=30, help="每个事务覆盖的自然日数")
+    parser.add_argument("--workers", type=int, default=1, help="信号计算的并行进程数")
+    args = parser.parse_args()
+    if args.start > args.end:
+        parser.error("--start 不能晚于 --end")
+
+    from trading.strategies.db import get_connection
+
+    conn = get_connection()
+    try:
+        written = replay_signals(conn, args.start, args.end, args.chunk_days, args.workers)
+        logger.info("回放完成，共写入 %d 条信号", written)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
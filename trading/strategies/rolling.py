@@ -0,0 +1,54 @@
+"""
+滚动窗口统计原语。
+main_score 的动量分位等"当前值在前 L 个历史值中的排名"类计算与连续性窗口判断统一走这里，
+整条序列一次性向量化完成，避免逐行切片 + dropna。
+"""
+from __future__ import annotations
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# 单块最多比较的元素数，控制 (rows, lookback) 布尔矩阵的峰值内存
+_CHUNK_ELEMS = 1 << 22
+
+
+def rolling_percentile(values: np.ndarray, lookback: int) -> np.ndarray:
+    """计算每个位置的值在其前 lookback 个历史值中的分位（<= 当前值的占比）。
+
+    语义与逐行实现一致：
+      - 位置 i 的历史窗口为 values[i-lookback:i]，不含自身
+      - 当前值为 NaN、历史不足 lookback 个或窗口内含 NaN 时结果为 NaN
+      - 否则结果为 count(hist <= current) / lookback
+    """
+    if lookback <= 0:
+        raise ValueError("lookback 必须为正整数")
+    arr = np.asarray(values, dtype=np.float64)
+    n = len(arr)
+    out = np.full(n, np.nan, dtype=np.float64)
+    if n <= lookback:
+        return out
+
+    # windows[k] = arr[k : k+lookback]，对应位置 i = k + lookback
+    windows = sliding_window_view(arr[:-1], lookback)
+    current = arr[lookback:]
+    window_has_nan = np.isnan(windows).any(axis=1) if np.isnan(arr).any() else None
+
+    step = max(1, _CHUNK_ELEMS // lookback)
+    for start in range(0, len(current), step):
+        stop = min(start + step, len(current))
+        counts = np.count_nonzero(windows[start:stop] <= current[start:stop, None], axis=1)
+        out[lookback + start : lookback + stop] = counts / lookback
+
+    invalid = np.isnan(current)
+    if window_has_nan is not None:
+        invalid |= window_has_nan
+    out[lookback:][invalid] = np.nan
+    return out
+
+
+def group_all_true(flags: np.ndarray, pos: np.ndarray, window: int) -> np.ndarray:
+    """组内 rolling(window, min_periods=window) 全为 True 的判断；pos 为每行在所属序列（品种）内的位置。"""
+    bad = np.concatenate([[0], np.cumsum(~flags)])
+    idx = np.arange(len(flags))
+    lo = np.maximum(idx + 1 - window, 0)
+    return (pos >= window - 1) & (bad[idx + 1] - bad[lo] == 0)
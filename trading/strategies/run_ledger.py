@@ -0,0 +1,123 @@
+"""
+daily_run 运行台账。
+trading_run_ledger 每个 (run_date, step) 一行，记录状态（running / done / failed）、起止时间、耗时、行数、失败信息和执行次数。
+daily_run 据此跳过当日已完成的步骤；表按 step 聚合即可看耗时趋势。
+
+运行：python -m trading.strategies.run_ledger [--days 30]      # 打印最近 N 个运行日各步骤的耗时统计
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import pymysql
+
+logger = logging.getLogger("run_ledger")
+
+_ERROR_MAX_LEN = 500
+
+
+def load_ledger(conn: pymysql.Connection, run_date: date) -> dict[str, dict]:
+    """返回 {step: 台账行}。"""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT step, status, started_at, finished_at, duration_ms, row_count, error_msg, attempts "
+            "FROM trading_run_ledger WHERE run_date=%s",
+            (run_date,),
+        )
+        return {r["step"]: r for r in cur.fetchall()}
+
+
+@contextmanager
+def record_step(conn: pymysql.Connection, run_date: date, step: str) -> Iterator[dict]:
+    """把一个步骤的执行记入台账；调用方把写入行数放进 yield 出的 dict 的 "rows"。
+
+    开始时写 running 并提交；成功后写 done、耗时与行数；异常时先回滚步骤未提交的写入，再写 failed 并继续抛出。
+    """
+    started = datetime.now()
+    with conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO trading_run_ledger (run_date, step, status, started_at, attempts) "
+            "VALUES (%s,%s,'running',%s,1) "
+            "ON DUPLICATE KEY UPDATE status='running', started_at=VALUES(started_at), finished_at=NULL, "
+            "duration_ms=NULL, row_count=NULL, error_msg=NULL, attempts=attempts+1",
+            (run_date, step, started),
+        )
+    conn.commit()
+
+    rec: dict = {"rows": None}
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    except Exception as exc:
+        conn.rollback()
+        duration_ms = int((time.perf_counter() - t0) * 1000)
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE trading_run_ledger SET status='failed', finished_at=%s, duration_ms=%s, error_msg=%s "
+                "WHERE run_date=%s AND step=%s",
+                (datetime.now(), duration_ms, f"{type(exc).__name__}: {exc}"[:_ERROR_MAX_LEN], run_date, step),
+            )
+        conn.commit()
+        logger.error("步骤 %s 失败，耗时 %.2fs: %s", step, duration_ms / 1000, exc)
+        raise
+
+    duration_ms = int((time.perf_counter() - t0) * 1000)
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE trading_run_ledger SET status='done', finished_at=%s, duration_ms=%s, row_count=%s "
+            "WHERE run_date=%s AND step=%s",
+            (datetime.now(), duration_ms, rec["rows"], run_date, step),
+        )
+    conn.commit()
+    logger.info("步骤 %s 完成，耗时 %.2fs，行数 %s", step, duration_ms / 1000, rec["rows"])
+
+
+def step_timing_trend(conn: pymysql.Connection, days: int = 30) -> list[dict]:
+    """最近 days 个运行日内已完成步骤的耗时统计（次数 / 平均 / 最大 / 最近一次）。"""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT l.step, COUNT(*) AS runs, AVG(l.duration_ms) AS avg_ms, MAX(l.duration_ms) AS max_ms, "
+            "SUBSTRING_INDEX(GROUP_CONCAT(l.duration_ms ORDER BY l.run_date DESC), ',', 1) AS last_ms "
+            "FROM trading_run_ledger l "
+            "JOIN (SELECT DISTINCT run_date FROM trading_run_ledger ORDER BY run_date DESC LIMIT %s) d "
+            "ON d.run_date=l.run_date "
+            "WHERE l.status='done' GROUP BY l.step ORDER BY l.step",
+            (days,),
+        )
+        return list(cur.fetchall())
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description="daily_run 各步骤耗时统计")
+    parser.add_argument("--days", type=int, default=30, help="统计最近 N 个运行日")
+    args = parser.parse_args()
+
+    from trading.strategies.db import get_connection
+
+    conn = get_connection()
+    try:
+        for r in step_timing_trend(conn, args.days):
+            logger.info(
+                "%-12s runs=%d avg=%.2fs max=%.2fs last=%.2fs",
+                r["step"], r["runs"], float(r["avg_ms"]) / 1000, float(r["max_ms"]) / 1000, float(r["last_ms"]) / 1000,
+            )
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,447 @@
+"""
+影子运行。
+用真实行情在 SQLite 替身库中逐日运行 daily_run，再与生产库同一区间的 trading_signals / trading_operations /
+trading_positions / trading_account_daily 逐行比对，输出结构化差异；生产库只读，不写入任何数据。
+用于在改写 signals / operations / account 的实现后快速确认结果不变。
+
+替身库：策略表按 create_tables.CREATE_STMTS 转换为 SQLite 方言建表，SQL 在执行时做最小转换
+（%s → ?、INSERT IGNORE、ON DUPLICATE KEY UPDATE），DATE / DATETIME 列读出为 date / datetime，
+FLOAT 列读出时按单精度还原，与 MySQL 返回值口径一致。
+区间起点之前的池子、信号、操作建议、持仓、资金曲线、指标和理论状态快照从生产库复制，区间内的运行日取生产库资金曲线的日期。
+
+运行：python -m trading.strategies.shadow --start YYYY-MM-DD --end YYYY-MM-DD [--tol 1e-6] [--out diff.json]
+      [--db shadow.sqlite] [--incremental] [--workers N]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("shadow")
+
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda v: v.isoformat(" "))
+sqlite3.register_adapter(pd.Timestamp, lambda v: v.date().isoformat() if v == v.normalize() else v.isoformat(" "))
+sqlite3.register_adapter(Decimal, float)
+for _t in (np.int8, np.int16, np.int32, np.int64, np.bool_):
+    sqlite3.register_adapter(_t, int)
+for _t in (np.float32, np.float64):
+    sqlite3.register_adapter(_t, float)
+sqlite3.register_adapter(np.str_, str)
+sqlite3.register_converter("DATE", lambda b: date.fromisoformat(b.decode()[:10]))
+sqlite3.register_converter("DATETIME", lambda b: datetime.fromisoformat(b.decode()))
+sqlite3.register_converter("FLOAT", lambda b: float(str(np.float32(float(b)))))
+
+_MARKET_DDL = (
+    "CREATE TABLE fut_variety (id INTEGER PRIMARY KEY, name VARCHAR(20))",
+    "CREATE TABLE fut_strength (variety_id INT NOT NULL, trade_date DATE NOT NULL, main_force DOUBLE, "
+    "retail DOUBLE, collected_at DATETIME DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (variety_id, trade_date))",
+    "CREATE TABLE fut_daily_close (variety_id INT NOT NULL, trade_date DATE NOT NULL, close_price DOUBLE, "
+    "collected_at DATETIME DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (variety_id, trade_date))",
+)
+
+# MAX(record_date) 等表达式列没有声明类型，SQLite 按文本返回；MySQL 返回 date，这里按格式还原
+_ISO_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_UPSERT_RE = re.compile(r"ON DUPLICATE KEY UPDATE", re.IGNORECASE)
+_VALUES_REF_RE = re.compile(r"VALUES\((\w+)\)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def translate_sql(sql: str) -> str:
+    """把 pymysql 风格的 SQL 转为 SQLite 方言。"""
+    sql = sql.replace("%s", "?").replace("%%", "%")
+    sql = re.sub(r"\bINSERT IGNORE\b", "INSERT OR IGNORE", sql, flags=re.IGNORECASE)
+    m = _UPSERT_RE.search(sql)
+    if m:
+        sql = sql[: m.start()] + "ON CONFLICT DO UPDATE SET" + _VALUES_REF_RE.sub(r"excluded.\1", sql[m.end():])
+    return sql
+
+
+def sqlite_ddl(stmt: str) -> str:
+    """把 CREATE_STMTS 中的 MySQL 建表语句转为 SQLite：去掉注释与普通索引，ENUM 转 TEXT，自增主键改写。"""
+    sql = re.sub(r"\s+COMMENT\s*=?\s*'[^']*'", "", stmt)
+    sql = re.sub(r"\bINT AUTO_INCREMENT PRIMARY KEY\b", "INTEGER PRIMARY KEY AUTOINCREMENT", sql)
+    sql = re.sub(r"\bENUM\([^)]*\)", "TEXT", sql)
+    sql = re.sub(r"\bUNIQUE KEY \w+ \(", "UNIQUE (", sql)
+    sql = re.sub(r",\s*KEY \w+ \([^)]*\)", "", sql)
+    return sql
+
+
+class ShadowCursor:
+    """与 pymysql DictCursor 用法一致的 SQLite 游标；tuple_rows=True 时对应 SSCursor 返回元组。"""
+
+    def __init__(self, cur: sqlite3.Cursor, tuple_rows: bool = False) -> None:
+        self._cur = cur
+        self._tuple_rows = tuple_rows
+
+    def __enter__(self) -> ShadowCursor:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._cur.close()
+
+    def execute(self, sql: str, args=()) -> None:
+        self._cur.execute(translate_sql(sql), tuple(args or ()))
+
+    def executemany(self, sql: str, seq) -> None:
+        self._cur.executemany(translate_sql(sql), [tuple(a) for a in seq])
+
+    def _convert(self, rows: list) -> list:
+        rows = [
+            tuple(date.fromisoformat(v) if isinstance(v, str) and _ISO_DATE_RE.fullmatch(v) else v for v in r)
+            for r in rows
+        ]
+        if self._tuple_rows:
+            return rows
+        names = [d[0] for d in self._cur.description]
+        return [dict(zip(names, r)) for r in rows]
+
+    def fetchone(self):
+        row = self._cur.fetchone()
+        return None if row is None else self._convert([row])[0]
+
+    def fetchmany(self, size: int = 1) -> list:
+        return self._convert(self._cur.fetchmany(size))
+
+    def fetchall(self) -> list:
+        return self._convert(self._cur.fetchall())
+
+
+class ShadowConnection:
+    """策略代码可直接使用的 SQLite 替身连接（cursor / commit / rollback / close）。"""
+
+    def __init__(self, path: str = ":memory:") -> None:
+        self.db = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
+
+    def cursor(self, cursor_class=None) -> ShadowCursor:
+        tuple_rows = cursor_class is not None and "Dict" not in cursor_class.__name__
+        return ShadowCursor(self.db.cursor(), tuple_rows)
+
+    def columns(self, table: str) -> list[str]:
+        return [r[1] for r in self.db.execute(f"PRAGMA table_info({table})")]
+
+    def commit(self) -> None:
+        self.db.commit()
+
+    def rollback(self) -> None:
+        self.db.rollback()
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def create_shadow_db(path: str = ":memory:") -> ShadowConnection:
+    """建好行情表与全部策略表的空替身库。"""
+    from trading.strategies.create_tables import CREATE_STMTS
+
+    conn = ShadowConnection(path)
+    conn.db.executescript(";\n".join([*_MARKET_DDL, *(sqlite_ddl(s) for s in CREATE_STMTS)]) + ";")
+    return conn
+
+
+def _copy_rows(src, dst: ShadowConnection, table: str, columns: list[str], where: str = "", args=()) -> int:
+    with src.cursor() as cur:
+        cur.execute(f"SELECT {', '.join(columns)} FROM {table} {where}", args)
+        rows = [tuple(r[c] for c in columns) for r in cur.fetchall()]
+    if rows:
+        with dst.cursor() as cur:
+            cur.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({','.join(['%s'] * len(columns))})", rows
+            )
+    dst.commit()
+    return len(rows)
+
+
+def seed_shadow(prod, shadow: ShadowConnection, start: date, end: date) -> dict[str, int]:
+    """从生产库复制截至 end 的行情和 start 之前的策略状态，返回各表复制行数。
+
+    start 之前开仓、在区间内才平仓的持仓按开放状态复制，由影子运行重新决定平仓。
+    """
+    counts = {
+        "fut_variety": _copy_rows(prod, shadow, "fut_variety", ["id", "name"]),
+        "fut_strength": _copy_rows(
+            prod, shadow, "fut_strength", ["variety_id", "trade_date", "main_force", "retail"],
+            "WHERE trade_date<=%s", (end,),
+        ),
+        "fut_daily_close": _copy_rows(
+            prod, shadow, "fut_daily_close", ["variety_id", "trade_date", "close_price"],
+            "WHERE trade_date<=%s", (end,),
+        ),
+        "trading_pool": _copy_rows(prod, shadow, "trading_pool", shadow.columns("trading_pool")),
+    }
+    for table, col in (
+        ("trading_signals", "signal_date"),
+        ("trading_operations", "signal_date"),
+        ("trading_positions", "open_date"),
+        ("trading_account_daily", "record_date"),
+        ("trading_account_metrics", "record_date"),
+        ("trading_signal_state", "state_date"),
+    ):
+        counts[table] = _copy_rows(prod, shadow, table, shadow.columns(table), f"WHERE {col}<%s", (start,))
+    with shadow.cursor() as cur:
+        cur.execute(
+            "UPDATE trading_positions SET status='open', close_date=NULL, close_price=NULL, pnl_pct=NULL, "
+            "close_signal_id=NULL WHERE close_date>=%s",
+            (start,),
+        )
+    shadow.commit()
+    return counts
+
+
+def run_shadow(
+    prod,
+    start: date,
+    end: date,
+    shadow: ShadowConnection | None = None,
+    incremental: bool = False,
+    workers: int = 1,
+) -> tuple[ShadowConnection, list[date]]:
+    """在替身库中按生产库资金曲线的运行日期逐日执行 daily_run.run_day，返回 (替身连接, 运行日期)。"""
+    from trading.strategies.daily_run import parse_args, run_day
+    from trading.strategies.db import QueryStats
+
+    with prod.cursor() as cur:
+        cur.execute(
+            "SELECT record_date FROM trading_account_daily WHERE record_date BETWEEN %s AND %s ORDER BY record_date",
+            (start, end),
+        )
+        dates = [r["record_date"] for r in cur.fetchall()]
+
+    shadow = shadow or create_shadow_db()
+    counts = seed_shadow(prod, shadow, start, end)
+    logger.info("替身库初始化：%s", ", ".join(f"{k}={v}" for k, v in counts.items()))
+
+    flags = [*(["--incremental"] if incremental else []), "--workers", str(workers)]
+    # 影子运行只读 SQLite 中复制的行情，不同步、不读取本地行情镜像
+    previous = os.environ.get("TRADING_MARKET_STORE")
+    os.environ["TRADING_MARKET_STORE"] = "off"
+    try:
+        for d in dates:
+            run_day(shadow, d, parse_args([d.isoformat(), *flags]), QueryStats())
+    finally:
+        if previous is None:
+            os.environ.pop("TRADING_MARKET_STORE", None)
+        else:
+            os.environ["TRADING_MARKET_STORE"] = previous
+    return shadow, dates
+
+
+# 各表比对字段；*_id 引用在比对前换成被引用行的业务键
+_SIGNAL_FIELDS = (
+    "signal_role", "direction", "cycle_id", "related_open_signal_id", "related_open_date",
+    "theory_state_before", "theory_state_after", "main_score", "extra_json",
+)
+_OPERATION_FIELDS = (
+    "signal_id", "sector", "direction", "signal_cycle_id", "main_score", "is_selected", "reject_reason",
+    "selection_rank", "extra_json",
+)
+_POSITION_FIELDS = (
+    "open_operation_id", "open_signal_id", "close_signal_id", "theory_cycle_id", "direction", "sector",
+    "open_price", "size_pct", "status", "close_date", "close_price", "pnl_pct",
+)
+_EQUITY_FIELDS = ("equity", "cash", "position_val", "daily_pnl")
+
+
+def _key_lookup(conn, table: str, date_col: str, ids: set) -> dict[int, tuple]:
+    """按 id 查被引用行的业务键 (日期, variety_id, signal_type)。"""
+    ids = sorted(int(i) for i in ids if i is not None)
+    if not ids:
+        return {}
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT id, {date_col}, variety_id, signal_type FROM {table} "
+            f"WHERE id IN ({','.join(['%s'] * len(ids))})",
+            tuple(ids),
+        )
+        return {int(r["id"]): (r[date_col], int(r["variety_id"]), r["signal_type"]) for r in cur.fetchall()}
+
+
+def _load_side(conn, start: date, end: date) -> dict[str, dict]:
+    """读取一侧库 [start, end] 的四张表，按业务键组织，id 引用换成业务键（查不到时保留 ("id", 原值)）。"""
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT id, signal_date, variety_id, signal_type, {', '.join(_SIGNAL_FIELDS)} "
+            "FROM trading_signals WHERE signal_date BETWEEN %s AND %s",
+            (start, end),
+        )
+        signals = list(cur.fetchall())
+        cur.execute(
+            f"SELECT id, signal_date, variety_id, signal_type, {', '.join(_OPERATION_FIELDS)} "
+            "FROM trading_operations WHERE signal_date BETWEEN %s AND %s",
+            (start, end),
+        )
+        operations = list(cur.fetchall())
+        cur.execute(
+            f"SELECT variety_id, open_date, {', '.join(_POSITION_FIELDS)} FROM trading_positions "
+            "WHERE open_date BETWEEN %s AND %s OR close_date BETWEEN %s AND %s",
+            (start, end, start, end),
+        )
+        positions = list(cur.fetchall())
+        cur.execute(
+            f"SELECT record_date, {', '.join(_EQUITY_FIELDS)} FROM trading_account_daily "
+            "WHERE record_date BETWEEN %s AND %s",
+            (start, end),
+        )
+        equity = list(cur.fetchall())
+
+    sig_keys = _key_lookup(
+        conn, "trading_signals", "signal_date",
+        {r["related_open_signal_id"] for r in signals} | {r["signal_id"] for r in operations}
+        | {r["open_signal_id"] for r in positions} | {r["close_signal_id"] for r in positions},
+    )
+    op_keys = _key_lookup(conn, "trading_operations", "signal_date", {r["open_operation_id"] for r in positions})
+
+    def ref(keys: dict, value):
+        return None if value is None else keys.get(int(value), ("id", int(value)))
+
+    out: dict[str, dict] = {"signals": {}, "operations": {}, "positions": {}, "equity": {}}
+    for r in signals:
+        row = {f: r[f] for f in _SIGNAL_FIELDS}
+        row["related_open_signal_id"] = ref(sig_keys, row["related_open_signal_id"])
+        out["signals"][(r["signal_date"], int(r["variety_id"]), r["signal_type"])] = row
+    for r in operations:
+        row = {f: r[f] for f in _OPERATION_FIELDS}
+        row["signal_id"] = ref(sig_keys, row["signal_id"])
+        out["operations"][(r["signal_date"], int(r["variety_id"]), r["signal_type"])] = row
+    for r in positions:
+        row = {f: r[f] for f in _POSITION_FIELDS}
+        if row["close_date"] is not None and row["close_date"] > end:
+            # 区间之后才平仓的持仓在区间末仍为开放
+            row.update(status="open", close_date=None, close_price=None, pnl_pct=None, close_signal_id=None)
+        for f in ("open_signal_id", "close_signal_id"):
+            row[f] = ref(sig_keys, row[f])
+        row["open_operation_id"] = ref(op_keys, row["open_operation_id"])
+        out["positions"][(int(r["variety_id"]), r["open_date"])] = row
+    for r in equity:
+        out["equity"][(r["record_date"],)] = {f: r[f] for f in _EQUITY_FIELDS}
+    return out
+
+
+def _is_number(v) -> bool:
+    return isinstance(v, (int, float, Decimal)) and not isinstance(v, bool)
+
+
+def _diff_value(a, b, tol: float, path: str, out: list[tuple[str, object, object]]) -> None:
+    """递归比较两个值，数值按相对误差 tol，JSON 字符串先解析再比较。"""
+    if isinstance(a, str) and isinstance(b, str) and a[:1] in "{[" and b[:1] in "{[":
+        try:
+            a, b = json.loads(a), json.loads(b)
+        except ValueError:
+            pass
+    if isinstance(a, dict) and isinstance(b, dict):
+        for k in sorted(a.keys() | b.keys()):
+            _diff_value(a.get(k), b.get(k), tol, f"{path}.{k}", out)
+    elif isinstance(a, list) and isinstance(b, list) and len(a) == len(b):
+        for i, (x, y) in enumerate(zip(a, b)):
+            _diff_value(x, y, tol, f"{path}[{i}]", out)
+    elif _is_number(a) and _is_number(b):
+        x, y = float(a), float(b)
+        if not (x == y or (math.isnan(x) and math.isnan(y)) or abs(x - y) <= tol * max(abs(x), abs(y), 1.0)):
+            out.append((path, a, b))
+    elif a != b:
+        out.append((path, a, b))
+
+
+def diff_results(prod, shadow, start: date, end: date, tol: float = 1e-6) -> list[dict]:
+    """比对两侧库 [start, end] 的信号、操作建议、持仓与资金曲线，返回差异列表。
+
+    每条差异为 {"table", "key", "field", "production", "shadow"}；整行缺失时 field 为 "_row"。
+    """
+    left, right = _load_side(prod, start, end), _load_side(shadow, start, end)
+    diffs: list[dict] = []
+    for table in ("signals", "operations", "positions", "equity"):
+        a, b = left[table], right[table]
+        for key in sorted(a.keys() | b.keys(), key=repr):
+            if key not in a or key not in b:
+                diffs.append({
+                    "table": table, "key": list(key), "field": "_row",
+                    "production": key in a, "shadow": key in b,
+                })
+                continue
+            found: list[tuple[str, object, object]] = []
+            for field in a[key]:
+                _diff_value(a[key][field], b[key][field], tol, field, found)
+            diffs.extend(
+                {"table": table, "key": list(key), "field": f, "production": x, "shadow": y} for f, x, y in found
+            )
+    return diffs
+
+
+def summarize_diffs(diffs: list[dict]) -> dict[str, int]:
+    summary = {t: 0 for t in ("signals", "operations", "positions", "equity")}
+    for d in diffs:
+        summary[d["table"]] += 1
+    return summary
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description="在 SQLite 替身库中影子运行 daily_run，并与生产结果逐行比对")
+    parser.add_argument("--start", required=True, type=_parse_date, help="起始日期 YYYY-MM-DD")
+    parser.add_argument("--end", required=True, type=_parse_date, help="结束日期 YYYY-MM-DD")
+    parser.add_argument("--tol", type=float, default=1e-6, help="数值比对的相对误差")
+    parser.add_argument("--out", default=None, help="差异输出 JSON 文件")
+    parser.add_argument("--db", default=":memory:", help="替身库 SQLite 文件，默认内存库")
+    parser.add_argument("--incremental", action="store_true", help="影子运行使用增量信号计算")
+    parser.add_argument("--workers", type=int, default=1, help="全量信号计算的并行进程数")
+    args = parser.parse_args()
+    if args.start > args.end:
+        parser.error("--start 不能晚于 --end")
+    if args.db != ":memory:" and Path(args.db).exists():
+        parser.error(f"{args.db} 已存在，请指定新的替身库文件")
+
+    from trading.strategies.db import get_connection
+
+    prod = get_connection()
+    try:
+        shadow, dates = run_shadow(
+            prod, args.start, args.end, create_shadow_db(args.db), args.incremental, args.workers
+        )
+        diffs = diff_results(prod, shadow, args.start, args.end, args.tol)
+        shadow.close()
+    finally:
+        prod.close()
+
+    summary = summarize_diffs(diffs)
+    logger.info("影子运行 %s ~ %s：%d 个运行日，差异 %s", args.start, args.end, len(dates), summary)
+    for d in diffs[:20]:
+        logger.warning("差异 %s %s %s: 生产=%r 影子=%r", d["table"], d["key"], d["field"], d["production"], d["shadow"])
+    if args.out:
+        Path(args.out).write_text(
+            json.dumps(
+                {"start": args.start, "end": args.end, "dates": len(dates), "tol": args.tol,
+                 "summary": summary, "diffs": diffs},
+                ensure_ascii=False, indent=2, default=str,
+            ),
+            encoding="utf-8",
+        )
+        logger.info("差异已写出到 %s", args.out)
+    if diffs:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ import numpy as np
 import pandas as pd
 import pymysql
 
+from .rolling import group_all_true, rolling_percentile
 from .settings import MOMENTUM_LOOKBACK
 
 logger = logging.getLogger(__name__)
@@ -23,34 +24,148 @@ def _mark_breakpoints(dates: pd.Series) -> pd.Series:
     return diffs.le(7)
 
 
-def _make_cycle_id(variety_id: int | None, direction: str, open_date: date) -> str:
+def make_cycle_id(variety_id: int | None, direction: str, open_date: date) -> str:
     prefix = f"{variety_id}-" if variety_id is not None else ""
     return f"{prefix}{direction}-{open_date.isoformat()}"
 
 
-def compute_signals(df: pd.DataFrame, variety_id: int | None = None) -> pd.DataFrame:
+_STATE_NONE, _STATE_LONG, _STATE_SHORT = 0, 1, 2
+_ROLE_NONE, _ROLE_OPEN, _ROLE_CLOSE = 0, 1, 2
+_DIR_NONE, _DIR_LONG, _DIR_SHORT = 0, 1, 2
+_STATE_LABELS = np.array(["none", "long", "short"], dtype=object)
+_ROLE_LABELS = np.array([None, "open", "close"], dtype=object)
+_DIRECTION_LABELS = np.array([None, "LONG", "SHORT"], dtype=object)
+_OPEN_BEFORE_WINDOW = -2
+
+
+def _scan_theory_state(
+    open_long: np.ndarray,
+    open_short: np.ndarray,
+    close_long: np.ndarray,
+    close_short: np.ndarray,
+    initial_state: int = _STATE_NONE,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """在 NumPy 数组上运行理论状态机。
+
+    只遍历出现原始开平仓信号的行，其余行的状态由前一事件向前填充。
+    返回 (role, direction, state_after, open_pos) 四个等长数组：
+    role/direction/state_after 为整数编码，open_pos 为该行所属理论周期开仓行的下标
+    （无周期为 -1；平掉 initial_state 对应的窗口外周期时为 _OPEN_BEFORE_WINDOW）。
+    """
+    n = len(open_long)
+    role = np.zeros(n, dtype=np.int8)
+    direction = np.zeros(n, dtype=np.int8)
+    open_pos = np.full(n, -1, dtype=np.int64)
+    event_state = np.zeros(n, dtype=np.int8)
+    is_event = open_long | open_short | close_long | close_short
+
+    state = initial_state
+    current_open = -1 if initial_state == _STATE_NONE else _OPEN_BEFORE_WINDOW
+    for i in np.flatnonzero(is_event):
+        if close_long[i] and state == _STATE_LONG:
+            role[i], direction[i], open_pos[i] = _ROLE_CLOSE, _DIR_LONG, current_open
+            state, current_open = _STATE_NONE, -1
+        elif close_short[i] and state == _STATE_SHORT:
+            role[i], direction[i], open_pos[i] = _ROLE_CLOSE, _DIR_SHORT, current_open
+            state, current_open = _STATE_NONE, -1
+        elif open_long[i]:
+            role[i], direction[i], open_pos[i] = _ROLE_OPEN, _DIR_LONG, i
+            state, current_open = _STATE_LONG, i
+        elif open_short[i]:
+            role[i], direction[i], open_pos[i] = _ROLE_OPEN, _DIR_SHORT, i
+            state, current_open = _STATE_SHORT, i
+        event_state[i] = state
+
+    # 非事件行沿用最近一次事件后的状态
+    last_event = np.where(is_event, np.arange(n), -1)
+    np.maximum.accumulate(last_event, out=last_event)
+    state_after = np.where(last_event >= 0, event_state[np.maximum(last_event, 0)], initial_state).astype(np.int8)
+    return role, direction, state_after, open_pos
+
+
+def apply_theory_state(out: pd.DataFrame, variety_id: int | None, theory_state: dict | None) -> None:
+    """在已含原始 A_* 信号列的 out 上运行理论状态机，原地写入过滤后的平仓信号与理论周期列。"""
+    flags = [
+        out[col].to_numpy(dtype=bool)
+        for col in ("A_OPEN_LONG", "A_OPEN_SHORT", "A_CLOSE_LONG", "A_CLOSE_SHORT")
+    ]
+    initial_state = _STATE_NONE
+    if theory_state is not None:
+        initial_state = int(np.flatnonzero(_STATE_LABELS == theory_state["state"])[0])
+        replayed = (out["trade_date"].dt.date > theory_state["state_date"]).to_numpy()
+        flags = [f & replayed for f in flags]
+    role, direction, state_after, open_pos = _scan_theory_state(*flags, initial_state=initial_state)
+    state_before = np.empty_like(state_after)
+    if len(state_after):
+        state_before[0] = initial_state
+        state_before[1:] = state_after[:-1]
+
+    n = len(out)
+    trade_ts = out["trade_date"].to_numpy()
+    cycle_ids: list[str | None] = [None] * n
+    related_open_dates: list[date | None] = [None] * n
+    for i in np.flatnonzero(role != _ROLE_NONE):
+        j = int(open_pos[i])
+        if j == _OPEN_BEFORE_WINDOW:
+            open_date = theory_state["open_date"]
+            cycle_ids[i] = theory_state["cycle_id"]
+        else:
+            open_date = pd.Timestamp(trade_ts[j]).date()
+            cycle_ids[i] = make_cycle_id(variety_id, _DIRECTION_LABELS[direction[i]], open_date)
+        if role[i] == _ROLE_CLOSE:
+            related_open_dates[i] = open_date
+
+    out["A_CLOSE_LONG"] = (role == _ROLE_CLOSE) & (direction == _DIR_LONG)
+    out["A_CLOSE_SHORT"] = (role == _ROLE_CLOSE) & (direction == _DIR_SHORT)
+    out["signal_role"] = _ROLE_LABELS[role].tolist()
+    out["direction"] = _DIRECTION_LABELS[direction].tolist()
+    out["cycle_id"] = cycle_ids
+    out["related_open_date"] = related_open_dates
+    out["theory_state_before"] = _STATE_LABELS[state_before].tolist()
+    out["theory_state_after"] = _STATE_LABELS[state_after].tolist()
+    out["signal_state"] = out["theory_state_after"]
+
+
+FEATURE_COLUMNS = (
+    "date_cont",
+    "main_diff",
+    "retail_diff",
+    "cont7",
+    "cont3",
+    "bg1",
+    "bg2",
+    "bg3",
+    "bg4",
+    "bg5",
+    "m3",
+    "main_score",
+)
+
+
+def compute_features(df: pd.DataFrame, momentum_lookback: int = MOMENTUM_LOOKBACK) -> pd.DataFrame:
+    """计算 A 通道中间特征（FEATURE_COLUMNS），不做信号判定。"""
     out = df.copy()
     out["date_cont"] = _mark_breakpoints(out["trade_date"])
     out["main_diff"] = out["main_force"].diff()
     out["retail_diff"] = out["retail"].diff()
 
-    cont7 = out["date_cont"].astype(int).rolling(6, min_periods=6).sum().eq(6)
-    cont3 = out["date_cont"].astype(int).rolling(2, min_periods=2).sum().eq(2)
+    out["cont7"] = out["date_cont"].astype(int).rolling(6, min_periods=6).sum().eq(6)
+    out["cont3"] = out["date_cont"].astype(int).rolling(2, min_periods=2).sum().eq(2)
 
-    out["cont7"] = cont7
-    out["cont3"] = cont3
+    out["bg1"] = out["main_force"].shift(6)
+    out["bg2"] = out["main_force"].shift(5)
+    out["bg3"] = out["main_force"].shift(4)
+    out["bg4"] = out["main_force"].shift(3)
+    out["bg5"] = out["main_force"].shift(2)
 
-    bg1 = out["main_force"].shift(6)
-    bg2 = out["main_force"].shift(5)
-    bg3 = out["main_force"].shift(4)
-    bg4 = out["main_force"].shift(3)
-    bg5 = out["main_force"].shift(2)
+    out["m3"] = out["main_force"] - out["bg5"]
+    out["main_score"] = rolling_percentile(out["m3"].abs().to_numpy(dtype=float), momentum_lookback)
+    return out
 
-    out["bg1"] = bg1
-    out["bg2"] = bg2
-    out["bg3"] = bg3
-    out["bg4"] = bg4
-    out["bg5"] = bg5
+
+def _add_raw_signals(out: pd.DataFrame) -> None:
+    """按特征列原地写入原始 A_OPEN_* / A_CLOSE_* 信号（尚未经过理论状态机过滤）。"""
+    bg1, bg2, bg3, bg4, bg5 = (out[f"bg{k}"] for k in range(1, 6))
 
     trigger_main_up = out["main_diff"].shift(1).gt(0) & out["main_diff"].gt(0)
     trigger_main_down = out["main_diff"].shift(1).lt(0) & out["main_diff"].lt(0)
@@ -64,109 +179,119 @@ def compute_signals(df: pd.DataFrame, variety_id: int | None = None) -> pd.DataF
     long_bg = bg1.lt(0) & bg2.lt(0) & bg3.lt(0) & bg4.lt(0) & bg5.lt(0) & long_extremum
     short_bg = bg1.gt(0) & bg2.gt(0) & bg3.gt(0) & bg4.gt(0) & bg5.gt(0) & short_extremum
 
-    out["A_OPEN_LONG"] = cont7 & long_bg & trigger_main_up & trigger_retail_down
-    out["A_OPEN_SHORT"] = cont7 & short_bg & trigger_main_down & trigger_retail_up
+    out["A_OPEN_LONG"] = out["cont7"] & long_bg & trigger_main_up & trigger_retail_down
+    out["A_OPEN_SHORT"] = out["cont7"] & short_bg & trigger_main_down & trigger_retail_up
+    out["A_CLOSE_LONG"] = out["cont3"] & out["m3"].lt(0)
+    out["A_CLOSE_SHORT"] = out["cont3"] & out["m3"].gt(0)
 
-    out["m3"] = out["main_force"] - out["main_force"].shift(2)
-    out["A_CLOSE_LONG"] = cont3 & out["m3"].lt(0)
-    out["A_CLOSE_SHORT"] = cont3 & out["m3"].gt(0)
 
+def signals_from_features(
+    features: pd.DataFrame,
+    variety_id: int | None = None,
+    theory_state: dict | None = None,
+) -> pd.DataFrame:
+    """在已算好的特征表（compute_features 或特征库 load_features 的结果）上生成信号与理论状态。"""
+    out = features.copy()
+    _add_raw_signals(out)
     # 理论状态机：平仓信号只依赖理论开仓周期，不依赖真实账户持仓。
-    current_state = "none"
-    current_cycle_id: str | None = None
-    current_open_date: date | None = None
-    close_long_filtered: list[bool] = []
-    close_short_filtered: list[bool] = []
-    signal_roles: list[str | None] = []
-    directions: list[str | None] = []
-    cycle_ids: list[str | None] = []
-    related_open_dates: list[date | None] = []
-    theory_state_before: list[str] = []
-    theory_state_after: list[str] = []
-    signal_states: list[str] = []
-
-    for i in range(len(out)):
-        open_long  = bool(out["A_OPEN_LONG"].iloc[i])
-        open_short = bool(out["A_OPEN_SHORT"].iloc[i])
-        close_long = bool(out["A_CLOSE_LONG"].iloc[i])
-        close_short = bool(out["A_CLOSE_SHORT"].iloc[i])
-        trade_date = out["trade_date"].iloc[i].date()
-
-        state_before = current_state
-        role: str | None = None
-        direction: str | None = None
-        row_cycle_id: str | None = None
-        row_open_date: date | None = None
-        close_long_allowed = False
-        close_short_allowed = False
-
-        if close_long and current_state == "long":
-            role = "close"
-            direction = "LONG"
-            row_cycle_id = current_cycle_id
-            row_open_date = current_open_date
-            close_long_allowed = True
-            current_state = "none"
-            current_cycle_id = None
-            current_open_date = None
-        elif close_short and current_state == "short":
-            role = "close"
-            direction = "SHORT"
-            row_cycle_id = current_cycle_id
-            row_open_date = current_open_date
-            close_short_allowed = True
-            current_state = "none"
-            current_cycle_id = None
-            current_open_date = None
-        elif open_long:
-            role = "open"
-            direction = "LONG"
-            row_cycle_id = _make_cycle_id(variety_id, direction, trade_date)
-            current_state = "long"
-            current_cycle_id = row_cycle_id
-            current_open_date = trade_date
-        elif open_short:
-            role = "open"
-            direction = "SHORT"
-            row_cycle_id = _make_cycle_id(variety_id, direction, trade_date)
-            current_state = "short"
-            current_cycle_id = row_cycle_id
-            current_open_date = trade_date
-
-        close_long_filtered.append(close_long_allowed)
-        close_short_filtered.append(close_short_allowed)
-        signal_roles.append(role)
-        directions.append(direction)
-        cycle_ids.append(row_cycle_id)
-        related_open_dates.append(row_open_date)
-        theory_state_before.append(state_before)
-        theory_state_after.append(current_state)
-        signal_states.append(current_state)
-
-    out["A_CLOSE_LONG"] = close_long_filtered
-    out["A_CLOSE_SHORT"] = close_short_filtered
-    out["signal_role"] = signal_roles
-    out["direction"] = directions
-    out["cycle_id"] = cycle_ids
-    out["related_open_date"] = related_open_dates
-    out["theory_state_before"] = theory_state_before
-    out["theory_state_after"] = theory_state_after
-    out["signal_state"] = signal_states
-
-    scores: list[float] = []
-    abs_m3 = out["m3"].abs()
-    for i in range(len(out)):
-        current = abs_m3.iloc[i]
-        hist = abs_m3.iloc[max(0, i - MOMENTUM_LOOKBACK) : i].dropna()
-        if pd.isna(current) or len(hist) < MOMENTUM_LOOKBACK:
-            scores.append(np.nan)
-            continue
-        scores.append(float(hist.le(current).sum() / MOMENTUM_LOOKBACK))
-    out["main_score"] = scores
+    apply_theory_state(out, variety_id, theory_state)
+    return out
+
+
+def compute_signals(
+    df: pd.DataFrame,
+    variety_id: int | None = None,
+    momentum_lookback: int = MOMENTUM_LOOKBACK,
+    theory_state: dict | None = None,
+) -> pd.DataFrame:
+    """计算 A 通道特征、原始信号、理论状态机与 main_score。
+
+    theory_state 为 load_theory_states 恢复的快照（state_date/state/cycle_id/open_date）。
+    传入时状态机从该快照继续，只处理 trade_date > state_date 的行，更早的行仅作为滚动窗口上下文。
+    """
+    out = compute_features(df, momentum_lookback)
+    _add_raw_signals(out)
+    apply_theory_state(out, variety_id, theory_state)
+    return out
 
+
+def _lean_shift(values: np.ndarray, k: int) -> np.ndarray:
+    out = np.full(len(values), np.nan, dtype=values.dtype)
+    if k < len(values):
+        out[k:] = values[: len(values) - k]
     return out
 
 
+def compute_signals_lean(
+    arrays: dict[str, np.ndarray],
+    momentum_lookback: int = MOMENTUM_LOOKBACK,
+    explain: bool = False,
+) -> dict[str, np.ndarray]:
+    """在 load_varieties_lean 的紧凑数组上计算单品种信号，只保留参数扫描需要的列。
+
+    返回四个（经理论状态机过滤的）A_* 布尔数组、role/direction/state_after/open_pos 状态机编码（见 _scan_theory_state）
+    与 float32 的 main_score；explain=True 时额外返回 FEATURE_COLUMNS 中的中间特征，用于生成解释。
+    开平仓判定只依赖大小比较与差值符号，float32 下与 compute_signals 一致；main_score 在 |m3| 近似相等时可能有分位差异。
+    """
+    days = arrays["days"]
+    main = arrays["main_force"]
+    retail = arrays["retail"]
+    n = len(days)
+    pos = np.arange(n)
+
+    date_cont = np.ones(n, dtype=bool)
+    date_cont[1:] = np.diff(days) <= 7
+    cont7 = group_all_true(date_cont, pos, 6)
+    cont3 = group_all_true(date_cont, pos, 2)
+
+    main_diff = main - _lean_shift(main, 1)
+    retail_diff = retail - _lean_shift(retail, 1)
+    main_diff_t1 = _lean_shift(main_diff, 1)
+    retail_diff_t1 = _lean_shift(retail_diff, 1)
+    bg1, bg2, bg3, bg4, bg5 = (_lean_shift(main, k) for k in (6, 5, 4, 3, 2))
+
+    long_bg = (bg1 < 0) & (bg2 < 0) & (bg3 < 0) & (bg4 < 0) & (bg5 < 0) \
+        & (bg5 < bg1) & (bg5 < bg2) & (bg5 < bg3) & (bg5 < bg4)
+    short_bg = (bg1 > 0) & (bg2 > 0) & (bg3 > 0) & (bg4 > 0) & (bg5 > 0) \
+        & (bg5 > bg1) & (bg5 > bg2) & (bg5 > bg3) & (bg5 > bg4)
+    open_long = cont7 & long_bg & (main_diff_t1 > 0) & (main_diff > 0) & (retail_diff_t1 < 0) & (retail_diff < 0)
+    open_short = cont7 & short_bg & (main_diff_t1 < 0) & (main_diff < 0) & (retail_diff_t1 > 0) & (retail_diff > 0)
+    m3 = main - bg5
+
+    role, direction, state_after, open_pos = _scan_theory_state(
+        open_long, open_short, cont3 & (m3 < 0), cont3 & (m3 > 0)
+    )
+    result = {
+        "days": days,
+        "A_OPEN_LONG": open_long,
+        "A_OPEN_SHORT": open_short,
+        "A_CLOSE_LONG": (role == _ROLE_CLOSE) & (direction == _DIR_LONG),
+        "A_CLOSE_SHORT": (role == _ROLE_CLOSE) & (direction == _DIR_SHORT),
+        "role": role,
+        "direction": direction,
+        "state_after": state_after,
+        "open_pos": open_pos,
+        "main_score": rolling_percentile(np.abs(m3), momentum_lookback).astype(np.float32),
+    }
+    if explain:
+        result.update(
+            {
+                "date_cont": date_cont,
+                "main_diff": main_diff,
+                "retail_diff": retail_diff,
+                "cont7": cont7,
+                "cont3": cont3,
+                "bg1": bg1,
+                "bg2": bg2,
+                "bg3": bg3,
+                "bg4": bg4,
+                "bg5": bg5,
+                "m3": m3,
+            }
+        )
+    return result
+
+
 def _fv(v) -> float | None:
     return float(v) if pd.notna(v) else None
 
@@ -175,44 +300,61 @@ def _bv(v) -> bool:
     return bool(v) if pd.notna(v) else False
 
 
-def _make_extra_json(signal_df: pd.DataFrame, idx_pos: int, signal_type: str) -> str:
-    r = signal_df.iloc[idx_pos]
+_EXTRA_JSON_COLS = (
+    "main_force", "retail", "main_diff", "retail_diff",
+    "bg1", "bg2", "bg3", "bg4", "bg5", "m3", "cont7", "cont3",
+    "signal_role", "direction", "cycle_id", "related_open_date",
+    "theory_state_before", "theory_state_after",
+)
+
+
+def extra_json_columns(signal_df: pd.DataFrame) -> dict[str, np.ndarray]:
+    """一次性取出 extra_json 需要的列数组，批量生成时按信号复用。"""
+    cols = {name: signal_df[name].to_numpy() for name in _EXTRA_JSON_COLS if name in signal_df.columns}
+    cols["trade_date"] = signal_df["trade_date"].to_numpy()
+    return cols
+
+
+def _extra_json_from_columns(cols: dict[str, np.ndarray], idx_pos: int, signal_type: str) -> str:
+    def at(name: str, i: int = idx_pos):
+        arr = cols.get(name)
+        return None if arr is None else arr[i]
+
     is_open = signal_type in ("A_OPEN_LONG", "A_OPEN_SHORT")
     win_size = 7 if is_open else 3
 
     start = max(0, idx_pos - win_size + 1)
+    win_dates = np.datetime_as_string(cols["trade_date"][start : idx_pos + 1], unit="D")
+    win_main = cols["main_force"][start : idx_pos + 1]
+    win_retail = cols["retail"][start : idx_pos + 1]
     window = [
-        {
-            "trade_date": signal_df.iloc[i]["trade_date"].strftime("%Y-%m-%d"),
-            "main_force": _fv(signal_df.iloc[i]["main_force"]),
-            "retail": _fv(signal_df.iloc[i]["retail"]),
-        }
-        for i in range(start, idx_pos + 1)
+        {"trade_date": str(d), "main_force": _fv(m), "retail": _fv(rt)}
+        for d, m, rt in zip(win_dates, win_main, win_retail)
     ]
 
-    main_diff_t = _fv(r.get("main_diff"))
-    retail_diff_t = _fv(r.get("retail_diff"))
-    prev = signal_df.iloc[idx_pos - 1] if idx_pos >= 1 else None
-    main_diff_t1 = _fv(prev["main_diff"]) if prev is not None else None
-    retail_diff_t1 = _fv(prev["retail_diff"]) if prev is not None else None
+    main_diff_t = _fv(at("main_diff"))
+    retail_diff_t = _fv(at("retail_diff"))
+    main_diff_t1 = _fv(at("main_diff", idx_pos - 1)) if idx_pos >= 1 else None
+    retail_diff_t1 = _fv(at("retail_diff", idx_pos - 1)) if idx_pos >= 1 else None
 
-    bg1 = _fv(r.get("bg1"))
-    bg2 = _fv(r.get("bg2"))
-    bg3 = _fv(r.get("bg3"))
-    bg4 = _fv(r.get("bg4"))
-    bg5 = _fv(r.get("bg5"))
-    m3 = _fv(r.get("m3"))
+    bg1 = _fv(at("bg1"))
+    bg2 = _fv(at("bg2"))
+    bg3 = _fv(at("bg3"))
+    bg4 = _fv(at("bg4"))
+    bg5 = _fv(at("bg5"))
+    m3 = _fv(at("m3"))
+    related_open_date = at("related_open_date")
 
     data: dict = {
-        "main_force": _fv(r["main_force"]),
-        "retail": _fv(r["retail"]),
+        "main_force": _fv(at("main_force")),
+        "retail": _fv(at("retail")),
         "m3": m3,
-        "signal_role": r.get("signal_role"),
-        "direction": r.get("direction"),
-        "cycle_id": r.get("cycle_id"),
-        "related_open_date": r.get("related_open_date").isoformat() if r.get("related_open_date") else None,
-        "theory_state_before": r.get("theory_state_before"),
-        "theory_state_after": r.get("theory_state_after"),
+        "signal_role": at("signal_role"),
+        "direction": at("direction"),
+        "cycle_id": at("cycle_id"),
+        "related_open_date": related_open_date.isoformat() if related_open_date else None,
+        "theory_state_before": at("theory_state_before"),
+        "theory_state_after": at("theory_state_after"),
         "window": window,
     }
 
@@ -224,24 +366,17 @@ def _make_extra_json(signal_df: pd.DataFrame, idx_pos: int, signal_type: str) ->
             "retail_diff_t1": retail_diff_t1,
             "retail_diff_t": retail_diff_t,
         }
-
-        def _bg5_is_min() -> bool:
-            vals = [bg1, bg2, bg3, bg4, bg5]
-            return all(v is not None for v in vals) and bg5 < bg1 and bg5 < bg2 and bg5 < bg3 and bg5 < bg4  # type: ignore[operator]
-
-        def _bg5_is_max() -> bool:
-            vals = [bg1, bg2, bg3, bg4, bg5]
-            return all(v is not None for v in vals) and bg5 > bg1 and bg5 > bg2 and bg5 > bg3 and bg5 > bg4  # type: ignore[operator]
+        bg_complete = None not in (bg1, bg2, bg3, bg4, bg5)
 
         if signal_type == "A_OPEN_LONG":
             data["conditions"] = {
-                "cont7": _bv(r.get("cont7")),
+                "cont7": _bv(at("cont7")),
                 "bg1_lt0": bg1 is not None and bg1 < 0,
                 "bg2_lt0": bg2 is not None and bg2 < 0,
                 "bg3_lt0": bg3 is not None and bg3 < 0,
                 "bg4_lt0": bg4 is not None and bg4 < 0,
                 "bg5_lt0": bg5 is not None and bg5 < 0,
-                "bg5_is_min": _bg5_is_min(),
+                "bg5_is_min": bg_complete and bg5 < bg1 and bg5 < bg2 and bg5 < bg3 and bg5 < bg4,  # type: ignore[operator]
                 "main_diff_t1_gt0": main_diff_t1 is not None and main_diff_t1 > 0,
                 "main_diff_t_gt0": main_diff_t is not None and main_diff_t > 0,
                 "retail_diff_t1_lt0": retail_diff_t1 is not None and retail_diff_t1 < 0,
@@ -249,13 +384,13 @@ def _make_extra_json(signal_df: pd.DataFrame, idx_pos: int, signal_type: str) ->
             }
         else:  # A_OPEN_SHORT
             data["conditions"] = {
-                "cont7": _bv(r.get("cont7")),
+                "cont7": _bv(at("cont7")),
                 "bg1_gt0": bg1 is not None and bg1 > 0,
                 "bg2_gt0": bg2 is not None and bg2 > 0,
                 "bg3_gt0": bg3 is not None and bg3 > 0,
                 "bg4_gt0": bg4 is not None and bg4 > 0,
                 "bg5_gt0": bg5 is not None and bg5 > 0,
-                "bg5_is_max": _bg5_is_max(),
+                "bg5_is_max": bg_complete and bg5 > bg1 and bg5 > bg2 and bg5 > bg3 and bg5 > bg4,  # type: ignore[operator]
                 "main_diff_t1_lt0": main_diff_t1 is not None and main_diff_t1 < 0,
                 "main_diff_t_lt0": main_diff_t is not None and main_diff_t < 0,
                 "retail_diff_t1_gt0": retail_diff_t1 is not None and retail_diff_t1 > 0,
@@ -269,13 +404,23 @@ def _make_extra_json(signal_df: pd.DataFrame, idx_pos: int, signal_type: str) ->
             cond_key = "m3_gt0"
             cond_val = m3 is not None and m3 > 0
         data["conditions"] = {
-            "cont3": _bv(r.get("cont3")),
+            "cont3": _bv(at("cont3")),
             cond_key: cond_val,
         }
 
     return json.dumps(data, ensure_ascii=False)
 
 
+def _make_extra_json(signal_df: pd.DataFrame, idx_pos: int, signal_type: str) -> str:
+    return _extra_json_from_columns(extra_json_columns(signal_df), idx_pos, signal_type)
+
+
+def make_extra_json_batch(signal_df: pd.DataFrame, items: list[tuple[int, str]]) -> list[str]:
+    """为同一品种的多个 (行号, 信号类型) 批量生成 extra_json，列数组只提取一次，供历史回放使用。"""
+    cols = extra_json_columns(signal_df)
+    return [_extra_json_from_columns(cols, idx_pos, signal_type) for idx_pos, signal_type in items]
+
+
 def _find_related_open_signal_id(cur, variety_id: int, cycle_id: str | None) -> int | None:
     if not cycle_id:
         return None
@@ -291,95 +436,433 @@ def _find_related_open_signal_id(cur, variety_id: int, cycle_id: str | None) ->
     return int(row["id"]) if row else None
 
 
+SIGNAL_TYPES = ("A_OPEN_LONG", "A_OPEN_SHORT", "A_CLOSE_LONG", "A_CLOSE_SHORT")
+
+INSERT_SIGNAL_SQL = """
+    INSERT INTO trading_signals
+        (signal_date, variety_id, variety_name, signal_type, signal_role,
+         direction, cycle_id, related_open_signal_id, related_open_date,
+         theory_state_before, theory_state_after, main_score, extra_json)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+# signal_rows 返回的参数列表中 related_open_signal_id 所在下标
+RELATED_ID_POS = 7
+
+
+def signal_rows(
+    signal_df: pd.DataFrame,
+    idx_pos: int,
+    variety_id: int,
+    variety_name: str,
+    cols: dict[str, np.ndarray] | None = None,
+) -> list[list]:
+    """生成 signal_df 第 idx_pos 行触发的全部信号的 INSERT 参数；related_open_signal_id 留空由调用方回填。
+
+    cols 为 extra_json_columns 的结果，同一 signal_df 多次调用时传入可避免重复取列。
+    """
+    r = signal_df.iloc[idx_pos]
+    signal_date = r["trade_date"].date()
+    main_score = float(r["main_score"]) if pd.notna(r.get("main_score")) else None
+
+    rows: list[list] = []
+    for stype in SIGNAL_TYPES:
+        if not bool(r.get(stype, False)):
+            continue
+        is_open = stype in ("A_OPEN_LONG", "A_OPEN_SHORT")
+        score = main_score if is_open else None
+        if cols is None:
+            cols = extra_json_columns(signal_df)
+        extra = _extra_json_from_columns(cols, idx_pos, stype)
+        signal_role = str(r.get("signal_role") or ("open" if is_open else "close"))
+        direction = str(r.get("direction") or ("LONG" if stype.endswith("LONG") else "SHORT"))
+        cycle_id = r.get("cycle_id")
+        related_open_date = r.get("related_open_date") if signal_role == "close" else None
+        state_before = str(r.get("theory_state_before") or "none")
+        state_after = str(r.get("theory_state_after") or "none")
+        rows.append([
+            signal_date, variety_id, variety_name, stype, signal_role,
+            direction, cycle_id, None, related_open_date,
+            state_before, state_after, score, extra,
+        ])
+    return rows
+
+
+def _row_position(signal_df: pd.DataFrame, signal_date: date) -> int | None:
+    positions = np.flatnonzero((signal_df["trade_date"].dt.date == signal_date).to_numpy())
+    return int(positions[-1]) if len(positions) else None
+
+
 def save_signals(
     conn: pymysql.Connection,
     signal_date: date,
     variety_id: int,
     variety_name: str,
     signal_df: pd.DataFrame,
+    commit: bool = True,
 ) -> int:
-    mask = signal_df["trade_date"].dt.date == signal_date
-    positions = np.where(mask.values)[0]
-    if len(positions) == 0:
+    idx_pos = _row_position(signal_df, signal_date)
+    if idx_pos is None:
         return 0
 
-    idx_pos = int(positions[-1])
-    r = signal_df.iloc[idx_pos]
-
-    signal_types = [
-        ("A_OPEN_LONG", "A_OPEN_LONG"),
-        ("A_OPEN_SHORT", "A_OPEN_SHORT"),
-        ("A_CLOSE_LONG", "A_CLOSE_LONG"),
-        ("A_CLOSE_SHORT", "A_CLOSE_SHORT"),
-    ]
-    main_score = float(r["main_score"]) if pd.notna(r.get("main_score")) else None
-
-    inserted = 0
+    rows = signal_rows(signal_df, idx_pos, variety_id, variety_name)
     with conn.cursor() as cur:
         # 先清除该品种该日期的全部旧信号，确保重跑时不留残留记录
         cur.execute(
             "DELETE FROM trading_signals WHERE signal_date=%s AND variety_id=%s",
             (signal_date, variety_id),
         )
-        for col, stype in signal_types:
-            if not bool(r.get(col, False)):
-                continue
-            score = main_score if stype in ("A_OPEN_LONG", "A_OPEN_SHORT") else None
-            extra = _make_extra_json(signal_df, idx_pos, stype)
-            signal_role = str(r.get("signal_role") or ("open" if stype in ("A_OPEN_LONG", "A_OPEN_SHORT") else "close"))
-            direction = str(r.get("direction") or ("LONG" if stype.endswith("LONG") else "SHORT"))
-            cycle_id = r.get("cycle_id")
-            related_open_date = r.get("related_open_date") if signal_role == "close" else None
-            related_open_signal_id = _find_related_open_signal_id(cur, variety_id, cycle_id) if signal_role == "close" else None
-            state_before = str(r.get("theory_state_before") or "none")
-            state_after = str(r.get("theory_state_after") or "none")
-            cur.execute(
-                """
-                INSERT INTO trading_signals
-                    (signal_date, variety_id, variety_name, signal_type, signal_role,
-                     direction, cycle_id, related_open_signal_id, related_open_date,
-                     theory_state_before, theory_state_after, main_score, extra_json)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """,
-                (
-                    signal_date, variety_id, variety_name, stype, signal_role,
-                    direction, cycle_id, related_open_signal_id, related_open_date,
-                    state_before, state_after, score, extra,
-                ),
-            )
-            inserted += 1
-    conn.commit()
-    return inserted
-
-
-def run_signals_for_all(conn: pymysql.Connection, signal_date: date) -> dict[str, list[str]]:
-    from .data_loader import load_variety_map, load_variety_data
+        for args in rows:
+            if args[4] == "close":
+                args[RELATED_ID_POS] = _find_related_open_signal_id(cur, variety_id, args[6])
+            cur.execute(INSERT_SIGNAL_SQL, args)
+    if commit:
+        conn.commit()
+    return len(rows)
+
+
+def prefetch_open_signal_ids(cur, rows: list[list]) -> dict[tuple[int, str], int]:
+    """一次查询平仓行涉及的全部理论周期，返回 (variety_id, cycle_id) → 最近一条开仓信号 id。"""
+    keys = {(args[1], args[6]) for args in rows if args[4] == "close" and args[6]}
+    if not keys:
+        return {}
+    vids = sorted({k[0] for k in keys})
+    cycles = sorted({k[1] for k in keys})
+    cur.execute(
+        f"SELECT id, variety_id, cycle_id FROM trading_signals "
+        f"WHERE signal_role='open' "
+        f"AND variety_id IN ({','.join(['%s'] * len(vids))}) "
+        f"AND cycle_id IN ({','.join(['%s'] * len(cycles))}) "
+        f"ORDER BY signal_date, id",
+        (*vids, *cycles),
+    )
+    # 按 (signal_date, id) 升序覆盖，保留每个周期最新的一条，与 _find_related_open_signal_id 口径一致
+    return {(int(r["variety_id"]), r["cycle_id"]): int(r["id"]) for r in cur.fetchall()}
+
+
+def save_signals_bulk(
+    conn: pymysql.Connection,
+    signal_date: date,
+    rows_by_variety: dict[int, list[list]],
+    state_rows: list[tuple] | None = None,
+) -> int:
+    """在一个事务内写入多个品种同一日期的信号。
+
+    rows_by_variety 为 {variety_id: signal_rows 生成的信号行}，由调用方逐品种预先整理。
+    一条 DELETE 清掉这些品种当日旧信号，一次预取平仓信号关联的开仓信号 id，再用一次 executemany 插入全部信号；
+    state_rows 非空时同一事务内一并写入 trading_signal_state。
+    """
+    rows = [args for variety_rows in rows_by_variety.values() for args in variety_rows]
+    vids = list(rows_by_variety)
+
+    try:
+        with conn.cursor() as cur:
+            if vids:
+                cur.execute(
+                    f"DELETE FROM trading_signals WHERE signal_date=%s "
+                    f"AND variety_id IN ({','.join(['%s'] * len(vids))})",
+                    (signal_date, *vids),
+                )
+            open_ids = prefetch_open_signal_ids(cur, rows)
+            for args in rows:
+                if args[4] == "close" and args[6]:
+                    args[RELATED_ID_POS] = open_ids.get((args[1], args[6]))
+            if rows:
+                cur.executemany(INSERT_SIGNAL_SQL, rows)
+            if state_rows:
+                cur.executemany(UPSERT_STATE_SQL, state_rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(rows)
+
+
+# 增量模式需要的上下文行数：main_score 回看依赖 m3（再往前 2 行），cont7 / bg1 依赖前 6 行
+def warmup_bars(momentum_lookback: int) -> int:
+    return max(momentum_lookback + 2, 6)
+
+
+# 增量模式单次最多补算的新 bar 数，超过则回退全量重算
+_MAX_INCREMENTAL_BARS = 20
+
+_CONSISTENCY_COLS = (
+    "A_OPEN_LONG", "A_OPEN_SHORT", "A_CLOSE_LONG", "A_CLOSE_SHORT",
+    "signal_role", "direction", "cycle_id", "related_open_date",
+    "theory_state_before", "theory_state_after",
+)
+
+
+def load_theory_states(conn: pymysql.Connection, signal_date: date) -> dict[int, dict]:
+    """读取每个品种在 signal_date 之前最近一次的理论状态快照，用于增量计算。"""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT s.variety_id, s.state_date, s.state, s.cycle_id, s.open_date
+            FROM trading_signal_state s
+            INNER JOIN (
+                SELECT variety_id, MAX(state_date) AS state_date
+                FROM trading_signal_state WHERE state_date<%s GROUP BY variety_id
+            ) t ON t.variety_id=s.variety_id AND t.state_date=s.state_date
+            """,
+            (signal_date,),
+        )
+        return {int(r["variety_id"]): r for r in cur.fetchall()}
+
+
+UPSERT_STATE_SQL = """
+    INSERT INTO trading_signal_state (variety_id, state_date, state, cycle_id, open_date)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        state=VALUES(state), cycle_id=VALUES(cycle_id), open_date=VALUES(open_date)
+"""
+
+
+def theory_state_row(
+    signal_date: date,
+    variety_id: int,
+    signal_df: pd.DataFrame,
+    theory_state: dict | None = None,
+) -> tuple | None:
+    positions = np.flatnonzero((signal_df["trade_date"].dt.date <= signal_date).to_numpy())
+    if len(positions) == 0:
+        return None
+    idx_pos = int(positions[-1])
+    state = str(signal_df["theory_state_after"].iloc[idx_pos])
+    cycle_id: str | None = None
+    open_date: date | None = None
+    if state != "none":
+        opens = np.flatnonzero((signal_df["signal_role"].iloc[: idx_pos + 1] == "open").to_numpy())
+        if len(opens):
+            cycle_id = signal_df["cycle_id"].iloc[opens[-1]]
+            open_date = signal_df["trade_date"].iloc[opens[-1]].date()
+        elif theory_state is not None:
+            cycle_id = theory_state["cycle_id"]
+            open_date = theory_state["open_date"]
+    return (variety_id, signal_df["trade_date"].iloc[idx_pos].date(), state, cycle_id, open_date)
+
+
+def save_theory_state(
+    conn: pymysql.Connection,
+    signal_date: date,
+    variety_id: int,
+    signal_df: pd.DataFrame,
+    theory_state: dict | None = None,
+    commit: bool = True,
+) -> None:
+    """把 signal_date（含）之前最后一行的理论状态及其开仓周期写入 trading_signal_state。"""
+    row = theory_state_row(signal_date, variety_id, signal_df, theory_state)
+    if row is None:
+        return
+    with conn.cursor() as cur:
+        cur.execute(UPSERT_STATE_SQL, row)
+    if commit:
+        conn.commit()
+
+
+def compute_signals_incremental(
+    conn: pymysql.Connection,
+    signal_date: date,
+    variety_id: int,
+    theory_state: dict,
+) -> pd.DataFrame | None:
+    """基于理论状态快照 + 最近若干条 bar 计算信号；上下文不足时返回 None，由调用方回退全量。"""
+    from .data_loader import load_variety_tail
+
+    warmup = warmup_bars(MOMENTUM_LOOKBACK)
+    limit = warmup + _MAX_INCREMENTAL_BARS
+    df = load_variety_tail(conn, variety_id, signal_date, limit)
+    if df.empty:
+        return df
+    context = int((df["trade_date"].dt.date <= theory_state["state_date"]).sum())
+    if len(df) >= limit and context < warmup:
+        return None
+    return compute_signals(df, variety_id, theory_state=theory_state)
+
+
+def _compute_variety_signals(
+    conn: pymysql.Connection,
+    signal_date: date,
+    variety_id: int,
+    theory_state: dict | None,
+) -> tuple[pd.DataFrame, dict | None]:
+    from .data_loader import load_variety_data
+
+    if theory_state is not None:
+        sig_df = compute_signals_incremental(conn, signal_date, variety_id, theory_state)
+        if sig_df is not None:
+            return sig_df, theory_state
+        logger.info("品种 %s 状态快照过旧，回退全量计算", variety_id)
+
+    df = load_variety_data(conn, variety_id)
+    if df.empty:
+        return df, None
+    return compute_signals(df, variety_id), None
+
+
+def compute_frames(frames: dict[int, pd.DataFrame]) -> dict[int, pd.DataFrame | str]:
+    """对一组已装载的品种数据计算信号；面板计算失败时逐品种重算，单品种异常以字符串返回。"""
+    from .panel import compute_panel_signals, stack_variety_frames
+
+    try:
+        return dict(compute_panel_signals(stack_variety_frames(frames)))
+    except Exception as exc:
+        logger.warning("面板计算失败，改为逐品种计算: %s", exc)
+
+    results: dict[int, pd.DataFrame | str] = {}
+    for vid, df in frames.items():
+        if df.empty:
+            continue
+        try:
+            results[vid] = compute_signals(df, vid)
+        except Exception as exc:
+            results[vid] = f"{type(exc).__name__}: {exc}"
+    return results
+
+
+def compute_frames_parallel(frames: dict[int, pd.DataFrame], workers: int) -> dict[int, pd.DataFrame | str]:
+    from concurrent.futures import ProcessPoolExecutor
+
+    items = sorted(frames.items())
+    chunks = [dict(items[i::workers]) for i in range(workers)]
+    chunks = [c for c in chunks if c]
+    results: dict[int, pd.DataFrame | str] = {}
+    with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+        for part in pool.map(compute_frames, chunks):
+            results.update(part)
+    return results
+
+
+def run_signals_for_all(
+    conn: pymysql.Connection,
+    signal_date: date,
+    incremental: bool = False,
+    workers: int = 1,
+    use_features: bool = False,
+) -> dict[str, list[str]]:
+    """计算全品种信号并写表。
+
+    分两个阶段：先计算全部品种信号，再统一写表并在最后一次性提交。
+    默认一次装载全部品种并用面板引擎 compute_panel_signals 一次算完；workers > 1 时把品种分片交给进程池计算，
+    父进程负责全部数据库读写。incremental=True 时从 trading_signal_state 恢复理论状态，只读取最近若干条 bar
+    计算新日期，无快照或快照过旧的品种自动回退全量重算（此模式不使用进程池）。
+    use_features=True（仅全量模式）时直接读取 trading_features 中的预计算特征生成信号，不再装载原始强度数据，
+    调用前应先执行 features.sync_features。
+    两种模式都会把最新状态写回 trading_signal_state。单品种计算或写表失败只记录告警，不影响其他品种。
+    """
+    from .data_loader import load_all_varieties_data, load_variety_map
 
     variety_df = load_variety_map(conn)
     if variety_df.empty:
         return {}
 
+    computed: dict[int, tuple[pd.DataFrame, dict | None]] = {}
+    names = {int(vid): str(name) for vid, name in zip(variety_df["id"], variety_df["name"])}
+    if incremental:
+        states = load_theory_states(conn, signal_date)
+        for vid, vname in names.items():
+            try:
+                computed[vid] = _compute_variety_signals(conn, signal_date, vid, states.get(vid))
+            except Exception as exc:
+                logger.warning("品种 %s 信号计算失败: %s", vname, exc)
+    elif use_features:
+        from .features import load_features
+
+        for vid, feat_df in load_features(conn).items():
+            try:
+                computed[vid] = (signals_from_features(feat_df, vid), None)
+            except Exception as exc:
+                logger.warning("品种 %s 信号计算失败: %s", names.get(vid, vid), exc)
+    else:
+        frames = load_all_varieties_data(conn)
+        if workers > 1:
+            frame_results = compute_frames_parallel(frames, workers)
+        else:
+            frame_results = compute_frames(frames)
+        for vid, res in frame_results.items():
+            if isinstance(res, str):
+                logger.warning("品种 %s 信号计算失败: %s", names.get(vid, vid), res)
+                continue
+            computed[vid] = (res, None)
+
     results: dict[str, list[str]] = {}
-    for _, vrow in variety_df.iterrows():
-        vid = int(vrow["id"])
-        vname = str(vrow["name"])
-        df = load_variety_data(conn, vid)
-        if df.empty or df["trade_date"].dt.date.max() < signal_date:
+    rows_by_variety: dict[int, list[list]] = {}
+    state_rows: list[tuple] = []
+    for vid, vname in names.items():
+        if vid not in computed:
             continue
+        sig_df, used_state = computed[vid]
+        if sig_df.empty or sig_df["trade_date"].dt.date.max() < signal_date:
+            continue
+        # 信号行在这里逐品种生成，单个品种整理失败只跳过该品种，不影响整批写表
         try:
-            sig_df = compute_signals(df, vid)
-            save_signals(conn, signal_date, vid, vname, sig_df)
-            mask = sig_df["trade_date"].dt.date == signal_date
-            row = sig_df[mask]
-            if not row.empty:
-                r = row.iloc[-1]
-                triggered = [
-                    st for st in ("A_OPEN_LONG", "A_OPEN_SHORT", "A_CLOSE_LONG", "A_CLOSE_SHORT")
-                    if bool(r.get(st, False))
-                ]
-                if triggered:
-                    results[vname] = triggered
+            state_row = theory_state_row(signal_date, vid, sig_df, used_state)
+            row = _row_on(sig_df, signal_date)
+            idx_pos = _row_position(sig_df, signal_date)
+            variety_rows = signal_rows(sig_df, idx_pos, vid, vname) if idx_pos is not None else []
         except Exception as exc:
-            logger.warning("品种 %s 信号计算失败: %s", vname, exc)
+            logger.warning("品种 %s 信号整理失败: %s", vname, exc)
+            continue
+        rows_by_variety[vid] = variety_rows
+        if state_row is not None:
+            state_rows.append(state_row)
+        if row is not None:
+            triggered = [st for st in SIGNAL_TYPES if bool(row.get(st, False))]
+            if triggered:
+                results[vname] = triggered
+
+    inserted = save_signals_bulk(conn, signal_date, rows_by_variety, state_rows)
+    logger.info("trading_signals 写入 %d 条（%d 个品种）", inserted, len(rows_by_variety))
 
     return results
+
+
+def _row_on(sig_df: pd.DataFrame, signal_date: date) -> pd.Series | None:
+    row = sig_df[sig_df["trade_date"].dt.date == signal_date]
+    return None if row.empty else row.iloc[-1]
+
+
+def check_incremental_consistency(conn: pymysql.Connection, signal_date: date) -> list[str]:
+    """对有状态快照的品种分别跑全量和增量计算，返回 signal_date 当日结果不一致的描述列表（不写库）。
+
+    两侧的数据来源与 run_signals_for_all 对应模式一致：全量一侧经 load_varieties_data 装载（镜像开启时读本地镜像），
+    增量一侧与增量模式一样经 load_variety_tail 读 MySQL。
+    """
+    from .data_loader import load_variety_map, load_varieties_data
+
+    variety_df = load_variety_map(conn)
+    if variety_df.empty:
+        return []
+    states = load_theory_states(conn, signal_date)
+    if not states:
+        return []
+    frames = load_varieties_data(conn, [int(vid) for vid in variety_df["id"] if int(vid) in states])
+
+    mismatches: list[str] = []
+    for _, vrow in variety_df.iterrows():
+        vid = int(vrow["id"])
+        vname = str(vrow["name"])
+        state = states.get(vid)
+        if state is None:
+            continue
+        inc_df = compute_signals_incremental(conn, signal_date, vid, state)
+        if inc_df is None:
+            mismatches.append(f"{vname}: 状态快照过旧，无法增量计算")
+            continue
+        full_df = frames.get(vid, pd.DataFrame())
+        full_row = _row_on(compute_signals(full_df, vid), signal_date) if not full_df.empty else None
+        inc_row = _row_on(inc_df, signal_date) if not inc_df.empty else None
+        if full_row is None or inc_row is None:
+            if (full_row is None) != (inc_row is None):
+                mismatches.append(f"{vname}: 当日数据行只在一侧存在")
+            continue
+
+        for col in _CONSISTENCY_COLS:
+            a, b = full_row[col], inc_row[col]
+            if not (a == b or (pd.isna(a) and pd.isna(b))):
+                mismatches.append(f"{vname}: {col} 全量={a!r} 增量={b!r}")
+        a, b = full_row["main_score"], inc_row["main_score"]
+        if not (np.isclose(a, b) or (pd.isna(a) and pd.isna(b))):
+            mismatches.append(f"{vname}: main_score 全量={a!r} 增量={b!r}")
+
+    return mismatches
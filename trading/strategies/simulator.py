@@ -0,0 +1,428 @@
+"""
+组合模拟器。
+在内存中按 daily_run 的顺序逐日回放：生成操作建议 → 平仓 → 开仓 → 更新资金曲线，
+组合约束直接调用 operations.select_operations，开平仓与资金曲线调用 account 中的规则函数，全程不写库。
+输出资金曲线、成交（持仓）明细和全部操作建议（含落选原因）。
+
+运行：python -m trading.strategies.simulator [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--check]
+      --check 时按 trading_account_daily 中的运行日期回放，并与 daily_run 实际写入的结果逐项比对
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import logging
+import sys
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import numpy as np
+import pandas as pd
+import pymysql
+
+from trading.strategies.account import account_day, close_pnl_pct, match_close_signals, open_direction
+from trading.strategies.account_metrics import next_metrics
+from trading.strategies.operations import select_operations
+from trading.strategies.settings import INITIAL_CAPITAL, LEVERAGE, MAX_SLOTS, SIZE_PCT
+
+logger = logging.getLogger("simulator")
+
+_OPEN_TYPES = ("A_OPEN_LONG", "A_OPEN_SHORT")
+_SIGNAL_TYPES = ("A_OPEN_LONG", "A_OPEN_SHORT", "A_CLOSE_LONG", "A_CLOSE_SHORT")
+
+EQUITY_COLUMNS = ["record_date", "equity", "cash", "position_val", "daily_pnl"]
+TRADE_COLUMNS = [
+    "id", "operation_id", "open_signal_id", "close_signal_id", "theory_cycle_id",
+    "variety_id", "variety_name", "sector", "direction", "open_date", "open_price", "size_pct",
+    "status", "close_date", "close_price", "pnl_pct",
+]
+OPERATION_COLUMNS = [
+    "id", "signal_id", "signal_date", "variety_id", "variety_name", "sector", "signal_type",
+    "direction", "signal_cycle_id", "main_score", "is_selected", "reject_reason", "selection_rank",
+]
+
+
+def build_signal_book(signal_frames: dict[int, pd.DataFrame], names: dict[int, str]) -> dict[date, list[dict]]:
+    """把 compute_signals 结果整理为 {signal_date: [trading_signals 行]}，字段口径与 signals.signal_rows 一致。
+
+    同一天内按 (variety_id, signal_type) 排序并依次分配 id，模拟写表时的自增 id。
+    """
+    items: list[tuple[date, int, int, dict]] = []
+    for vid, df in signal_frames.items():
+        if df.empty:
+            continue
+        flags = {st: df[st].to_numpy(dtype=bool) for st in _SIGNAL_TYPES if st in df}
+        hit = np.flatnonzero(np.logical_or.reduce(list(flags.values())))
+        if not len(hit):
+            continue
+        dates = df["trade_date"].dt.date.to_numpy()
+        roles = df["signal_role"].to_numpy() if "signal_role" in df else None
+        directions = df["direction"].to_numpy() if "direction" in df else None
+        cycles = df["cycle_id"].to_numpy() if "cycle_id" in df else None
+        scores = df["main_score"].to_numpy(dtype=float) if "main_score" in df else None
+        for i in hit:
+            for k, stype in enumerate(_SIGNAL_TYPES):
+                if stype not in flags or not flags[stype][i]:
+                    continue
+                is_open = stype in _OPEN_TYPES
+                score = scores[i] if scores is not None and is_open else None
+                items.append((dates[i], vid, k, {
+                    "signal_date": dates[i],
+                    "variety_id": vid,
+                    "variety_name": names.get(vid, str(vid)),
+                    "signal_type": stype,
+                    "signal_role": (roles[i] if roles is not None else None) or ("open" if is_open else "close"),
+                    "direction": (directions[i] if directions is not None else None)
+                    or ("LONG" if stype.endswith("LONG") else "SHORT"),
+                    "cycle_id": cycles[i] if cycles is not None else None,
+                    "main_score": None if score is None or np.isnan(score) else float(score),
+                }))
+
+    book: dict[date, list[dict]] = {}
+    for sig_id, (d, _, _, row) in enumerate(sorted(items, key=lambda x: x[:3]), start=1):
+        row["id"] = sig_id
+        book.setdefault(d, []).append(row)
+    return book
+
+
+class PriceBook:
+    """按品种保存升序收盘价，提供当日价与此前最近一条价格的查询（对应 _get_close_price / _get_prev_close）。"""
+
+    def __init__(self, closes: dict[int, pd.DataFrame]) -> None:
+        self._dates: dict[int, list[date]] = {}
+        self._prices: dict[int, list[float]] = {}
+        self._by_day: dict[int, dict[date, float]] = {}
+        for vid, s in closes.items():
+            days = [d.date() if isinstance(d, datetime) else d for d in s["trade_date"]]
+            prices = [float(p) for p in s["close_price"]]
+            self._dates[vid] = days
+            self._prices[vid] = prices
+            self._by_day[vid] = dict(zip(days, prices))
+
+    def close(self, vid: int, d: date) -> float | None:
+        return self._by_day.get(vid, {}).get(d)
+
+    def prev_close(self, vid: int, d: date) -> float | None:
+        days = self._dates.get(vid)
+        if not days:
+            return None
+        i = bisect.bisect_left(days, d)
+        return self._prices[vid][i - 1] if i > 0 else None
+
+
+def simulate(
+    signal_book: dict[date, list[dict]],
+    closes: dict[int, pd.DataFrame] | PriceBook,
+    pool: dict[int, dict],
+    dates: list[date],
+    initial_equity: float = INITIAL_CAPITAL,
+    initial_positions: list[dict] | None = None,
+    max_slots: int = MAX_SLOTS,
+    size_pct: float = SIZE_PCT,
+    leverage: float = LEVERAGE,
+) -> dict[str, pd.DataFrame]:
+    """按 dates 逐日回放 daily_run，返回 {"equity", "trades", "operations"} 三张 DataFrame。
+
+    pool 与 operations.get_pool_varieties 同构（{variety_id: {variety_name, sector}}）；
+    initial_positions 为回放起点之前已开放的持仓（trading_positions 行），从区间中间开始核对时使用。
+    max_slots / size_pct / leverage 默认取 settings，参数扫描时按组合传入。
+    """
+    rows = simulate_rows(
+        signal_book, closes, pool, dates, initial_equity, initial_positions, max_slots, size_pct, leverage
+    )
+    return {
+        "equity": pd.DataFrame(rows["equity"], columns=EQUITY_COLUMNS),
+        "trades": pd.DataFrame(rows["trades"], columns=TRADE_COLUMNS),
+        "operations": pd.DataFrame(rows["operations"], columns=OPERATION_COLUMNS),
+    }
+
+
+def simulate_rows(
+    signal_book: dict[date, list[dict]],
+    closes: dict[int, pd.DataFrame] | PriceBook,
+    pool: dict[int, dict],
+    dates: list[date],
+    initial_equity: float = INITIAL_CAPITAL,
+    initial_positions: list[dict] | None = None,
+    max_slots: int = MAX_SLOTS,
+    size_pct: float = SIZE_PCT,
+    leverage: float = LEVERAGE,
+    initial_metrics: dict | None = None,
+    track_metrics: bool = False,
+) -> dict[str, list]:
+    """simulate 的逐行版本：返回 {"equity": [元组], "trades": [持仓 dict], "operations": [建议 dict], "metrics": [指标行]}。
+
+    operations 保留 select_operations 输出的全部字段（可直接交给 operations.operation_row）；
+    track_metrics=True 时在 initial_metrics 之上按 update_account_daily 的口径逐日叠加累计指标。
+    """
+    prices = closes if isinstance(closes, PriceBook) else PriceBook(closes)
+    positions: list[dict] = [
+        {**p, "status": "open", "close_date": None, "close_price": None, "pnl_pct": None, "close_signal_id": None}
+        for p in (initial_positions or [])
+    ]
+    open_positions = list(positions)
+    operations: list[dict] = []
+    curve: list[tuple] = []
+    metrics: list[dict] = []
+    prev_metrics = initial_metrics
+    prev_equity = float(initial_equity)
+    next_pos_id = max((int(p["id"]) for p in positions), default=0) + 1
+
+    for d in dates:
+        signals = signal_book.get(d, [])
+
+        # Step 2：建议生成时当日平仓尚未执行，当日将被平掉的持仓仍占用槽位
+        held = [p for p in open_positions if p["open_date"] < d]
+        ops = select_operations(pool, held, set(), [s for s in signals if s["signal_role"] == "open"], max_slots)
+        for c in ops:
+            c["id"] = len(operations) + 1
+            c["signal_date"] = d
+            operations.append(c)
+
+        # Step 3：平仓
+        closed_today: set[int] = set()
+        closed_rows: list[dict] = []
+        for pos, sig in match_close_signals(open_positions, [s for s in signals if s["signal_role"] == "close"]):
+            vid = int(pos["variety_id"])
+            price = prices.close(vid, d)
+            if price is None:
+                continue
+            pos.update(
+                status="closed", close_date=d, close_price=price, close_signal_id=sig["id"],
+                pnl_pct=close_pnl_pct(pos["direction"], float(pos["open_price"]), price),
+            )
+            closed_today.add(vid)
+            closed_rows.append(pos)
+        if closed_rows:
+            open_positions = [p for p in open_positions if p["status"] == "open"]
+
+        # Step 4：开仓
+        for op in ops:
+            if not op["is_selected"] or op["variety_id"] in closed_today:
+                continue
+            price = prices.close(op["variety_id"], d)
+            if price is None:
+                continue
+            pos = {
+                "id": next_pos_id, "operation_id": op["id"], "open_signal_id": op["signal_id"],
+                "close_signal_id": None, "theory_cycle_id": op["signal_cycle_id"],
+                "variety_id": op["variety_id"], "variety_name": op["variety_name"], "sector": op["sector"],
+                "direction": open_direction(op), "open_date": d, "open_price": price, "size_pct": size_pct,
+                "status": "open", "close_date": None, "close_price": None, "pnl_pct": None,
+            }
+            next_pos_id += 1
+            positions.append(pos)
+            open_positions.append(pos)
+
+        # Step 5：资金曲线
+        sector_pnl: dict[str, float] | None = {} if track_metrics else None
+        equity, cash, position_val, daily_pnl = account_day(
+            prev_equity, d, open_positions, closed_rows,
+            lambda vid: prices.close(vid, d),
+            lambda vid: prices.prev_close(vid, d),
+            leverage,
+            sector_pnl,
+        )
+        curve.append((d, equity, cash, position_val, daily_pnl))
+        if track_metrics:
+            prev_metrics = next_metrics(
+                prev_metrics, d, prev_equity, equity, daily_pnl, [p["pnl_pct"] for p in closed_rows], sector_pnl
+            )
+            metrics.append(prev_metrics)
+        prev_equity = equity
+
+    return {"equity": curve, "trades": positions, "operations": operations, "metrics": metrics}
+
+
+def compare_with_database(
+    conn: pymysql.Connection,
+    result: dict[str, pd.DataFrame],
+    start: date,
+    end: date,
+    rel_tol: float = 1e-4,
+) -> list[str]:
+    """把模拟结果与 daily_run 在 [start, end] 写入的操作建议、持仓和资金曲线逐项比对，返回不一致描述列表。
+
+    库中 FLOAT 列只有单精度，价格和权益按 rel_tol 相对误差比较。
+    """
+    mismatches: list[str] = []
+
+    def _close(a, b) -> bool:
+        if a is None or b is None:
+            return a is None and b is None
+        return abs(float(a) - float(b)) <= rel_tol * max(abs(float(a)), abs(float(b)), 1.0)
+
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT signal_date, variety_id, signal_type, is_selected, reject_reason, selection_rank "
+            "FROM trading_operations WHERE signal_date BETWEEN %s AND %s",
+            (start, end),
+        )
+        db_ops = {
+            (r["signal_date"], int(r["variety_id"]), r["signal_type"]):
+                (int(r["is_selected"]), r["reject_reason"], r["selection_rank"])
+            for r in cur.fetchall()
+        }
+        cur.execute(
+            "SELECT variety_id, direction, open_date, open_price, status, close_date, close_price "
+            "FROM trading_positions WHERE open_date BETWEEN %s AND %s",
+            (start, end),
+        )
+        db_trades = {(int(r["variety_id"]), r["open_date"]): r for r in cur.fetchall()}
+        cur.execute(
+            "SELECT record_date, equity FROM trading_account_daily WHERE record_date BETWEEN %s AND %s",
+            (start, end),
+        )
+        db_equity = {r["record_date"]: float(r["equity"]) for r in cur.fetchall()}
+
+    sim_ops = {
+        (r.signal_date, int(r.variety_id), r.signal_type): (
+            int(r.is_selected),
+            None if pd.isna(r.reject_reason) else r.reject_reason,
+            None if pd.isna(r.selection_rank) else int(r.selection_rank),
+        )
+        for r in result["operations"].itertuples(index=False)
+    }
+    for key in sorted(db_ops.keys() | sim_ops.keys()):
+        if db_ops.get(key) != sim_ops.get(key):
+            mismatches.append(f"operations {key}: db={db_ops.get(key)} sim={sim_ops.get(key)}")
+
+    trades = result["trades"]
+    sim_trades = {
+        (int(r.variety_id), r.open_date): r
+        for r in trades[(trades["open_date"] >= start) & (trades["open_date"] <= end)].itertuples(index=False)
+    }
+    for key in sorted(db_trades.keys() | sim_trades.keys()):
+        db_row, sim_row = db_trades.get(key), sim_trades.get(key)
+        if db_row is None or sim_row is None:
+            mismatches.append(f"positions {key}: db={'有' if db_row else '无'} sim={'有' if sim_row else '无'}")
+            continue
+        # 区间之后才平仓的持仓在模拟结束时仍为 open
+        db_closed = db_row["close_date"] is not None and db_row["close_date"] <= end
+        same = (
+            db_row["direction"] == sim_row.direction
+            and _close(db_row["open_price"], sim_row.open_price)
+            and (db_row["close_date"] if db_closed else None) == sim_row.close_date
+            and (not db_closed or _close(db_row["close_price"], sim_row.close_price))
+        )
+        if not same:
+            mismatches.append(
+                f"positions {key}: db=({db_row['direction']}, {db_row['close_date']}) "
+                f"sim=({sim_row.direction}, {sim_row.close_date})"
+            )
+
+    sim_equity = dict(zip(result["equity"]["record_date"], result["equity"]["equity"]))
+    for d in sorted(db_equity.keys() | sim_equity.keys()):
+        if not _close(db_equity.get(d), sim_equity.get(d)):
+            mismatches.append(f"equity {d}: db={db_equity.get(d)} sim={sim_equity.get(d)}")
+    return mismatches
+
+
+def load_simulation_inputs(conn: pymysql.Connection) -> tuple[dict[date, list[dict]], dict[int, pd.DataFrame], dict[int, dict]]:
+    """读取全品种行情并计算信号，返回 (signal_book, closes, pool)。"""
+    from trading.strategies.data_loader import load_all_varieties_data, load_close_series, load_variety_map
+    from trading.strategies.operations import get_pool_varieties
+    from trading.strategies.panel import compute_panel_signals, stack_variety_frames
+
+    variety_df = load_variety_map(conn)
+    names = {int(vid): str(name) for vid, name in zip(variety_df["id"], variety_df["name"])}
+    signal_frames = compute_panel_signals(stack_variety_frames(load_all_varieties_data(conn)))
+    closes = load_close_series(conn, list(names))
+    return build_signal_book(signal_frames, names), closes, get_pool_varieties(conn)
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def _run(conn: pymysql.Connection, args: argparse.Namespace) -> None:
+    signal_book, closes, pool = load_simulation_inputs(conn)
+    if not signal_book:
+        logger.info("没有可回放的信号")
+        return
+    start = args.start or min(signal_book)
+    end = args.end or max(signal_book)
+
+    initial_equity, initial_positions = INITIAL_CAPITAL, []
+    if args.check:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT record_date FROM trading_account_daily WHERE record_date BETWEEN %s AND %s "
+                "ORDER BY record_date",
+                (start, end),
+            )
+            dates = [r["record_date"] for r in cur.fetchall()]
+            cur.execute(
+                "SELECT equity FROM trading_account_daily WHERE record_date<%s "
+                "ORDER BY record_date DESC LIMIT 1",
+                (start,),
+            )
+            row = cur.fetchone()
+            if row:
+                initial_equity = float(row["equity"])
+            cur.execute(
+                "SELECT id, operation_id, open_signal_id, theory_cycle_id, variety_id, variety_name, sector, "
+                "direction, open_date, open_price, size_pct FROM trading_positions "
+                "WHERE open_date<%s AND (close_date IS NULL OR close_date>=%s)",
+                (start, start),
+            )
+            initial_positions = list(cur.fetchall())
+    else:
+        all_days = {d for s in closes.values() for d in s["trade_date"]}
+        dates = sorted(d for d in all_days if start <= d <= end)
+
+    t0 = time.perf_counter()
+    result = simulate(signal_book, closes, pool, dates, initial_equity, initial_positions)
+    elapsed = time.perf_counter() - t0
+
+    equity, trades, ops = result["equity"], result["trades"], result["operations"]
+    logger.info("回放 %s ~ %s：%d 天，耗时 %.3f 秒", start, end, len(equity), elapsed)
+    if not equity.empty:
+        logger.info("期末 equity=%.2f，成交 %d 笔", equity["equity"].iloc[-1], len(trades))
+    if not ops.empty:
+        reasons = ops.loc[ops["is_selected"] == 0, "reject_reason"].value_counts()
+        logger.info("落选原因：%s", ", ".join(f"{k}={v}" for k, v in reasons.items()) or "无")
+
+    if args.out:
+        out = Path(args.out)
+        out.mkdir(parents=True, exist_ok=True)
+        for name, df in result.items():
+            df.to_csv(out / f"{name}.csv", index=False)
+        logger.info("结果已写出到 %s", out)
+
+    if args.check:
+        mismatches = compare_with_database(conn, result, start, end)
+        for item in mismatches:
+            logger.warning("不一致: %s", item)
+        logger.info("比对完成，不一致项: %d", len(mismatches))
+        if mismatches:
+            sys.exit(1)
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description="内存组合模拟：按 daily_run 规则回放历史，不写库")
+    parser.add_argument("--start", type=_parse_date, default=None, help="起始日期，默认最早信号日")
+    parser.add_argument("--end", type=_parse_date, default=None, help="结束日期，默认最新信号日")
+    parser.add_argument("--check", action="store_true", help="按 trading_account_daily 的日期回放并与库中结果比对")
+    parser.add_argument("--out", default=None, help="输出目录，写出 equity.csv / trades.csv / operations.csv")
+    args = parser.parse_args()
+
+    from trading.strategies.db import get_connection
+
+    conn = get_connection()
+    try:
+        _run(conn, args)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+参数扫描。
+按网格组合 settings 中的 MAX_SLOTS / SIZE_PCT / LEVERAGE / MOMENTUM_LOOKBACK / BACKGROUND_WINDOW / TARGET_POOL，
+在进程池中并行运行内存组合模拟（simulator.simulate），每个组合的 CAGR、最大回撤、成交笔数逐行追加写入本地结果文件。
+行情与收盘价只在主进程装载一次，子进程以 fork 写时复制只读共享；信号只依赖 (MOMENTUM_LOOKBACK, BACKGROUND_WINDOW)，
+同一信号参数的组合排在一起分批派发，每个子进程对同一组信号参数只计算一次信号。
+
+网格文件为 JSON，键为上述常量名、值为候选列表，缺省的键取 settings 当前值，例如：
+    {"MAX_SLOTS": [2, 3, 4], "SIZE_PCT": [null], "LEVERAGE": [5, 10],
+     "MOMENTUM_LOOKBACK": [20, 30, 60], "TARGET_POOL": [["沪铜", "沪铝", "豆粕"], ["沪金", "PTA", "玉米"]]}
+SIZE_PCT 为 null 时取 1 / MAX_SLOTS；TARGET_POOL 每个候选是一组品种名，板块取 VARIETY_SECTORS。
+
+运行：python -m trading.strategies.sweep --grid grid.json [--out sweep_results.jsonl] [--workers N]
+      结果文件已存在时跳过其中已完成的组合，中断后可直接重跑续扫；每行记录回测区间，区间不同的结果文件拒绝续扫
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import numpy as np
+import pandas as pd
+import pymysql
+
+from trading.strategies.panel import compute_panel_signals
+from trading.strategies.settings import (
+    BACKGROUND_WINDOW,
+    DEFAULT_SECTOR,
+    INITIAL_CAPITAL,
+    LEVERAGE,
+    MAX_SLOTS,
+    MOMENTUM_LOOKBACK,
+    SECTOR_BY_VARIETY,
+    SIZE_PCT,
+    TARGET_VARIETIES,
+    VARIETY_SECTORS,
+)
+from trading.strategies.simulator import PriceBook, build_signal_book, simulate
+
+logger = logging.getLogger("sweep")
+
+SWEEP_KNOBS = ("MAX_SLOTS", "SIZE_PCT", "LEVERAGE", "MOMENTUM_LOOKBACK", "BACKGROUND_WINDOW", "TARGET_POOL")
+METRIC_COLUMNS = ("final_equity", "cagr", "max_drawdown", "trades")
+
+# 子进程内的只读行情与信号缓存；fork 时由主进程的对象直接继承
+_INPUTS: dict | None = None
+_SIGNAL_CACHE: dict[tuple[int, int], dict] = {}
+
+
+def default_point() -> dict:
+    return {
+        "MAX_SLOTS": MAX_SLOTS,
+        "SIZE_PCT": SIZE_PCT,
+        "LEVERAGE": LEVERAGE,
+        "MOMENTUM_LOOKBACK": MOMENTUM_LOOKBACK,
+        "BACKGROUND_WINDOW": BACKGROUND_WINDOW,
+        "TARGET_POOL": list(TARGET_VARIETIES),
+    }
+
+
+def expand_grid(spec: dict) -> list[dict]:
+    """展开网格为组合列表，按 (MOMENTUM_LOOKBACK, BACKGROUND_WINDOW) 排序，便于同一信号参数的组合共用信号。"""
+    unknown = set(spec) - set(SWEEP_KNOBS)
+    if unknown:
+        raise ValueError(f"不支持的扫描参数: {sorted(unknown)}")
+    base = default_point()
+    axes = [spec.get(k, [base[k]]) for k in SWEEP_KNOBS]
+    points = []
+    for values in itertools.product(*axes):
+        point = dict(zip(SWEEP_KNOBS, values))
+        if point["SIZE_PCT"] is None:
+            point["SIZE_PCT"] = 1 / point["MAX_SLOTS"]
+        point["TARGET_POOL"] = list(point["TARGET_POOL"])
+        points.append(point)
+    points.sort(key=lambda p: (p["MOMENTUM_LOOKBACK"], p["BACKGROUND_WINDOW"]))
+    return points
+
+
+def point_key(point: dict) -> str:
+    return json.dumps({k: point[k] for k in SWEEP_KNOBS}, ensure_ascii=False, sort_keys=True)
+
+
+def summarize(equity: pd.DataFrame, trades: pd.DataFrame, initial_equity: float = INITIAL_CAPITAL) -> dict:
+    """由资金曲线和成交明细计算 final_equity / cagr / max_drawdown / trades。"""
+    if equity.empty:
+        return {"final_equity": initial_equity, "cagr": None, "max_drawdown": 0.0, "trades": len(trades)}
+    values = equity["equity"].to_numpy(dtype=float)
+    final = float(values[-1])
+    years = (equity["record_date"].iloc[-1] - equity["record_date"].iloc[0]).days / 365.25
+    if years <= 0:
+        cagr = None
+    elif final <= 0:
+        cagr = -1.0
+    else:
+        cagr = (final / initial_equity) ** (1 / years) - 1
+    peak = np.maximum.accumulate(np.r_[initial_equity, values])
+    drawdown = 1 - np.r_[initial_equity, values] / peak
+    return {
+        "final_equity": final,
+        "cagr": cagr,
+        "max_drawdown": float(drawdown.max()),
+        "trades": len(trades),
+    }
+
+
+def load_sweep_inputs(conn: pymysql.Connection) -> dict:
+    """装载全品种强度面板与收盘价，返回扫描共享的只读输入。"""
+    from trading.strategies.data_loader import load_all_varieties_data, load_close_series, load_variety_map
+    from trading.strategies.panel import stack_variety_frames
+
+    variety_df = load_variety_map(conn)
+    names = {int(vid): str(name) for vid, name in zip(variety_df["id"], variety_df["name"])}
+    panel = stack_variety_frames(load_all_varieties_data(conn))
+    return build_sweep_inputs(panel, names, load_close_series(conn, list(names)))
+
+
+def build_sweep_inputs(panel: pd.DataFrame, names: dict[int, str], closes: dict[int, pd.DataFrame]) -> dict:
+    days = sorted({d for s in closes.values() for d in s["trade_date"]})
+    return {"panel": panel, "names": names, "prices": PriceBook(closes), "dates": days}
+
+
+def _pool_for(names: dict[int, str], pool_names: list[str]) -> dict[int, dict]:
+    ids = {name: vid for vid, name in names.items()}
+    return {
+        ids[name]: {
+            "variety_name": name,
+            "sector": SECTOR_BY_VARIETY.get(name) or VARIETY_SECTORS.get(name, DEFAULT_SECTOR),
+        }
+        for name in pool_names if name in ids
+    }
+
+
+def _init_worker(inputs: dict) -> None:
+    global _INPUTS
+    _INPUTS = inputs
+    _SIGNAL_CACHE.clear()
+
+
+def _signal_book(momentum_lookback: int, background_window: int) -> dict:
+    key = (momentum_lookback, background_window)
+    book = _SIGNAL_CACHE.get(key)
+    if book is None:
+        # 组合按信号参数排序派发，只保留最近一组即可
+        _SIGNAL_CACHE.clear()
+        frames = compute_panel_signals(_INPUTS["panel"], momentum_lookback, background_window)
+        book = _SIGNAL_CACHE[key] = build_signal_book(frames, _INPUTS["names"])
+    return book
+
+
+def _run_point(point: dict) -> dict:
+    book = _signal_book(point["MOMENTUM_LOOKBACK"], point["BACKGROUND_WINDOW"])
+    result = simulate(
+        book,
+        _INPUTS["prices"],
+        _pool_for(_INPUTS["names"], point["TARGET_POOL"]),
+        _INPUTS["dates"],
+        max_slots=point["MAX_SLOTS"],
+        size_pct=point["SIZE_PCT"],
+        leverage=point["LEVERAGE"],
+    )
+    return {**point, **summarize(result["equity"], result["trades"])}
+
+
+def _run_batch(points: list[dict]) -> list[dict]:
+    return [_run_point(p) for p in points]
+
+
+def _batches(points: list[dict], batch_size: int) -> list[list[dict]]:
+    """按信号参数分组后切块，同一块内共用一组信号。"""
+    batches = []
+    for _, group in itertools.groupby(points, key=lambda p: (p["MOMENTUM_LOOKBACK"], p["BACKGROUND_WINDOW"])):
+        group = list(group)
+        batches.extend(group[i:i + batch_size] for i in range(0, len(group), batch_size))
+    return batches
+
+
+def _json_line(row: dict) -> str:
+    clean = {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in row.items()}
+    return json.dumps(clean, ensure_ascii=False)
+
+
+def _done_keys(out: Path, span: dict[str, str]) -> set[str]:
+    """已写入 out 的组合键；已有结果的回测区间与本次不同时抛 ValueError，避免同一文件混入不同区间的结果。"""
+    if not out.exists():
+        return set()
+    done = set()
+    with out.open(encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            if (row.get("start"), row.get("end")) != (span["start"], span["end"]):
+                raise ValueError(
+                    f"{out} 中已有区间 {row.get('start')} ~ {row.get('end')} 的结果，"
+                    f"与本次 {span['start']} ~ {span['end']} 不同，请换用新的结果文件"
+                )
+            done.add(point_key(row))
+    return done
+
+
+def run_sweep(
+    inputs: dict,
+    points: list[dict],
+    out: Path,
+    workers: int = 1,
+    start: date | None = None,
+    end: date | None = None,
+    batch_size: int = 8,
+) -> int:
+    """并行运行 points 中尚未写入 out 的组合，结果逐行追加到 out（JSON Lines），返回本次新写入的行数。
+
+    每行带实际回测区间 start / end；out 中已有其他区间的结果时拒绝续扫。
+    """
+    inputs = {**inputs, "dates": [d for d in inputs["dates"] if (start is None or d >= start) and (end is None or d <= end)]}
+    if not inputs["dates"]:
+        raise ValueError(f"{start} ~ {end} 内没有交易日")
+    span = {"start": inputs["dates"][0].isoformat(), "end": inputs["dates"][-1].isoformat()}
+    done = _done_keys(out, span)
+    todo = [p for p in points if point_key(p) not in done]
+    logger.info("共 %d 个组合，已完成 %d 个，本次运行 %d 个", len(points), len(points) - len(todo), len(todo))
+    if not todo:
+        return 0
+
+    batches = _batches(todo, batch_size)
+    written = 0
+    t0 = time.perf_counter()
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with out.open("a", encoding="utf-8") as f:
+
+        def _write(rows: list[dict]) -> None:
+            nonlocal written
+            for row in rows:
+                f.write(_json_line({**row, **span}) + "\n")
+            f.flush()
+            written += len(rows)
+            logger.info("进度 %d/%d，耗时 %.1f 秒", written, len(todo), time.perf_counter() - t0)
+
+        if workers <= 1:
+            _init_worker(inputs)
+            for batch in batches:
+                _write(_run_batch(batch))
+            return written
+
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        # fork 时 initargs 不经 pickle，子进程直接共享主进程已装载的行情页
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(batches)),
+            mp_context=multiprocessing.get_context(method),
+            initializer=_init_worker,
+            initargs=(inputs,),
+        ) as pool:
+            futures = [pool.submit(_run_batch, batch) for batch in batches]
+            for fut in as_completed(futures):
+                _write(fut.result())
+    return written
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description="settings 参数网格扫描：并行内存模拟，结果流式写入本地文件")
+    parser.add_argument("--grid", required=True, help="网格 JSON 文件")
+    parser.add_argument("--out", default="sweep_results.jsonl", help="结果文件（JSON Lines），已存在时续扫")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="进程数，默认 CPU 核数")
+    parser.add_argument("--batch-size", type=int, default=8, help="每个任务包含的组合数")
+    parser.add_argument("--start", type=_parse_date, default=None, help="起始日期，默认最早收盘价日期")
+    parser.add_argument("--end", type=_parse_date, default=None, help="结束日期，默认最新收盘价日期")
+    args = parser.parse_args()
+
+    with open(args.grid, encoding="utf-8") as f:
+        points = expand_grid(json.load(f))
+
+    from trading.strategies.db import get_connection
+
+    conn = get_connection()
+    try:
+        inputs = load_sweep_inputs(conn)
+    finally:
+        conn.close()
+    run_sweep(inputs, points, Path(args.out), args.workers, args.start, args.end, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import unittest
+from datetime import date
+
+from trading.strategies.account import execute_close_signals, execute_open_operations
+from trading.strategies.settings import SIZE_PCT
+
+DAY = date(2026, 4, 24)
+
+
+class AccountCursor:
+    def __init__(self, conn: AccountConnection) -> None:
+        self.conn = conn
+        self._rows: list[dict] = []
+
+    def __enter__(self) -> AccountCursor:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def execute(self, sql: str, args=()) -> None:
+        sql = " ".join(sql.split())
+        self.conn.statements.append(sql)
+        if sql.startswith("SELECT id, variety_id, direction, signal_type, cycle_id FROM trading_signals"):
+            self._rows = list(self.conn.close_signals)
+        elif sql.startswith("SELECT id, variety_id, direction, open_price, theory_cycle_id"):
+            self._rows = [p for p in self.conn.positions if p["status"] == "open"]
+        elif sql.startswith("SELECT variety_id, close_price FROM fut_daily_close"):
+            vids = set(args[1:])
+            self._rows = [{"variety_id": v, "close_price": c} for v, c in self.conn.closes.items() if v in vids]
+        elif sql.startswith("SELECT id, signal_id, variety_id"):
+            self._rows = list(self.conn.operations)
+        elif sql.startswith("SELECT id, variety_id FROM trading_positions"):
+            vids = set(args[1:])
+            self._rows = [
+                {"id": p["id"], "variety_id": p["variety_id"]}
+                for p in self.conn.positions
+                if p["status"] == "open" and p["open_date"] == args[0] and p["variety_id"] in vids
+            ]
+        else:
+            raise AssertionError(f"unexpected SQL: {sql}")
+
+    def executemany(self, sql: str, seq) -> None:
+        sql = " ".join(sql.split())
+        self.conn.statements.append(sql)
+        for args in seq:
+            if sql.startswith("UPDATE trading_positions SET status='closed'"):
+                pos = self.conn.position(args[4])
+                pos.update(status="closed", close_date=args[0], close_price=args[1], pnl_pct=args[2])
+            elif sql.startswith("UPDATE trading_positions SET operation_id"):
+                self.conn.position(args[4]).update(operation_id=args[0], theory_cycle_id=args[3])
+            elif sql.startswith("INSERT INTO trading_positions"):
+                self.conn.positions.append({
+                    "id": len(self.conn.positions) + 100, "operation_id": args[0], "variety_id": args[4],
+                    "direction": args[7], "open_date": args[8], "open_price": args[9], "size_pct": args[10],
+                    "status": "open", "theory_cycle_id": args[3],
+                })
+            else:
+                raise AssertionError(f"unexpected SQL: {sql}")
+
+    def fetchall(self) -> list[dict]:
+        return self._rows
+
+
+class AccountConnection:
+    def __init__(self) -> None:
+        self.statements: list[str] = []
+        self.commits = 0
+        self.close_signals: list[dict] = []
+        self.positions: list[dict] = []
+        self.operations: list[dict] = []
+        self.closes: dict[int, float] = {}
+
+    def cursor(self) -> AccountCursor:
+        return AccountCursor(self)
+
+    def commit(self) -> None:
+        self.commits += 1
+
+    def rollback(self) -> None:
+        return None
+
+    def position(self, pos_id: int) -> dict:
+        return next(p for p in self.positions if p["id"] == pos_id)
+
+
+def _op(op_id: int, vid: int, direction: str) -> dict:
+    return {
+        "id": op_id, "signal_id": op_id * 10, "variety_id": vid, "variety_name": f"v{vid}",
+        "sector": "s", "signal_type": f"A_OPEN_{direction}", "direction": direction,
+        "signal_cycle_id": f"{vid}-{direction}-{DAY.isoformat()}",
+    }
+
+
+class AccountBulkTest(unittest.TestCase):
+    def test_close_signals_use_one_price_query_and_one_batch(self) -> None:
+        conn = AccountConnection()
+        for i, vid in enumerate(range(1, 9), start=1):
+            conn.positions.append({
+                "id": i, "variety_id": vid, "direction": "LONG", "open_price": 100.0,
+                "theory_cycle_id": f"c{vid}", "status": "open", "open_date": date(2026, 4, 1),
+            })
+            if vid != 8:
+                conn.close_signals.append({"id": 50 + vid, "variety_id": vid, "direction": "LONG",
+                                           "signal_type": "A_CLOSE_LONG", "cycle_id": f"c{vid}"})
+            if vid != 7:
+                conn.closes[vid] = 100.0 + vid
+
+        closed = execute_close_signals(conn, DAY)
+
+        self.assertEqual(closed, {1, 2, 3, 4, 5, 6})
+        self.assertEqual(conn.position(3)["pnl_pct"], 0.03)
+        self.assertEqual(conn.position(7)["status"], "open")
+        self.assertEqual(len(conn.statements), 4)
+        self.assertEqual(conn.commits, 1)
+
+    def test_open_operations_prefetch_and_single_transaction(self) -> None:
+        conn = AccountConnection()
+        conn.positions.append({"id": 1, "variety_id": 2, "direction": "SHORT", "open_price": 50.0,
+                               "open_date": DAY, "status": "open", "theory_cycle_id": None})
+        conn.operations = [_op(11, 1, "LONG"), _op(12, 2, "SHORT"), _op(13, 3, "LONG"), _op(14, 4, "LONG")]
+        conn.closes = {1: 10.0, 2: 20.0, 4: 40.0}
+
+        execute_open_operations(conn, DAY, closed_today={4})
+
+        opened = {p["variety_id"]: p for p in conn.positions if p["id"] >= 100}
+        self.assertEqual(sorted(opened), [1])
+        self.assertEqual((opened[1]["open_price"], opened[1]["size_pct"]), (10.0, SIZE_PCT))
+        self.assertEqual(conn.position(1)["operation_id"], 12)
+        self.assertEqual(len(conn.statements), 5)
+        self.assertEqual(conn.commits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
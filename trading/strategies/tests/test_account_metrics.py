@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import json
+import math
+import unittest
+from datetime import date, timedelta
+
+import numpy as np
+
+from trading.strategies.account import update_account_daily
+from trading.strategies.account_metrics import METRIC_COLUMNS, next_metrics, rebuild_account_metrics
+from trading.strategies.settings import INITIAL_CAPITAL
+from trading.strategies.tests.test_simulator import PipelineConnection, PipelineCursor, _market, run_pipeline
+
+
+class RebuildCursor(PipelineCursor):
+    """在 PipelineCursor 基础上补充 rebuild_account_metrics 的 SQL。"""
+
+    def execute(self, sql: str, args=()) -> None:
+        sql = " ".join(sql.split())
+        c = self.conn
+        if sql.startswith("SELECT record_date, equity, daily_pnl FROM trading_account_daily"):
+            lo = args[0] if "record_date>=%s" in sql else None
+            hi = args[-1] if "record_date<=%s" in sql else None
+            self._rows = [
+                {"record_date": d, **c.account[d]} for d in sorted(c.account)
+                if (lo is None or d >= lo) and (hi is None or d <= hi)
+            ]
+        elif sql.startswith("SELECT MAX(record_date) AS last_date FROM trading_account_metrics"):
+            self._rows = [{"last_date": max(c.metrics, default=None)}]
+        elif sql.startswith("SELECT variety_id, sector, direction, open_date"):
+            self._rows = [
+                p for p in c.positions
+                if p["open_date"] <= args[0] and (p["close_date"] is None or p["close_date"] >= args[1])
+            ]
+        elif sql.startswith("SELECT variety_id, trade_date, close_price FROM fut_daily_close"):
+            self._rows = [
+                {"variety_id": v, "trade_date": d, "close_price": px}
+                for v in sorted(set(args[:-1])) for d, px in sorted(c.closes.get(v, {}).items()) if d <= args[-1]
+            ]
+        elif sql.startswith("DELETE FROM trading_account_metrics"):
+            c.metrics = {d: r for d, r in c.metrics.items() if not args[0] <= d <= args[1]}
+        else:
+            super().execute(sql, args)
+
+    def executemany(self, sql: str, seq) -> None:
+        if not sql.startswith("INSERT INTO trading_account_metrics"):
+            return super().executemany(sql, seq)
+        for args in seq:
+            self.execute(sql, args)
+
+
+class RebuildConnection(PipelineConnection):
+    def cursor(self) -> RebuildCursor:
+        return RebuildCursor(self)
+
+
+class NextMetricsTest(unittest.TestCase):
+    def test_running_state_matches_full_curve(self) -> None:
+        rng = np.random.default_rng(3)
+        equity = [INITIAL_CAPITAL]
+        row = None
+        trades: list[float] = []
+        sectors: dict[str, float] = {}
+        for i in range(200):
+            pnl = float(rng.normal(0, 600))
+            closed = [float(x) for x in rng.normal(0.002, 0.03, int(rng.integers(0, 3)))]
+            split = {"黑色系": pnl * 0.25, "农产品": pnl * 0.75} if i % 3 else {"有色金属": pnl}
+            row = next_metrics(row, date(2025, 1, 1) + timedelta(days=i), equity[-1], equity[-1] + pnl, pnl, closed, split)
+            equity.append(equity[-1] + pnl)
+            trades.extend(closed)
+            for k, v in split.items():
+                sectors[k] = sectors.get(k, 0.0) + v
+
+        curve = np.array(equity)
+        rets = np.diff(curve) / curve[:-1]
+        peak = np.maximum.accumulate(curve)
+        self.assertEqual(row["trading_days"], 200)
+        self.assertAlmostEqual(row["peak_equity"], peak[-1])
+        self.assertAlmostEqual(row["drawdown"], 1 - curve[-1] / peak[-1])
+        self.assertAlmostEqual(row["max_drawdown"], float((1 - curve / peak).max()))
+        self.assertAlmostEqual(row["sharpe"], rets.mean() / rets.std(ddof=1) * math.sqrt(252))
+        self.assertEqual(row["closed_trades"], len(trades))
+        self.assertAlmostEqual(row["win_rate"], sum(t > 0 for t in trades) / len(trades))
+        got = json.loads(row["sector_pnl_json"])
+        self.assertEqual(set(got), set(sectors))
+        for k, v in sectors.items():
+            self.assertAlmostEqual(got[k], v, places=6)
+
+
+class AccountMetricsPipelineTest(unittest.TestCase):
+    def test_incremental_rows_match_bulk_rebuild(self) -> None:
+        frames, names, pool, closes = _market(1)
+        conn = RebuildConnection()
+        dates = run_pipeline(conn, frames, names, pool, closes)
+        incremental = {d: dict(r) for d, r in conn.metrics.items()}
+        self.assertEqual(sorted(incremental), dates)
+
+        last = incremental[dates[-1]]
+        closed = [p for p in conn.positions if p["status"] == "closed"]
+        self.assertEqual(last["closed_trades"], len(closed))
+        self.assertGreater(last["closed_trades"], 5)
+        total_pnl = sum(conn.account[d]["daily_pnl"] for d in dates)
+        self.assertAlmostEqual(sum(json.loads(last["sector_pnl_json"]).values()), total_pnl, places=6)
+        self.assertTrue(set(json.loads(last["sector_pnl_json"])) <= {p["sector"] for p in pool.values()})
+
+        conn.metrics[dates[10]]["max_drawdown"] = 9.0
+        self.assertEqual(rebuild_account_metrics(conn), len(dates))
+        self._assert_metrics_equal(conn.metrics, incremental, dates)
+
+    def test_partial_rebuild_extends_through_latest_metrics(self) -> None:
+        frames, names, pool, closes = _market(1)
+        conn = RebuildConnection()
+        dates = run_pipeline(conn, frames, names, pool, closes)
+        incremental = {d: dict(r) for d, r in conn.metrics.items()}
+
+        # 修订区间内的一天后只重建到 dates[10]，之后的累计行也必须随之刷新
+        conn.metrics[dates[5]]["max_drawdown"] = 9.0
+        conn.metrics[dates[-1]]["max_drawdown"] = 9.0
+        self.assertEqual(rebuild_account_metrics(conn, start=dates[3], end=dates[10]), len(dates) - 3)
+        self._assert_metrics_equal(conn.metrics, incremental, dates)
+
+    def test_first_run_without_metrics_bootstraps_from_history(self) -> None:
+        frames, names, pool, closes = _market(1)
+        conn = RebuildConnection()
+        dates = run_pipeline(conn, frames, names, pool, closes)
+        incremental = {d: dict(r) for d, r in conn.metrics.items()}
+
+        # 指标表上线前已有资金曲线：最后一天的指标不能从零起算
+        conn.metrics = {}
+        with self.assertLogs("trading.strategies.account", "WARNING"):
+            update_account_daily(conn, dates[-1])
+
+        self.assertEqual(conn.metrics[dates[-1]]["trading_days"], len(dates))
+        self._assert_metrics_equal(conn.metrics, incremental, dates)
+
+    def _assert_metrics_equal(self, got: dict, expected: dict, dates: list[date]) -> None:
+        self.assertEqual(sorted(got), dates)
+        for d in dates:
+            for col in METRIC_COLUMNS:
+                a, b = got[d][col], expected[d][col]
+                if col == "sector_pnl_json":
+                    a, b = json.loads(a), json.loads(b)
+                    self.assertEqual(set(a), set(b))
+                    for k in a:
+                        self.assertAlmostEqual(a[k], b[k], places=6)
+                elif isinstance(a, float):
+                    self.assertAlmostEqual(a, b, places=9)
+                else:
+                    self.assertEqual(a, b)
+
+
+if __name__ == "__main__":
+    unittest.main()
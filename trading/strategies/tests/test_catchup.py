@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import os
+import unittest
+from unittest import mock
+
+from trading.strategies.account_metrics import METRIC_COLUMNS
+from trading.strategies.catchup import catch_up_account, run_catchup
+from trading.strategies.tests.test_account_metrics import RebuildConnection, RebuildCursor
+from trading.strategies.tests.test_shadow import _production
+from trading.strategies.tests.test_simulator import _market, insert_signals, run_pipeline
+
+_POSITION_KEYS = (
+    "operation_id", "open_operation_id", "open_signal_id", "close_signal_id", "theory_cycle_id",
+    "variety_id", "variety_name", "sector", "direction", "open_date", "open_price", "size_pct",
+    "status", "close_date", "close_price", "pnl_pct",
+)
+
+
+class CatchupCursor(RebuildCursor):
+    """在 RebuildCursor 基础上补充 catch_up_account 的 SQL。"""
+
+    def execute(self, sql: str, args=()) -> None:
+        sql = " ".join(sql.split())
+        c = self.conn
+        if sql.startswith("SELECT MAX(record_date) AS last_date FROM trading_account_daily"):
+            self._rows = [{"last_date": max(c.account, default=None)}]
+        elif sql.startswith("SELECT id, signal_date, variety_id, variety_name, signal_type, signal_role"):
+            self._rows = [s for s in c.signals if args[0] <= s["signal_date"] <= args[1]]
+        elif sql.startswith("SELECT id, operation_id, open_signal_id, theory_cycle_id"):
+            self._rows = [
+                p for p in c.positions
+                if p["open_date"] < args[0] and (p["status"] == "open" or p["close_date"] >= args[1])
+            ]
+        elif sql.startswith("SELECT id, signal_date, variety_id, signal_type FROM trading_operations"):
+            self._rows = [o for o in c.operations if args[0] <= o["signal_date"] <= args[1]]
+        elif sql.startswith("DELETE FROM trading_positions WHERE open_date BETWEEN"):
+            c.positions = [p for p in c.positions if not args[0] <= p["open_date"] <= args[1]]
+        elif sql.startswith("UPDATE trading_positions SET status='open'"):
+            for p in c.positions:
+                if p["close_date"] is not None and args[0] <= p["close_date"] <= args[1]:
+                    p.update(status="open", close_date=None, close_price=None, pnl_pct=None, close_signal_id=None)
+        elif sql.startswith("DELETE FROM trading_account_daily WHERE record_date BETWEEN"):
+            c.account = {d: r for d, r in c.account.items() if not args[0] <= d <= args[1]}
+        elif sql.startswith("DELETE FROM trading_run_ledger"):
+            pass
+        else:
+            super().execute(sql, args)
+
+    def executemany(self, sql: str, seq) -> None:
+        sql = " ".join(sql.split())
+        if sql.startswith("INSERT INTO trading_positions (operation_id, open_operation_id, open_signal_id, close_signal_id"):
+            for args in seq:
+                self.conn.positions.append({"id": self.conn.next_id(), **dict(zip(_POSITION_KEYS, args))})
+        elif sql.startswith("INSERT INTO trading_account_daily"):
+            for args in seq:
+                self.execute(sql, args)
+        else:
+            super().executemany(sql, seq)
+
+
+class CatchupConnection(RebuildConnection):
+    def cursor(self) -> CatchupCursor:
+        return CatchupCursor(self)
+
+
+def _snapshot(conn: CatchupConnection) -> dict:
+    """按业务键整理各表，id 引用换成被引用行的业务键，使两个库可以直接比较。"""
+    sig_key = {s["id"]: (s["signal_date"], s["variety_id"], s["signal_type"]) for s in conn.signals}
+    op_key = {o["id"]: (o["signal_date"], o["variety_id"], o["signal_type"]) for o in conn.operations}
+    operations = {
+        op_key[o["id"]]: {**{k: v for k, v in o.items() if k != "id"}, "signal_id": sig_key[o["signal_id"]]}
+        for o in conn.operations
+    }
+    positions = {}
+    for p in conn.positions:
+        row = {k: p.get(k) for k in _POSITION_KEYS}
+        row["operation_id"] = op_key.get(row["operation_id"])
+        row["open_operation_id"] = op_key.get(row["open_operation_id"])
+        row["open_signal_id"] = sig_key.get(row["open_signal_id"])
+        row["close_signal_id"] = sig_key.get(row["close_signal_id"])
+        positions[(p["variety_id"], p["open_date"])] = row
+    return {
+        "operations": operations,
+        "positions": positions,
+        "account": dict(conn.account),
+        "metrics": {d: {c: r[c] for c in METRIC_COLUMNS} for d, r in conn.metrics.items()},
+    }
+
+
+class CatchupTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.frames, self.names, self.pool, self.closes = _market(2)
+        self.expected_conn = CatchupConnection()
+        self.dates = run_pipeline(self.expected_conn, self.frames, self.names, self.pool, self.closes)
+        self.expected = _snapshot(self.expected_conn)
+
+    def _assert_same(self, conn: CatchupConnection) -> None:
+        got = _snapshot(conn)
+        for table in ("operations", "positions", "account", "metrics"):
+            self.assertEqual(sorted(got[table]), sorted(self.expected[table]), table)
+            for key, row in self.expected[table].items():
+                self.assertEqual(got[table][key], row, f"{table} {key}")
+
+    def test_catch_up_matches_sequential_runs(self) -> None:
+        conn = CatchupConnection()
+        run_pipeline(conn, self.frames, self.names, self.pool, self.closes, self.dates[:120])
+        insert_signals(conn, self.frames, self.names, self.dates[120:])
+        summary = catch_up_account(conn, self.dates[120:])
+
+        self.assertEqual(summary["days"], len(self.dates) - 120)
+        self.assertGreater(summary["positions"], 3)
+        self._assert_same(conn)
+
+    def test_catch_up_replaces_partial_runs(self) -> None:
+        conn = CatchupConnection()
+        run_pipeline(conn, self.frames, self.names, self.pool, self.closes, self.dates[:150])
+        # 区间之后已有结果时拒绝执行
+        with self.assertRaises(RuntimeError):
+            catch_up_account(conn, self.dates[100:140])
+
+        insert_signals(conn, self.frames, self.names, self.dates[150:])
+        summary = catch_up_account(conn, self.dates[100:])
+        self.assertGreater(summary["closed"] + summary["positions"], 3)
+        self._assert_same(conn)
+
+
+class RunCatchupTransactionTest(unittest.TestCase):
+    """在 SQLite 替身库上验证 run_catchup 的事务边界：被拒绝或中途失败时库内容不变。"""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        with mock.patch.dict(os.environ, {"TRADING_MARKET_STORE": "off"}):
+            cls.conn, cls.dates = _production(5, 50)
+
+    def setUp(self) -> None:
+        patcher = mock.patch.dict(os.environ, {"TRADING_MARKET_STORE": "off"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.before = list(self.conn.db.iterdump())
+
+    def test_refused_run_leaves_db_unchanged(self) -> None:
+        with self.assertRaises(RuntimeError):
+            run_catchup(self.conn, self.dates[30], self.dates[40])
+        self.assertEqual(list(self.conn.db.iterdump()), self.before)
+
+    def test_failed_accounting_rolls_back_signals(self) -> None:
+        with mock.patch("trading.strategies.simulator.simulate_rows", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                run_catchup(self.conn, self.dates[30], self.dates[-1])
+        self.assertEqual(list(self.conn.db.iterdump()), self.before)
+
+        # 不注入失败时整段重建成功，写入的信号与原逐日运行一致
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) AS n FROM trading_signals WHERE signal_date>=%s", (self.dates[30],))
+            signals = cur.fetchone()["n"]
+        summary = run_catchup(self.conn, self.dates[30], self.dates[-1])
+        self.assertEqual(summary["signals"], signals)
+        self.assertEqual(summary["days"], 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import re
+import unittest
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pymysql
+
+from trading.strategies.data_loader import check_data_completeness, load_all_varieties_data, load_variety_data
+from trading.strategies.tests.test_signal_state_machine import _random_strength_frame
+
+
+class MarketDataCursor:
+    """按 SQL 形态返回 fut_* 假数据；SSCursor 模式返回元组并只支持 fetchmany。"""
+
+    def __init__(self, conn: MarketDataConnection, streaming: bool) -> None:
+        self.conn = conn
+        self.streaming = streaming
+        self._rows: list = []
+
+    def __enter__(self) -> MarketDataCursor:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def execute(self, sql: str, args=None) -> None:
+        sql = " ".join(sql.split())
+        self.conn.queries.append(sql)
+        if sql.startswith("SELECT id, name FROM fut_variety"):
+            self._rows = [{"id": vid, "name": f"v{vid}"} for vid in sorted(self.conn.strength)]
+        elif "FROM fut_strength WHERE variety_id" in sql:
+            self._rows = [dict(zip(("trade_date", "main_force", "retail"), r)) for r in self.conn.strength[args[0]]]
+        elif "FROM fut_daily_close WHERE variety_id" in sql:
+            self._rows = [dict(zip(("trade_date", "close"), r)) for r in self.conn.close[args[0]]]
+        elif "INNER JOIN fut_daily_close" in sql:
+            assert self.streaming and re.search(r"IN \(", sql)
+            rows = []
+            for vid in sorted(args):
+                closes = dict(self.conn.close[vid])
+                rows.extend((vid, d, m, r, closes[d]) for d, m, r in self.conn.strength[vid] if d in closes)
+            self._rows = rows
+
+    def fetchall(self) -> list:
+        assert not self.streaming
+        return self._rows
+
+    def fetchmany(self, size: int) -> list:
+        chunk, self._rows = self._rows[:size], self._rows[size:]
+        return chunk
+
+
+class MarketDataConnection:
+    def __init__(self, strength: dict[int, list[tuple]], close: dict[int, list[tuple]]) -> None:
+        self.strength = strength
+        self.close = close
+        self.queries: list[str] = []
+
+    def cursor(self, cursor_class=None) -> MarketDataCursor:
+        return MarketDataCursor(self, cursor_class is pymysql.cursors.SSCursor)
+
+
+class BulkLoaderTest(unittest.TestCase):
+    def test_bulk_loader_matches_per_variety_loader(self) -> None:
+        rng = np.random.default_rng(11)
+        strength: dict[int, list[tuple]] = {}
+        close: dict[int, list[tuple]] = {}
+        for vid in range(1, 8):
+            df = _random_strength_frame(rng, int(rng.integers(1, 200)))
+            dates = df["trade_date"].dt.date.tolist()
+            strength[vid] = list(zip(dates, df["main_force"].tolist(), df["retail"].tolist()))
+            # 收盘价缺几天、含一个空值，验证 INNER JOIN + dropna 口径
+            close[vid] = [(d, c) for d, c in zip(dates, df["close"].tolist()) if rng.random() > 0.1]
+            if close[vid]:
+                close[vid][0] = (close[vid][0][0], None)
+        close[7] = []
+
+        conn = MarketDataConnection(strength, close)
+        bulk = load_all_varieties_data(conn, use_store=False)
+
+        self.assertEqual(len(conn.queries), 2)
+        expected = {vid: load_variety_data(conn, vid) for vid in strength}
+        self.assertEqual(sorted(bulk), sorted(vid for vid, df in expected.items() if not df.empty))
+        for vid, df in bulk.items():
+            with self.subTest(variety_id=vid):
+                pd.testing.assert_frame_equal(df, expected[vid])
+
+
+class ReportConnection:
+    """返回预置的完整性聚合查询结果，并记录查询次数。"""
+
+    def __init__(self, rows: list[dict]) -> None:
+        self.rows = rows
+        self.queries = 0
+
+    def cursor(self) -> ReportConnection:
+        return self
+
+    def __enter__(self) -> ReportConnection:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def execute(self, sql: str, args=None) -> None:
+        self.queries += 1
+        assert "fut_strength" in sql and "fut_daily_close" in sql and args == ("2026-04-24",) * 4
+
+    def fetchall(self) -> list[dict]:
+        return self.rows
+
+
+def _report_row(vid: int, name: str, has_strength: int, has_close: int) -> dict:
+    day, prev = date(2026, 4, 24), date(2026, 4, 23)
+    return {
+        "variety_id": vid,
+        "name": name,
+        "has_strength": has_strength,
+        "strength_latest": day if has_strength else prev,
+        "has_close": has_close,
+        "close_latest": day if has_close else prev,
+    }
+
+
+class CompletenessCheckTest(unittest.TestCase):
+    def test_missing_close_in_pool_fails_with_single_query(self) -> None:
+        conn = ReportConnection([
+            _report_row(1, "沪铜", 1, 1),
+            _report_row(2, "沪金", 1, 0),
+            _report_row(3, "苹果", 0, 0),
+        ])
+        ok, msg = check_data_completeness(conn, "2026-04-24")
+        self.assertFalse(ok)
+        self.assertIn("沪金(收盘价", msg)
+        self.assertIn("2026-04-23", msg)
+        self.assertNotIn("苹果", msg)
+        self.assertEqual(conn.queries, 1)
+
+    def test_non_pool_gaps_do_not_fail(self) -> None:
+        conn = ReportConnection([_report_row(1, "沪铜", 1, 1), _report_row(3, "苹果", 0, 1)])
+        ok, msg = check_data_completeness(conn, "2026-04-24")
+        self.assertTrue(ok)
+        self.assertIn("强度 1/2、收盘价 2/2", msg)
+
+
+if __name__ == "__main__":
+    unittest.main()
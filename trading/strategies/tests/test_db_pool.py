@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import unittest
+from unittest import mock
+
+import pymysql
+
+from trading.strategies import db
+from trading.strategies.db import InstrumentedConnection, QueryStats, close_pool, pooled_connection
+
+
+class FakeCursor:
+    def __init__(self) -> None:
+        self.closed = False
+
+    def __enter__(self) -> FakeCursor:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.closed = True
+
+    def execute(self, sql, args=None) -> int:
+        return 1
+
+    def executemany(self, sql, args) -> int:
+        return len(args)
+
+    def fetchall(self) -> list:
+        return [{"x": 1}]
+
+
+class FakeConnection:
+    def __init__(self) -> None:
+        self.open = True
+        self.pings = 0
+        self.rollbacks = 0
+        self.broken = False
+
+    def cursor(self, *args) -> FakeCursor:
+        return FakeCursor()
+
+    def ping(self, reconnect: bool = False) -> None:
+        self.pings += 1
+
+    def rollback(self) -> None:
+        if self.broken:
+            raise pymysql.err.OperationalError(2013, "Lost connection")
+        self.rollbacks += 1
+
+    def commit(self) -> None:
+        return None
+
+    def close(self) -> None:
+        self.open = False
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def tearDown(self) -> None:
+        close_pool()
+
+    def test_connection_is_reused_and_broken_one_dropped(self) -> None:
+        created: list[FakeConnection] = []
+
+        def _new() -> FakeConnection:
+            created.append(FakeConnection())
+            return created[-1]
+
+        with mock.patch.object(db, "get_connection", side_effect=_new):
+            with pooled_connection() as first:
+                pass
+            with pooled_connection() as second:
+                second.broken = True
+            with pooled_connection() as third:
+                pass
+
+        self.assertIs(first, second)
+        self.assertEqual(first.pings, 1)
+        self.assertIsNot(third, first)
+        self.assertEqual(len(created), 2)
+
+
+class QueryStatsTest(unittest.TestCase):
+    def test_statements_grouped_by_step_and_in_lists_collapsed(self) -> None:
+        stats = QueryStats()
+        conn = InstrumentedConnection(FakeConnection(), stats)
+        with stats.step("Step 1"):
+            for n in (1, 3, 5):
+                with conn.cursor() as cur:
+                    cur.execute(f"SELECT * FROM t WHERE id IN ({','.join(['%s'] * n)})", tuple(range(n)))
+                    self.assertEqual(cur.fetchall(), [{"x": 1}])
+        with stats.step("Step 2"):
+            with conn.cursor() as cur:
+                cur.executemany("INSERT INTO t VALUES (%s)", [(1,), (2,)])
+            conn.commit()
+
+        self.assertEqual(dict(stats.steps["Step 1"]).keys(), {"SELECT * FROM t WHERE id IN (...)"})
+        self.assertEqual(stats.steps["Step 1"]["SELECT * FROM t WHERE id IN (...)"][0], 3)
+        self.assertEqual({k: v[0] for k, v in stats.steps["Step 2"].items()},
+                         {"INSERT INTO t VALUES (%s)": 1, "COMMIT": 1})
+        self.assertTrue(stats.summary()[-1].startswith("合计: 5 条 SQL"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import unittest
+from datetime import date, timedelta
+
+import numpy as np
+
+from trading.strategies.account import update_account_daily
+from trading.strategies.account_metrics import METRIC_COLUMNS
+from trading.strategies.equity_rebuild import rebuild_account_daily
+from trading.strategies.settings import INITIAL_CAPITAL
+
+
+class LedgerCursor:
+    def __init__(self, conn: LedgerConnection) -> None:
+        self.conn = conn
+        self._rows: list[dict] = []
+
+    def __enter__(self) -> LedgerCursor:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def execute(self, sql: str, args=()) -> None:
+        sql = " ".join(sql.split())
+        self.conn.statements.append(sql)
+        c = self.conn
+        if sql.startswith("SELECT equity FROM trading_account_daily"):
+            before = [d for d in c.account if d < args[0]]
+            self._rows = [{"equity": c.account[max(before)]["equity"]}] if before else []
+        elif sql.startswith("SELECT variety_id, direction, open_price, open_date, size_pct, sector FROM trading_positions"):
+            # 逐日路径：status 按 as_of 当天的视角还原
+            d = c.as_of
+            self._rows = [p for p in c.positions if p["open_date"] <= d and (p["close_date"] is None or p["close_date"] > d)]
+        elif sql.startswith("SELECT variety_id, direction, open_price, open_date, close_price, size_pct"):
+            self._rows = [p for p in c.positions if p["close_date"] == args[0]]
+        elif sql.startswith("SELECT close_price FROM fut_daily_close WHERE variety_id=%s AND trade_date=%s"):
+            price = c.closes.get(args[0], {}).get(args[1])
+            self._rows = [{"close_price": price}] if price is not None else []
+        elif sql.startswith("SELECT close_price FROM fut_daily_close WHERE variety_id=%s AND trade_date<%s"):
+            prior = [d for d in c.closes.get(args[0], {}) if d < args[1]]
+            self._rows = [{"close_price": c.closes[args[0]][max(prior)]}] if prior else []
+        elif sql.startswith("INSERT INTO trading_account_daily"):
+            c.account[args[0]] = dict(zip(("equity", "cash", "position_val", "daily_pnl"), args[1:]))
+        elif sql.startswith("SELECT record_date, trading_days"):
+            before = [d for d in c.metrics if d < args[0]]
+            self._rows = [c.metrics[max(before)]] if before else []
+        elif sql.startswith("INSERT INTO trading_account_metrics"):
+            row = dict(zip(METRIC_COLUMNS, args))
+            c.metrics[row["record_date"]] = row
+        elif sql.startswith("SELECT MIN(open_date)"):
+            self._rows = [{"d": min(p["open_date"] for p in c.positions)}]
+        elif sql.startswith("SELECT MAX(trade_date)"):
+            self._rows = [{"d": max(d for s in c.closes.values() for d in s)}]
+        elif sql.startswith("SELECT DISTINCT trade_date"):
+            self._rows = [{"trade_date": d} for d in sorted({d for s in c.closes.values() for d in s if args[0] <= d <= args[1]})]
+        elif sql.startswith("SELECT variety_id, direction, open_date, open_price, size_pct, status"):
+            self._rows = [
+                {**p, "status": "closed" if p["close_date"] else "open"}
+                for p in c.positions if p["open_date"] <= args[0]
+            ]
+        elif sql.startswith("SELECT variety_id, trade_date, close_price FROM fut_daily_close"):
+            vids = set(args[:-1])
+            self._rows = [
+                {"variety_id": v, "trade_date": d, "close_price": px}
+                for v in sorted(vids) for d, px in sorted(c.closes.get(v, {}).items()) if d <= args[-1]
+            ]
+        elif sql.startswith("DELETE FROM trading_account_daily"):
+            for d in [d for d in c.account if args[0] <= d <= args[1]]:
+                del c.account[d]
+        else:
+            raise AssertionError(f"unexpected SQL: {sql}")
+
+    def executemany(self, sql: str, seq) -> None:
+        for args in seq:
+            self.execute(sql, args)
+
+    def fetchone(self) -> dict | None:
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self) -> list[dict]:
+        return self._rows
+
+
+class LedgerConnection:
+    def __init__(self) -> None:
+        self.statements: list[str] = []
+        self.positions: list[dict] = []
+        self.closes: dict[int, dict[date, float]] = {}
+        self.account: dict[date, dict] = {}
+        self.metrics: dict[date, dict] = {}
+        self.as_of: date | None = None
+        self.commits = 0
+
+    def cursor(self) -> LedgerCursor:
+        return LedgerCursor(self)
+
+    def commit(self) -> None:
+        self.commits += 1
+
+    def rollback(self) -> None:
+        return None
+
+
+def _random_ledger(seed: int) -> LedgerConnection:
+    rng = np.random.default_rng(seed)
+    conn = LedgerConnection()
+    start = date(2025, 1, 6)
+    days = [start + timedelta(days=i) for i in range(120) if (start + timedelta(days=i)).weekday() < 5]
+    for vid in range(1, 6):
+        price = 100.0 * vid
+        series = {}
+        for d in days:
+            price *= 1 + rng.normal(0, 0.02)
+            # 个别品种缺数据，覆盖 cur_price / prev_close 缺失的跳过分支
+            if rng.random() > 0.08:
+                series[d] = round(price, 2)
+        conn.closes[vid] = series
+    for _ in range(14):
+        vid = int(rng.integers(1, 6))
+        i = int(rng.integers(0, len(days) - 5))
+        open_date = days[i]
+        open_price = conn.closes[vid].get(open_date, 100.0 * vid)
+        close_date = days[min(i + int(rng.integers(1, 30)), len(days) - 1)] if rng.random() < 0.7 else None
+        conn.positions.append({
+            "variety_id": vid, "direction": "LONG" if rng.random() < 0.5 else "SHORT",
+            "open_date": open_date, "open_price": open_price, "size_pct": 0.3333,
+            "close_date": close_date,
+            "close_price": conn.closes[vid].get(close_date, open_price * 1.01) if close_date else None,
+        })
+    return conn
+
+
+class EquityRebuildTest(unittest.TestCase):
+    def test_rebuild_matches_daily_updates(self) -> None:
+        for seed in range(5):
+            daily = _random_ledger(seed)
+            first_open = min(p["open_date"] for p in daily.positions)
+            for d in sorted({d for s in daily.closes.values() for d in s if d >= first_open}):
+                daily.as_of = d
+                update_account_daily(daily, d)
+
+            bulk = _random_ledger(seed)
+            written = rebuild_account_daily(bulk)
+
+            with self.subTest(seed=seed):
+                self.assertEqual(sorted(bulk.account), sorted(daily.account))
+                self.assertEqual(written, len(daily.account))
+                for d, row in daily.account.items():
+                    for key, value in row.items():
+                        self.assertAlmostEqual(bulk.account[d][key], value, delta=1e-6 * INITIAL_CAPITAL)
+                self.assertEqual(bulk.commits, 1)
+
+    def test_partial_range_starts_from_previous_equity(self) -> None:
+        conn = _random_ledger(11)
+        rebuild_account_daily(conn)
+        full = {d: dict(r) for d, r in conn.account.items()}
+        days = sorted(full)
+        conn.account[days[40]]["equity"] = -1.0
+
+        rebuild_account_daily(conn, days[40], days[-1])
+
+        for d in days:
+            self.assertAlmostEqual(conn.account[d]["equity"], full[d]["equity"], places=6)
+
+
+if __name__ == "__main__":
+    unittest.main()
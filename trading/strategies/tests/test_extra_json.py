@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import json
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from trading.strategies.signals import _make_extra_json, compute_signals, make_extra_json_batch
+from trading.strategies.tests.test_signal_state_machine import _random_strength_frame
+
+
+# 以下为原逐行 iloc 实现，作为字节兼容基准
+def _fv(v) -> float | None:
+    return float(v) if pd.notna(v) else None
+
+
+def _bv(v) -> bool:
+    return bool(v) if pd.notna(v) else False
+
+
+def _legacy_make_extra_json(signal_df: pd.DataFrame, idx_pos: int, signal_type: str) -> str:
+    r = signal_df.iloc[idx_pos]
+    is_open = signal_type in ("A_OPEN_LONG", "A_OPEN_SHORT")
+    win_size = 7 if is_open else 3
+
+    start = max(0, idx_pos - win_size + 1)
+    window = [
+        {
+            "trade_date": signal_df.iloc[i]["trade_date"].strftime("%Y-%m-%d"),
+            "main_force": _fv(signal_df.iloc[i]["main_force"]),
+            "retail": _fv(signal_df.iloc[i]["retail"]),
+        }
+        for i in range(start, idx_pos + 1)
+    ]
+
+    main_diff_t = _fv(r.get("main_diff"))
+    retail_diff_t = _fv(r.get("retail_diff"))
+    prev = signal_df.iloc[idx_pos - 1] if idx_pos >= 1 else None
+    main_diff_t1 = _fv(prev["main_diff"]) if prev is not None else None
+    retail_diff_t1 = _fv(prev["retail_diff"]) if prev is not None else None
+
+    bg1 = _fv(r.get("bg1"))
+    bg2 = _fv(r.get("bg2"))
+    bg3 = _fv(r.get("bg3"))
+    bg4 = _fv(r.get("bg4"))
+    bg5 = _fv(r.get("bg5"))
+    m3 = _fv(r.get("m3"))
+
+    data: dict = {
+        "main_force": _fv(r["main_force"]),
+        "retail": _fv(r["retail"]),
+        "m3": m3,
+        "signal_role": r.get("signal_role"),
+        "direction": r.get("direction"),
+        "cycle_id": r.get("cycle_id"),
+        "related_open_date": r.get("related_open_date").isoformat() if r.get("related_open_date") else None,
+        "theory_state_before": r.get("theory_state_before"),
+        "theory_state_after": r.get("theory_state_after"),
+        "window": window,
+    }
+
+    if is_open:
+        data["bg"] = {"bg1": bg1, "bg2": bg2, "bg3": bg3, "bg4": bg4, "bg5": bg5}
+        data["trigger"] = {
+            "main_diff_t1": main_diff_t1,
+            "main_diff_t": main_diff_t,
+            "retail_diff_t1": retail_diff_t1,
+            "retail_diff_t": retail_diff_t,
+        }
+
+        def _bg5_is_min() -> bool:
+            vals = [bg1, bg2, bg3, bg4, bg5]
+            return all(v is not None for v in vals) and bg5 < bg1 and bg5 < bg2 and bg5 < bg3 and bg5 < bg4  # type: ignore[operator]
+
+        def _bg5_is_max() -> bool:
+            vals = [bg1, bg2, bg3, bg4, bg5]
+            return all(v is not None for v in vals) and bg5 > bg1 and bg5 > bg2 and bg5 > bg3 and bg5 > bg4  # type: ignore[operator]
+
+        if signal_type == "A_OPEN_LONG":
+            data["conditions"] = {
+                "cont7": _bv(r.get("cont7")),
+                "bg1_lt0": bg1 is not None and bg1 < 0,
+                "bg2_lt0": bg2 is not None and bg2 < 0,
+                "bg3_lt0": bg3 is not None and bg3 < 0,
+                "bg4_lt0": bg4 is not None and bg4 < 0,
+                "bg5_lt0": bg5 is not None and bg5 < 0,
+                "bg5_is_min": _bg5_is_min(),
+                "main_diff_t1_gt0": main_diff_t1 is not None and main_diff_t1 > 0,
+                "main_diff_t_gt0": main_diff_t is not None and main_diff_t > 0,
+                "retail_diff_t1_lt0": retail_diff_t1 is not None and retail_diff_t1 < 0,
+                "retail_diff_t_lt0": retail_diff_t is not None and retail_diff_t < 0,
+            }
+        else:  # A_OPEN_SHORT
+            data["conditions"] = {
+                "cont7": _bv(r.get("cont7")),
+                "bg1_gt0": bg1 is not None and bg1 > 0,
+                "bg2_gt0": bg2 is not None and bg2 > 0,
+                "bg3_gt0": bg3 is not None and bg3 > 0,
+                "bg4_gt0": bg4 is not None and bg4 > 0,
+                "bg5_gt0": bg5 is not None and bg5 > 0,
+                "bg5_is_max": _bg5_is_max(),
+                "main_diff_t1_lt0": main_diff_t1 is not None and main_diff_t1 < 0,
+                "main_diff_t_lt0": main_diff_t is not None and main_diff_t < 0,
+                "retail_diff_t1_gt0": retail_diff_t1 is not None and retail_diff_t1 > 0,
+                "retail_diff_t_gt0": retail_diff_t is not None and retail_diff_t > 0,
+            }
+    else:
+        if signal_type == "A_CLOSE_LONG":
+            cond_key = "m3_lt0"
+            cond_val = m3 is not None and m3 < 0
+        else:
+            cond_key = "m3_gt0"
+            cond_val = m3 is not None and m3 > 0
+        data["conditions"] = {
+            "cont3": _bv(r.get("cont3")),
+            cond_key: cond_val,
+        }
+
+    return json.dumps(data, ensure_ascii=False)
+
+
+class ExtraJsonCompatibilityTest(unittest.TestCase):
+    def test_fast_builder_is_byte_compatible_with_legacy(self) -> None:
+        rng = np.random.default_rng(3)
+        checked = 0
+        for trial in range(20):
+            sig = compute_signals(_random_strength_frame(rng, 400), variety_id=trial)
+            items = [
+                (int(i), stype)
+                for stype in ("A_OPEN_LONG", "A_OPEN_SHORT", "A_CLOSE_LONG", "A_CLOSE_SHORT")
+                for i in np.flatnonzero(sig[stype].to_numpy(dtype=bool))
+            ]
+            # 追加几行非信号行（含首行），覆盖窗口截断和 NaN 字段
+            items += [(0, "A_OPEN_LONG"), (1, "A_CLOSE_SHORT"), (5, "A_OPEN_SHORT")]
+            batch = make_extra_json_batch(sig, items)
+            for (idx_pos, stype), fast in zip(items, batch):
+                expected = _legacy_make_extra_json(sig, idx_pos, stype)
+                with self.subTest(trial=trial, idx_pos=idx_pos, stype=stype):
+                    self.assertEqual(fast, expected)
+                    self.assertEqual(_make_extra_json(sig, idx_pos, stype), expected)
+                checked += 1
+        self.assertGreater(checked, 100)
+
+    def test_missing_optional_columns_fall_back_to_null(self) -> None:
+        sig = pd.DataFrame(
+            [
+                {"trade_date": pd.Timestamp("2026-04-28"), "main_force": 1.0, "retail": 2.0, "main_diff": 0.1, "retail_diff": 0.0},
+                {"trade_date": pd.Timestamp("2026-04-29"), "main_force": 1.5, "retail": 1.0, "main_diff": 0.5, "retail_diff": -1.0},
+            ]
+        )
+        data = json.loads(_make_extra_json(sig, 1, "A_CLOSE_LONG"))
+        self.assertIsNone(data["m3"])
+        self.assertEqual(data["conditions"], {"cont3": False, "m3_lt0": False})
+        self.assertEqual([w["trade_date"] for w in data["window"]], ["2026-04-28", "2026-04-29"])
+        self.assertEqual(_legacy_make_extra_json(sig, 1, "A_CLOSE_LONG"), json.dumps(data, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import os
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from trading.strategies.features import STORE_COLUMNS, feature_rows, load_features, sync_features
+from trading.strategies.shadow import create_shadow_db
+from trading.strategies.signals import compute_features, compute_signals, signals_from_features
+from trading.strategies.tests.test_signal_state_machine import _random_strength_frame
+
+
+class FeatureTableCursor:
+    def __init__(self, conn: FeatureTableConnection) -> None:
+        self.conn = conn
+        self._result: list[dict] = []
+
+    def __enter__(self) -> FeatureTableCursor:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def execute(self, sql: str, args=None) -> None:
+        assert sql.startswith("SELECT variety_id, trade_date")
+        # 模拟 pymysql：DATE 列返回 date，TINYINT 返回 int，DOUBLE 返回 float/None
+        keys = ["variety_id", "trade_date", *STORE_COLUMNS]
+        self._result = [dict(zip(keys, row)) for row in self.conn.rows]
+
+    def fetchall(self) -> list[dict]:
+        return self._result
+
+
+class FeatureTableConnection:
+    def __init__(self, rows: list[tuple]) -> None:
+        self.rows = rows
+
+    def cursor(self) -> FeatureTableCursor:
+        return FeatureTableCursor(self)
+
+
+class FeatureStoreTest(unittest.TestCase):
+    def test_signals_from_stored_features_match_full_compute(self) -> None:
+        rng = np.random.default_rng(909)
+        frames = {vid: _random_strength_frame(rng, int(rng.integers(5, 400))) for vid in range(1, 9)}
+        rows: list[tuple] = []
+        for vid, df in frames.items():
+            # 与 load_variety_data 一致：trade_date 由 DATE 列经 pd.to_datetime 得到
+            df["trade_date"] = pd.to_datetime(df["trade_date"].dt.date)
+            rows.extend(feature_rows(vid, compute_features(df)))
+
+        loaded = load_features(FeatureTableConnection(rows))
+
+        self.assertEqual(sorted(loaded), sorted(frames))
+        for vid, df in frames.items():
+            with self.subTest(variety_id=vid):
+                pd.testing.assert_frame_equal(signals_from_features(loaded[vid], vid), compute_signals(df, vid))
+
+    def test_feature_rows_only_after_watermark(self) -> None:
+        df = _random_strength_frame(np.random.default_rng(3), 50)
+        feat = compute_features(df)
+        watermark = feat["trade_date"].iloc[39].date()
+
+        rows = feature_rows(7, feat, watermark)
+
+        self.assertEqual([r[1] for r in rows], list(feat["trade_date"].dt.date.iloc[40:]))
+        self.assertTrue(all(r[0] == 7 for r in rows))
+        self.assertEqual(feature_rows(7, feat, feat["trade_date"].iloc[-1].date()), [])
+
+
+def _insert_market(conn, variety_id: int, df: pd.DataFrame, collected_at: datetime) -> None:
+    dates = df["trade_date"].dt.date.tolist()
+    with conn.cursor() as cur:
+        cur.execute("INSERT OR IGNORE INTO fut_variety (id, name) VALUES (%s, %s)", (variety_id, f"品种{variety_id}"))
+        cur.executemany(
+            "INSERT INTO fut_strength (variety_id, trade_date, main_force, retail, collected_at) "
+            "VALUES (%s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE main_force=VALUES(main_force), "
+            "retail=VALUES(retail), collected_at=VALUES(collected_at)",
+            [(variety_id, d, m, r, collected_at) for d, m, r in zip(dates, df["main_force"], df["retail"])],
+        )
+        cur.executemany(
+            "INSERT INTO fut_daily_close (variety_id, trade_date, close_price, collected_at) VALUES (%s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE close_price=VALUES(close_price), collected_at=VALUES(collected_at)",
+            [(variety_id, d, c, collected_at) for d, c in zip(dates, df["close"])],
+        )
+    conn.commit()
+
+
+@mock.patch.dict(os.environ, {"TRADING_MARKET_STORE": "off"})
+class IncrementalSyncTest(unittest.TestCase):
+    def _assert_same_features(self, conn, frames: dict[int, pd.DataFrame]) -> None:
+        full = create_shadow_db()
+        for vid, df in frames.items():
+            _insert_market(full, vid, df, datetime(2026, 5, 1))
+        sync_features(full, rebuild=True)
+        got, expected = load_features(conn), load_features(full)
+        self.assertEqual(sorted(got), sorted(expected))
+        for vid in expected:
+            with self.subTest(variety_id=vid):
+                pd.testing.assert_frame_equal(got[vid], expected[vid])
+
+    def test_tail_sync_matches_full_rebuild(self) -> None:
+        rng = np.random.default_rng(515)
+        frames = {vid: _random_strength_frame(rng, int(rng.integers(30, 300))) for vid in range(1, 7)}
+        t0, t1 = datetime(2026, 5, 6, 18, 0, 0), datetime(2026, 5, 7, 18, 0, 0)
+        # 1..4 先同步一部分，5、6 在第二次同步时才出现
+        cuts = {1: 10, 2: 40, 3: len(frames[3]) - 1, 4: len(frames[4])}
+
+        incremental = create_shadow_db()
+        for vid, cut in cuts.items():
+            _insert_market(incremental, vid, frames[vid].iloc[: cut - 1], t0 - timedelta(days=1))
+            _insert_market(incremental, vid, frames[vid].iloc[cut - 1 : cut], t0)
+        sync_features(incremental)
+        for vid, df in frames.items():
+            _insert_market(incremental, vid, df.iloc[cuts.get(vid, 0):], t1)
+        with mock.patch("trading.strategies.data_loader.load_all_varieties_data",
+                        side_effect=AssertionError("增量同步不应读取全历史")):
+            written = sync_features(incremental)
+
+        # 水位线那一秒（t0）写入的最后一行会被再次发现并重算，其余只有新增的行
+        self.assertEqual(written, sum(len(df) - cuts.get(vid, 1) + 1 for vid, df in frames.items()))
+        self._assert_same_features(incremental, frames)
+
+    def test_rows_revised_or_arriving_below_watermark_are_recomputed(self) -> None:
+        rng = np.random.default_rng(733)
+        frames = {vid: _random_strength_frame(rng, 150) for vid in range(1, 5)}
+        t0, t1 = datetime(2026, 5, 6, 18, 0, 0), datetime(2026, 5, 7, 18, 0, 0)
+        late = frames[2].iloc[[60]]
+
+        incremental = create_shadow_db()
+        for vid, df in frames.items():
+            _insert_market(incremental, vid, df.drop(index=late.index) if vid == 2 else df, t0)
+        sync_features(incremental)
+
+        # 全部早于特征水位线：1 修订主力，2 迟到一天，3 修订为空值，4 修订收盘价；品种 5 无变动
+        frames[1].loc[70, "main_force"] += 50.0
+        frames[3].loc[100, "main_force"] = np.nan
+        frames[4].loc[140, "close"] *= 1.1
+        for vid, pos in ((1, 70), (3, 100), (4, 140)):
+            _insert_market(incremental, vid, frames[vid].iloc[[pos]], t1)
+        _insert_market(incremental, 2, late, t1)
+        with mock.patch("trading.strategies.data_loader.load_all_varieties_data",
+                        side_effect=AssertionError("增量同步不应读取全历史")):
+            sync_features(incremental)
+        self._assert_same_features(incremental, frames)
+
+        # 水位线那一秒的行会被再次发现，重复同步结果不变
+        sync_features(incremental)
+        self._assert_same_features(incremental, frames)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from trading.strategies import signals
+from trading.strategies.settings import MOMENTUM_LOOKBACK
+from trading.strategies.signals import (
+    _CONSISTENCY_COLS,
+    check_incremental_consistency,
+    compute_signals,
+    save_theory_state,
+    warmup_bars,
+)
+from trading.strategies.tests.test_signal_state_machine import _random_strength_frame
+
+
+class StateCaptureCursor:
+    def __init__(self, conn: StateCaptureConnection) -> None:
+        self.conn = conn
+
+    def __enter__(self) -> StateCaptureCursor:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def execute(self, sql: str, args=None) -> None:
+        if "INSERT INTO trading_signal_state" in sql:
+            variety_id, state_date, state, cycle_id, open_date = args
+            self.conn.state = {
+                "variety_id": variety_id,
+                "state_date": state_date,
+                "state": state,
+                "cycle_id": cycle_id,
+                "open_date": open_date,
+            }
+
+
+class StateCaptureConnection:
+    def __init__(self) -> None:
+        self.state: dict | None = None
+
+    def cursor(self) -> StateCaptureCursor:
+        return StateCaptureCursor(self)
+
+    def commit(self) -> None:
+        return None
+
+
+def _normalized(series: pd.Series) -> pd.Series:
+    # 全空的 list 列在 pandas 中推断为 object(None)，否则为 str(NaN)，比较前统一成 object + None
+    obj = series.astype(object)
+    return obj.where(series.notna(), None)
+
+
+class IncrementalSignalTest(unittest.TestCase):
+    def test_tail_with_restored_state_matches_full_recompute(self) -> None:
+        rng = np.random.default_rng(99)
+        warmup = warmup_bars(MOMENTUM_LOOKBACK)
+        restored_open_cycles = 0
+        for trial in range(40):
+            df = _random_strength_frame(rng, int(rng.integers(warmup + 10, 400)))
+            full = compute_signals(df, variety_id=trial)
+
+            split = int(rng.integers(warmup, len(df) - 3))
+            new_bars = int(rng.integers(1, 4))
+            conn = StateCaptureConnection()
+            save_theory_state(conn, full["trade_date"].iloc[split].date(), trial, full)
+            state = conn.state
+            self.assertIsNotNone(state)
+            if state["state"] != "none":
+                restored_open_cycles += 1
+
+            tail = df.iloc[split - warmup + 1 : split + new_bars + 1].reset_index(drop=True)
+            inc = compute_signals(tail, variety_id=trial, theory_state=state)
+
+            full_new = full.iloc[split + 1 : split + new_bars + 1].reset_index(drop=True)
+            inc_new = inc.iloc[warmup:].reset_index(drop=True)
+            for col in _CONSISTENCY_COLS + ("main_score",):
+                with self.subTest(trial=trial, col=col):
+                    pd.testing.assert_series_equal(_normalized(inc_new[col]), _normalized(full_new[col]))
+        self.assertGreater(restored_open_cycles, 0)
+
+    def test_consistency_check_loads_full_side_like_full_run(self) -> None:
+        df = _random_strength_frame(np.random.default_rng(12), 120)
+        signal_date = df["trade_date"].iloc[-1].date()
+        names = pd.DataFrame({"id": [1, 2], "name": ["棕榈油", "豆粕"]})
+        state = {"state_date": df["trade_date"].iloc[-2].date()}
+
+        with mock.patch("trading.strategies.data_loader.load_variety_map", return_value=names), \
+                mock.patch("trading.strategies.data_loader.load_varieties_data", return_value={1: df}) as load_full, \
+                mock.patch("trading.strategies.data_loader.load_variety_data",
+                           side_effect=AssertionError("全量一侧应与全量模式共用装载入口")), \
+                mock.patch.object(signals, "load_theory_states", return_value={1: state}), \
+                mock.patch.object(signals, "compute_signals_incremental", return_value=compute_signals(df, 1)):
+            mismatches = check_incremental_consistency(object(), signal_date)
+
+        self.assertEqual(mismatches, [])
+        load_full.assert_called_once()
+        self.assertEqual(load_full.call_args.args[1], [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
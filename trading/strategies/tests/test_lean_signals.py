@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from trading.strategies.data_loader import load_varieties_bulk, load_varieties_lean
+from trading.strategies.signals import SIGNAL_TYPES, compute_signals, compute_signals_lean
+from trading.strategies.tests.test_data_loader import MarketDataConnection
+from trading.strategies.tests.test_signal_state_machine import _random_strength_frame
+
+
+def _float32_values(values: pd.Series) -> list[float]:
+    # MySQL FLOAT 经 pymysql 文本解析后的 float64 值
+    return [float(str(v)) for v in values.to_numpy(dtype=np.float32)]
+
+
+class LeanModeTest(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(77)
+        self.strength: dict[int, list[tuple]] = {}
+        self.close: dict[int, list[tuple]] = {}
+        for vid in range(1, 7):
+            df = _random_strength_frame(rng, int(rng.integers(1, 400)))
+            dates = df["trade_date"].dt.date.tolist()
+            self.strength[vid] = list(zip(dates, _float32_values(df["main_force"]), _float32_values(df["retail"])))
+            self.close[vid] = list(zip(dates, _float32_values(df["close"])))
+        self.strength[3][2] = (self.strength[3][2][0], None, 1.0)
+        self.conn = MarketDataConnection(self.strength, self.close)
+
+    def test_lean_loader_matches_bulk_loader(self) -> None:
+        frames = load_varieties_bulk(self.conn, list(self.strength))
+        lean = load_varieties_lean(self.conn, list(self.strength))
+
+        self.assertEqual(sorted(lean), sorted(frames))
+        for vid, df in frames.items():
+            arrays = lean[vid]
+            with self.subTest(variety_id=vid):
+                self.assertEqual(arrays["days"].dtype, np.int32)
+                self.assertEqual(arrays["main_force"].dtype, np.float32)
+                np.testing.assert_array_equal(
+                    arrays["days"].astype("datetime64[D]"), df["trade_date"].to_numpy().astype("datetime64[D]")
+                )
+                for col in ("main_force", "retail", "close"):
+                    np.testing.assert_array_equal(arrays[col], df[col].to_numpy(dtype=np.float32))
+
+    def test_lean_signals_match_compute_signals(self) -> None:
+        frames = load_varieties_bulk(self.conn, list(self.strength))
+        lean = load_varieties_lean(self.conn, list(self.strength))
+
+        for vid, df in frames.items():
+            full = compute_signals(df, vid)
+            res = compute_signals_lean(lean[vid], explain=True)
+            with self.subTest(variety_id=vid):
+                for stype in SIGNAL_TYPES:
+                    np.testing.assert_array_equal(res[stype], full[stype].to_numpy(dtype=bool))
+                np.testing.assert_array_equal(res["cont7"], full["cont7"].to_numpy(dtype=bool))
+                np.testing.assert_allclose(res["main_score"], full["main_score"], atol=2 / 30)
+                self.assertNotIn("bg1", compute_signals_lean(lean[vid]))
+
+
+if __name__ == "__main__":
+    unittest.main()
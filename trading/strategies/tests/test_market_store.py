@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from trading.strategies import market_store
+from trading.strategies.data_loader import load_varieties_data
+from trading.strategies.market_store import load_local_varieties, store_dir, sync_market_store
+from trading.strategies.tests.test_signal_state_machine import _random_strength_frame
+
+
+class CollectedCursor:
+    """按 collected_at 水位线返回 fut_strength / fut_daily_close 行（元组），模拟 SSCursor。"""
+
+    def __init__(self, conn: CollectedConnection) -> None:
+        self.conn = conn
+        self._rows: list[tuple] = []
+
+    def __enter__(self) -> CollectedCursor:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def execute(self, sql: str, args=None) -> None:
+        table = "fut_strength" if "FROM fut_strength" in sql else "fut_daily_close"
+        since = datetime.strptime(args[0], "%Y-%m-%d %H:%M:%S") if args else None
+        rows = self.conn.tables[table].values()
+        self._rows = sorted(r for r in rows if since is None or r[-1] >= since)
+        self.conn.fetched[table] = len(self._rows)
+
+    def fetchmany(self, size: int) -> list[tuple]:
+        chunk, self._rows = self._rows[:size], self._rows[size:]
+        return chunk
+
+
+class CollectedConnection:
+    def __init__(self) -> None:
+        self.tables: dict[str, dict[tuple, tuple]] = {"fut_strength": {}, "fut_daily_close": {}}
+        self.fetched: dict[str, int] = {}
+
+    def cursor(self, cursor_class=None) -> CollectedCursor:
+        return CollectedCursor(self)
+
+    def upsert(self, vid: int, df: pd.DataFrame, collected_at: datetime) -> None:
+        for d, m, r, c in zip(df["trade_date"].dt.date, df["main_force"], df["retail"], df["close"]):
+            self.tables["fut_strength"][(vid, d)] = (vid, d, m, r, collected_at)
+            self.tables["fut_daily_close"][(vid, d)] = (vid, d, c, collected_at)
+
+    def expected(self) -> dict[int, pd.DataFrame]:
+        strength = pd.DataFrame(
+            [r[:4] for r in self.tables["fut_strength"].values()],
+            columns=["variety_id", "trade_date", "main_force", "retail"],
+        )
+        close = pd.DataFrame(
+            [r[:3] for r in self.tables["fut_daily_close"].values()],
+            columns=["variety_id", "trade_date", "close"],
+        )
+        df = strength.merge(close, on=["variety_id", "trade_date"]).dropna()
+        df["trade_date"] = pd.to_datetime(df["trade_date"])
+        return {
+            int(vid): g.drop(columns="variety_id").sort_values("trade_date").reset_index(drop=True)
+            for vid, g in df.groupby("variety_id")
+        }
+
+
+class MarketStoreTest(unittest.TestCase):
+    def test_incremental_sync_matches_source_tables(self) -> None:
+        rng = np.random.default_rng(5)
+        conn = CollectedConnection()
+        t0 = datetime(2026, 1, 5, 18, 0, 0)
+        frames = {vid: _random_strength_frame(rng, 120) for vid in (1, 2, 3)}
+        for vid, df in frames.items():
+            conn.upsert(vid, df.iloc[:90], t0 - timedelta(days=1))
+            conn.upsert(vid, df.iloc[90:100], t0)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            sync_market_store(conn, root=root)
+            self.assertEqual(conn.fetched["fut_strength"], 300)
+
+            # 新增 20 天 + 修订一条历史收盘价 + 一条主力空值
+            t1 = t0 + timedelta(days=1)
+            for vid, df in frames.items():
+                conn.upsert(vid, df.iloc[100:], t1)
+            key = (2, frames[2]["trade_date"].iloc[10].date())
+            conn.tables["fut_daily_close"][key] = (*key, 1.5, t1)
+            key = (3, frames[3]["trade_date"].iloc[50].date())
+            conn.tables["fut_strength"][key] = (*key, None, 0.0, t1)
+
+            counts = sync_market_store(conn, root=root)
+            # 水位线那一秒的 30 行会被重复拉取（>=），其余只有新增与修订的行
+            self.assertEqual(counts["fut_strength"], 30 + 60 + 1)
+            self.assertEqual(counts["fut_daily_close"], 30 + 60 + 1)
+
+            local = load_local_varieties([1, 2, 3, 4], root=root)
+            expected = conn.expected()
+            self.assertEqual(sorted(local), sorted(expected))
+            for vid in expected:
+                with self.subTest(variety_id=vid):
+                    pd.testing.assert_frame_equal(local[vid], expected[vid])
+
+
+class StoreDirTest(unittest.TestCase):
+    def test_mirror_is_opt_in(self) -> None:
+        for value in ("", "off", "OFF"):
+            with self.subTest(value=value), mock.patch.dict(os.environ, {"TRADING_MARKET_STORE": value}):
+                self.assertIsNone(store_dir())
+        with mock.patch.dict(os.environ, clear=True):
+            self.assertIsNone(store_dir())
+            with mock.patch.object(market_store, "sync_market_store") as sync, \
+                    mock.patch("trading.strategies.data_loader.load_varieties_bulk", return_value={}) as bulk:
+                load_varieties_data(object(), [1, 2])
+            sync.assert_not_called()
+            bulk.assert_called_once()
+
+    def test_directory_is_keyed_by_connection_database(self) -> None:
+        prod = SimpleNamespace(host="10.0.0.5", port=3306, db=b"futures")
+        test = SimpleNamespace(host="10.0.0.5", port=3306, db=b"futures_test")
+        with mock.patch.dict(os.environ, {"TRADING_MARKET_STORE": "/data/mirror"}):
+            self.assertEqual(store_dir(prod), Path("/data/mirror/10.0.0.5_3306_futures"))
+            self.assertNotEqual(store_dir(prod), store_dir(test))
+            with self.assertRaises(RuntimeError):
+                store_dir(object())
+        with mock.patch.dict(os.environ, {"TRADING_MARKET_STORE": "on"}):
+            self.assertEqual(store_dir(prod).parent, store_dir())
+
+
+if __name__ == "__main__":
+    unittest.main()
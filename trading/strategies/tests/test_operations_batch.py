@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import json
+import unittest
+from datetime import date, timedelta
+
+import numpy as np
+
+from trading.strategies.operations import generate_operations, generate_operations_range
+
+DAY = date(2026, 4, 24)
+SECTORS = ["有色", "黑色", "化工", "农产品", "油脂"]
+
+
+class OperationsCursor:
+    def __init__(self, conn: OperationsConnection) -> None:
+        self.conn = conn
+        self._rows: list[dict] = []
+
+    def __enter__(self) -> OperationsCursor:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def execute(self, sql: str, args=()) -> None:
+        sql = " ".join(sql.split())
+        self.conn.statements.append(sql)
+        c = self.conn
+        if sql.startswith("SELECT variety_id, variety_name, sector FROM trading_pool"):
+            self._rows = list(c.pool)
+        elif sql.startswith("SELECT variety_id, variety_name, direction, sector FROM trading_positions"):
+            # 单日路径：status 按 as_of 当天的视角还原（closes_done 决定当日平仓是否已执行）
+            self._rows = [p for p in c.positions if p["open_date"] < args[0] and c.is_open(p)]
+        elif sql.startswith("SELECT variety_id FROM trading_positions WHERE close_date"):
+            self._rows = [p for p in c.positions if p["close_date"] == args[0] and c.closes_done]
+        elif sql.startswith("SELECT id, variety_id, variety_name, signal_type"):
+            self._rows = [s for s in c.signals if s["signal_date"] == args[0]]
+        elif sql.startswith("SELECT id, signal_date, variety_id"):
+            self._rows = [s for s in c.signals if args[0] <= s["signal_date"] <= args[1]]
+        elif sql.startswith("SELECT id, variety_id, variety_name, direction, sector, open_date, close_date"):
+            self._rows = sorted(
+                (p for p in c.positions
+                 if p["open_date"] <= args[0] and (p["close_date"] is None or p["close_date"] >= args[1])),
+                key=lambda p: (p["open_date"], p["id"]),
+            )
+        elif sql.startswith("DELETE FROM trading_operations"):
+            c.pending = [r for r in c.operations if not args[0] <= r["signal_date"] <= args[1]]
+        else:
+            raise AssertionError(f"unexpected SQL: {sql}")
+
+    def executemany(self, sql: str, seq) -> None:
+        sql = " ".join(sql.split())
+        self.conn.statements.append(sql)
+        assert sql.startswith("INSERT INTO trading_operations")
+        if self.conn.fail_insert:
+            raise RuntimeError("insert failed")
+        keys = ("signal_id", "signal_date", "variety_id", "variety_name", "sector", "signal_type",
+                "operation_type", "direction", "signal_cycle_id", "main_score", "is_selected",
+                "reject_reason", "selection_rank", "extra_json")
+        self.conn.pending.extend(dict(zip(keys, args)) for args in seq)
+
+    def fetchall(self) -> list[dict]:
+        return self._rows
+
+
+class OperationsConnection:
+    def __init__(self) -> None:
+        self.statements: list[str] = []
+        self.pool: list[dict] = []
+        self.positions: list[dict] = []
+        self.signals: list[dict] = []
+        self.operations: list[dict] = []
+        self.pending: list[dict] = []
+        self.as_of: date | None = None
+        self.closes_done = True
+        self.fail_insert = False
+        self.commits = 0
+        self.rollbacks = 0
+
+    def is_open(self, pos: dict) -> bool:
+        if pos["close_date"] is None:
+            return True
+        return pos["close_date"] > self.as_of if self.closes_done else pos["close_date"] >= self.as_of
+
+    def cursor(self) -> OperationsCursor:
+        return OperationsCursor(self)
+
+    def commit(self) -> None:
+        self.operations = self.pending
+        self.commits += 1
+
+    def rollback(self) -> None:
+        self.pending = list(self.operations)
+        self.rollbacks += 1
+
+
+def _signal(sig_id: int, d: date, vid: int, score: float | None) -> dict:
+    return {
+        "id": sig_id, "signal_date": d, "variety_id": vid, "variety_name": f"v{vid:02d}",
+        "signal_type": "A_OPEN_LONG", "direction": "LONG", "cycle_id": f"{vid}-{d}", "main_score": score,
+    }
+
+
+def _random_book(seed: int) -> tuple[OperationsConnection, list[date]]:
+    rng = np.random.default_rng(seed)
+    conn = OperationsConnection()
+    conn.pool = [{"variety_id": v, "variety_name": f"v{v:02d}", "sector": SECTORS[v % 5]} for v in range(1, 16)]
+    days = [DAY + timedelta(days=i) for i in range(40)]
+    for i in range(8):
+        vid = int(rng.integers(1, 16))
+        open_date = days[int(rng.integers(0, 30))]
+        close_date = open_date + timedelta(days=int(rng.integers(1, 15))) if rng.random() < 0.7 else None
+        conn.positions.append({
+            "id": i + 1, "variety_id": vid, "variety_name": f"v{vid:02d}", "direction": "LONG",
+            "sector": SECTORS[vid % 5], "open_date": open_date, "close_date": close_date,
+        })
+    sig_id = 0
+    for d in days:
+        for vid in rng.choice(np.arange(1, 18), size=int(rng.integers(0, 5)), replace=False):
+            sig_id += 1
+            conn.signals.append(_signal(sig_id, d, int(vid), None if rng.random() < 0.1 else float(rng.random())))
+    return conn, days
+
+
+class GenerateOperationsTest(unittest.TestCase):
+    def test_single_day_replaces_rows_in_one_transaction(self) -> None:
+        conn = OperationsConnection()
+        conn.as_of = DAY
+        conn.pool = [{"variety_id": v, "variety_name": f"v{v:02d}", "sector": SECTORS[v % 5]} for v in range(1, 8)]
+        conn.positions = [
+            {"id": 1, "variety_id": 1, "variety_name": "v01", "direction": "LONG", "sector": SECTORS[1],
+             "open_date": DAY - timedelta(days=3), "close_date": None},
+            {"id": 2, "variety_id": 2, "variety_name": "v02", "direction": "LONG", "sector": SECTORS[2],
+             "open_date": DAY - timedelta(days=5), "close_date": DAY},
+        ]
+        conn.signals = [
+            _signal(1, DAY, 1, 0.9), _signal(2, DAY, 2, 0.8), _signal(3, DAY, 6, 0.7),
+            _signal(4, DAY, 3, 0.6), _signal(5, DAY, 4, 0.5), _signal(6, DAY, 5, 0.4), _signal(7, DAY, 99, 1.0),
+        ]
+        conn.operations = [{"signal_date": DAY, "variety_id": 42}, {"signal_date": DAY - timedelta(days=1)}]
+        conn.pending = list(conn.operations)
+
+        generate_operations(conn, DAY)
+
+        today = {r["variety_id"]: r for r in conn.operations if r["signal_date"] == DAY}
+        self.assertEqual(
+            {vid: (r["is_selected"], r["reject_reason"]) for vid, r in today.items()},
+            {1: (0, "already_holding"), 2: (0, "closed_today"), 6: (0, "sector_conflict"),
+             3: (1, None), 4: (1, None), 5: (0, "capacity_full")},
+        )
+        self.assertEqual(json.loads(today[3]["extra_json"]), {"rank_note": "selected", "selection_rank": 1})
+        self.assertEqual(len(conn.operations), 7)
+        self.assertEqual(sum(s.startswith("INSERT") for s in conn.statements), 1)
+        self.assertEqual(conn.commits, 1)
+
+    def test_failed_insert_keeps_previous_rows(self) -> None:
+        conn = OperationsConnection()
+        conn.as_of = DAY
+        conn.pool = [{"variety_id": 1, "variety_name": "v01", "sector": SECTORS[1]}]
+        conn.signals = [_signal(1, DAY, 1, 0.5)]
+        conn.operations = [{"signal_date": DAY, "variety_id": 1, "is_selected": 1}]
+        conn.fail_insert = True
+
+        with self.assertRaises(RuntimeError):
+            generate_operations(conn, DAY)
+
+        self.assertEqual(conn.operations, [{"signal_date": DAY, "variety_id": 1, "is_selected": 1}])
+        self.assertEqual((conn.commits, conn.rollbacks), (0, 1))
+
+    def test_range_matches_pipeline_order(self) -> None:
+        for seed in range(6):
+            daily, days = _random_book(seed)
+            # daily_run 中 Step 2 早于 Step 3：生成建议时当日要平的持仓仍占槽位，当日平仓集合为空
+            daily.closes_done = False
+            for d in days:
+                daily.as_of = d
+                generate_operations(daily, d)
+
+            bulk, _ = _random_book(seed)
+            written = generate_operations_range(bulk, days[0], days[-1])
+
+            with self.subTest(seed=seed):
+                self.assertEqual(bulk.operations, daily.operations)
+                self.assertEqual(written, len(daily.operations))
+                self.assertEqual(bulk.commits, 1)
+                self.assertNotIn("closed_today", {r["reject_reason"] for r in bulk.operations})
+
+
+if __name__ == "__main__":
+    unittest.main()
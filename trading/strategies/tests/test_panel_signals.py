@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from trading.strategies.panel import compute_panel_signals, stack_variety_frames
+from trading.strategies.signals import compute_frames, compute_frames_parallel, compute_signals
+from trading.strategies.tests.test_signal_state_machine import _random_strength_frame
+
+
+class PanelSignalEquivalenceTest(unittest.TestCase):
+    def test_panel_matches_per_variety_compute_signals(self) -> None:
+        rng = np.random.default_rng(404)
+        frames = {vid: _random_strength_frame(rng, int(rng.integers(1, 500))) for vid in range(1, 40)}
+        frames[40] = _random_strength_frame(rng, 4)
+        frames[41] = pd.DataFrame()
+
+        results = compute_panel_signals(stack_variety_frames(frames))
+
+        self.assertEqual(set(results), {vid for vid, df in frames.items() if not df.empty})
+        for vid, df in frames.items():
+            if df.empty:
+                continue
+            with self.subTest(variety_id=vid):
+                pd.testing.assert_frame_equal(results[vid], compute_signals(df, vid))
+
+    def test_parallel_workers_match_serial_and_isolate_failures(self) -> None:
+        rng = np.random.default_rng(5)
+        frames = {vid: _random_strength_frame(rng, 200) for vid in range(1, 8)}
+        frames[8] = frames[1].assign(trade_date=frames[1]["trade_date"].astype(str))  # 日期未解析：该品种计算失败
+
+        results = compute_frames_parallel(frames, workers=3)
+
+        self.assertIsInstance(results[8], str)
+        for vid in range(1, 8):
+            with self.subTest(variety_id=vid):
+                pd.testing.assert_frame_equal(results[vid], compute_signals(frames[vid], vid))
+        self.assertEqual(set(results), set(compute_frames(frames)))
+
+    def test_empty_panel(self) -> None:
+        self.assertEqual(compute_panel_signals(stack_variety_frames({})), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
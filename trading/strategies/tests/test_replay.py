@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from datetime import date
+import unittest
+
+import numpy as np
+
+from trading.strategies.replay import collect_signal_rows, write_signal_rows
+from trading.strategies.signals import compute_frames
+from trading.strategies.tests.test_signal_state_machine import _random_strength_frame
+
+_COLUMNS = (
+    "signal_date", "variety_id", "variety_name", "signal_type", "signal_role",
+    "direction", "cycle_id", "related_open_signal_id", "related_open_date",
+    "theory_state_before", "theory_state_after", "main_score", "extra_json",
+)
+
+
+class TableCursor:
+    def __init__(self, conn: TableConnection) -> None:
+        self.conn = conn
+        self.result: list[dict] = []
+
+    def __enter__(self) -> TableCursor:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def execute(self, sql: str, args=None) -> None:
+        sql = " ".join(sql.split())
+        self.result = []
+        if sql.startswith("DELETE FROM trading_signals WHERE signal_date BETWEEN"):
+            lo, hi, *vids = args
+            self.conn.signals = [
+                r for r in self.conn.signals
+                if not (lo <= r["signal_date"] <= hi and r["variety_id"] in vids)
+            ]
+        elif sql.startswith("SELECT id, variety_id, cycle_id FROM trading_signals WHERE signal_role='open' AND signal_date BETWEEN"):
+            lo, hi = args
+            self.result = [
+                r for r in self.conn.signals if r["signal_role"] == "open" and lo <= r["signal_date"] <= hi
+            ]
+        elif sql.startswith("SELECT id, variety_id, cycle_id FROM trading_signals"):
+            self.result = [r for r in self.conn.signals if r["signal_role"] == "open" and r["cycle_id"] in args]
+
+    def executemany(self, sql: str, seq) -> None:
+        sql = " ".join(sql.split())
+        if sql.startswith("INSERT INTO trading_signals "):
+            for args in seq:
+                self.conn.next_id += 1
+                self.conn.signals.append({"id": self.conn.next_id, **dict(zip(_COLUMNS, args))})
+        elif sql.startswith("INSERT INTO trading_signal_state"):
+            self.conn.states.extend(seq)
+
+    def fetchall(self):
+        return self.result
+
+
+class TableConnection:
+    def __init__(self) -> None:
+        self.signals: list[dict] = []
+        self.states: list[tuple] = []
+        self.next_id = 0
+        self.commits = 0
+
+    def cursor(self) -> TableCursor:
+        return TableCursor(self)
+
+    def commit(self) -> None:
+        self.commits += 1
+
+    def rollback(self) -> None:
+        raise AssertionError("unexpected rollback")
+
+
+class ReplayTest(unittest.TestCase):
+    def test_replay_links_closes_to_opens_across_chunks(self) -> None:
+        rng = np.random.default_rng(8)
+        frames = {vid: _random_strength_frame(rng, 500) for vid in range(1, 7)}
+        sig_frames = compute_frames(frames)
+        names = {vid: f"品种{vid}" for vid in frames}
+        start, end = date(2020, 6, 1), date(2021, 3, 31)
+
+        rows = collect_signal_rows(sig_frames, names, start, end)
+        conn = TableConnection()
+        # 区间开始前的开仓信号已在库中，供跨区间平仓关联
+        pre_rows = collect_signal_rows(sig_frames, names, date(2019, 1, 1), date(2020, 5, 31))
+        for args in pre_rows:
+            conn.next_id += 1
+            conn.signals.append({"id": conn.next_id, **dict(zip(_COLUMNS, args))})
+        pre_count = len(conn.signals)
+
+        written = write_signal_rows(conn, rows, start, end, sorted(frames), chunk_days=20)
+
+        expected = 0
+        for sig in sig_frames.values():
+            in_range = (sig["trade_date"].dt.date >= start) & (sig["trade_date"].dt.date <= end)
+            expected += int(sig.loc[in_range, ["A_OPEN_LONG", "A_OPEN_SHORT", "A_CLOSE_LONG", "A_CLOSE_SHORT"]].to_numpy().sum())
+        self.assertEqual(written, expected)
+        self.assertEqual(len(conn.signals), pre_count + expected)
+        self.assertEqual(conn.commits, 16)
+
+        opens = {(r["variety_id"], r["cycle_id"]): r["id"] for r in conn.signals if r["signal_role"] == "open"}
+        closes = [r for r in conn.signals if r["signal_role"] == "close" and start <= r["signal_date"] <= end]
+        self.assertGreater(len(closes), 0)
+        for r in closes:
+            with self.subTest(cycle_id=r["cycle_id"]):
+                self.assertEqual(r["related_open_signal_id"], opens.get((r["variety_id"], r["cycle_id"])))
+        self.assertTrue(any(r["related_open_signal_id"] is not None for r in closes))
+
+    def test_rerun_is_idempotent(self) -> None:
+        rng = np.random.default_rng(9)
+        sig_frames = compute_frames({1: _random_strength_frame(rng, 300)})
+        start, end = date(2020, 3, 1), date(2020, 12, 31)
+        rows = collect_signal_rows(sig_frames, {1: "沪铜"}, start, end)
+        conn = TableConnection()
+        write_signal_rows(conn, [list(a) for a in rows], start, end, [1])
+        first = sorted((r["signal_date"], r["signal_type"]) for r in conn.signals)
+        write_signal_rows(conn, [list(a) for a in rows], start, end, [1])
+        self.assertEqual(sorted((r["signal_date"], r["signal_type"]) for r in conn.signals), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
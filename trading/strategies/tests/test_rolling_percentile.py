@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from trading.strategies.bench_main_score import legacy_main_score
+from trading.strategies.rolling import rolling_percentile
+
+
+class RollingPercentileTest(unittest.TestCase):
+    def test_matches_legacy_loop_for_various_lookbacks(self) -> None:
+        rng = np.random.default_rng(11)
+        for lookback in (1, 5, 30, 61):
+            for n in (0, lookback, lookback + 1, 400):
+                values = np.abs(rng.normal(0, 3, n)).round(1)  # 保留一位小数，制造并列值
+                if n > 10:
+                    values[rng.choice(n, size=4, replace=False)] = np.nan
+                expected = np.asarray(legacy_main_score(pd.Series(values, dtype=float), lookback), dtype=float)
+                with self.subTest(lookback=lookback, n=n):
+                    np.testing.assert_array_equal(rolling_percentile(values, lookback), expected)
+
+    def test_rejects_non_positive_lookback(self) -> None:
+        with self.assertRaises(ValueError):
+            rolling_percentile(np.arange(5.0), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import unittest
+from contextlib import ExitStack
+from datetime import date
+from unittest import mock
+
+from trading.strategies import daily_run
+from trading.strategies.db import QueryStats
+
+RUN_DATE = date(2025, 3, 3)
+
+
+class LedgerCursor:
+    """trading_run_ledger 相关 SQL 的内存实现。"""
+
+    def __init__(self, conn: "LedgerConnection") -> None:
+        self.conn = conn
+        self._rows: list[dict] = []
+
+    def __enter__(self) -> "LedgerCursor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def execute(self, sql: str, args=()) -> None:
+        sql = " ".join(sql.split())
+        ledger = self.conn.ledger
+        if sql.startswith("SELECT step, status"):
+            self._rows = [dict(r, step=s) for (d, s), r in ledger.items() if d == args[0]]
+        elif sql.startswith("INSERT INTO trading_run_ledger"):
+            run_date, step, started = args
+            prev = ledger.get((run_date, step), {})
+            ledger[(run_date, step)] = {
+                "status": "running", "started_at": started, "finished_at": None, "duration_ms": None,
+                "row_count": None, "error_msg": None, "attempts": prev.get("attempts", 0) + 1,
+            }
+        elif sql.startswith("UPDATE trading_run_ledger SET status='done'"):
+            finished, duration_ms, rows, run_date, step = args
+            ledger[(run_date, step)].update(
+                status="done", finished_at=finished, duration_ms=duration_ms, row_count=rows
+            )
+        elif sql.startswith("UPDATE trading_run_ledger SET status='failed'"):
+            finished, duration_ms, error, run_date, step = args
+            ledger[(run_date, step)].update(
+                status="failed", finished_at=finished, duration_ms=duration_ms, error_msg=error
+            )
+        else:
+            raise AssertionError(f"unexpected SQL: {sql}")
+
+    def fetchall(self) -> list[dict]:
+        return self._rows
+
+
+class LedgerConnection:
+    def __init__(self) -> None:
+        self.ledger: dict[tuple[date, str], dict] = {}
+        self.rollbacks = 0
+
+    def cursor(self) -> LedgerCursor:
+        return LedgerCursor(self)
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        self.rollbacks += 1
+
+
+class RunLedgerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.conn = LedgerConnection()
+        self.calls: list[str] = []
+        self.open_fails = False
+        self.closed_arg = None
+
+    def _run(self, *argv: str) -> list[str]:
+        self.calls = []
+
+        def open_ops(conn, d, closed_today):
+            self.calls.append("open")
+            self.closed_arg = closed_today
+            if self.open_fails:
+                raise RuntimeError("deadlock")
+            return 2
+
+        def track(name, result):
+            def fn(*a, **kw):
+                self.calls.append(name)
+                return result
+            return fn
+
+        patches = [
+            mock.patch("trading.strategies.create_tables.sync_pool_with_varieties", return_value=0),
+            mock.patch("trading.strategies.data_loader.check_data_completeness", return_value=(True, "ok")),
+            mock.patch("trading.strategies.signals.run_signals_for_all",
+                       side_effect=track("signals", {"沪铜": ["open_long"], "豆粕": ["close_short", "open_long"]})),
+            mock.patch("trading.strategies.operations.generate_operations", side_effect=track("operations", 4)),
+            mock.patch("trading.strategies.operations.get_closed_today", side_effect=track("closed_today", {7})),
+            mock.patch("trading.strategies.account.execute_close_signals", side_effect=track("close", {7, 9})),
+            mock.patch("trading.strategies.account.execute_open_operations", side_effect=open_ops),
+            mock.patch("trading.strategies.account.update_account_daily", side_effect=track("account", None)),
+        ]
+        with ExitStack() as stack:
+            for p in patches:
+                stack.enter_context(p)
+            daily_run.run_day(self.conn, RUN_DATE, daily_run.parse_args([RUN_DATE.isoformat(), *argv]), QueryStats())
+        return self.calls
+
+    def _status(self) -> dict[str, str]:
+        return {s: r["status"] for (_, s), r in self.conn.ledger.items()}
+
+    def test_failed_step_resumes_and_done_steps_are_skipped(self) -> None:
+        self.open_fails = True
+        with self.assertRaises(RuntimeError):
+            self._run()
+        self.assertEqual(self.calls, ["signals", "operations", "close", "open"])
+        self.assertEqual(
+            self._status(), {"signals": "done", "operations": "done", "close": "done", "open": "failed"}
+        )
+        failed = self.conn.ledger[(RUN_DATE, "open")]
+        self.assertEqual(failed["error_msg"], "RuntimeError: deadlock")
+        self.assertEqual(self.conn.rollbacks, 1)
+        rows = {s: r["row_count"] for (_, s), r in self.conn.ledger.items()}
+        self.assertEqual(rows, {"signals": 3, "operations": 4, "close": 2, "open": None})
+
+        # 续跑：跳过已完成的 1~3 步，平仓集合从持仓表恢复
+        self.open_fails = False
+        self.assertEqual(self._run(), ["closed_today", "open", "account"])
+        self.assertEqual(self.closed_arg, {7})
+        self.assertEqual(set(self._status().values()), {"done"})
+        self.assertEqual(self.conn.ledger[(RUN_DATE, "open")]["attempts"], 2)
+        self.assertEqual(self.conn.ledger[(RUN_DATE, "open")]["row_count"], 2)
+        self.assertIsNone(self.conn.ledger[(RUN_DATE, "open")]["error_msg"])
+        self.assertEqual(self.conn.ledger[(RUN_DATE, "account")]["row_count"], 1)
+
+        self.assertEqual(self._run(), [])
+
+    def test_force_and_from_step(self) -> None:
+        self._run()
+        self.assertEqual(self._run("--force"), ["signals", "operations", "close", "open", "account"])
+        self.assertEqual(self.closed_arg, {7, 9})
+        self.assertEqual(self._run("--from-step", "3"), ["close", "open", "account"])
+        self.assertEqual(self.conn.ledger[(RUN_DATE, "signals")]["attempts"], 2)
+        self.assertEqual(self.conn.ledger[(RUN_DATE, "close")]["attempts"], 3)
+
+    def test_upstream_rerun_forces_downstream(self) -> None:
+        self._run()
+        del self.conn.ledger[(RUN_DATE, "operations")]
+        self.assertEqual(self._run(), ["operations", "close", "open", "account"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import os
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from trading.strategies import daily_run
+from trading.strategies.create_tables import init_pool
+from trading.strategies.db import QueryStats
+from trading.strategies.settings import TARGET_VARIETIES
+from trading.strategies.shadow import create_shadow_db, diff_results, run_shadow, translate_sql
+
+
+def _production(seed: int, days: int):
+    """用替身库充当“生产库”：写入随机行情（池子 A 品种加一个非池子品种），逐日运行 daily_run。"""
+    rng = np.random.default_rng(seed)
+    conn = create_shadow_db()
+    dates = list(pd.bdate_range("2024-01-02", periods=days).date)
+    names = [*TARGET_VARIETIES, "非池子品种"]
+    with conn.cursor() as cur:
+        for vid, name in enumerate(names, start=1):
+            cur.execute("INSERT INTO fut_variety (id, name) VALUES (%s,%s)", (vid, name))
+            t = np.arange(days)
+            main_force = 20 * np.sin(t / rng.uniform(3, 8)) + rng.normal(0, 4, days)
+            retail = -0.5 * main_force + rng.normal(0, 3, days)
+            close = 1000 + np.cumsum(rng.normal(0, 5, days))
+            cur.executemany(
+                "INSERT INTO fut_strength (variety_id, trade_date, main_force, retail) VALUES (%s,%s,%s,%s)",
+                [(vid, d, m, r) for d, m, r in zip(dates, main_force, retail)],
+            )
+            cur.executemany(
+                "INSERT INTO fut_daily_close (variety_id, trade_date, close_price) VALUES (%s,%s,%s)",
+                [(vid, d, c) for d, c in zip(dates, close)],
+            )
+    conn.commit()
+    with mock.patch("builtins.print"):
+        init_pool(conn)
+    for d in dates:
+        daily_run.run_day(conn, d, daily_run.parse_args([d.isoformat()]), QueryStats())
+    return conn, dates
+
+
+class ShadowRunTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        with mock.patch.dict(os.environ, {"TRADING_MARKET_STORE": "off"}):
+            cls.prod, cls.dates = _production(3, 70)
+
+    def test_translate_sql(self) -> None:
+        self.assertEqual(
+            translate_sql("INSERT IGNORE INTO t (a, b) VALUES (%s,%s) ON DUPLICATE KEY UPDATE b=VALUES(b), n=n+1"),
+            "INSERT OR IGNORE INTO t (a, b) VALUES (?,?) ON CONFLICT DO UPDATE SET b=excluded.b, n=n+1",
+        )
+        self.assertEqual(translate_sql("SELECT 1 WHERE name LIKE 'a%%'"), "SELECT 1 WHERE name LIKE 'a%'")
+
+    def test_shadow_matches_production_and_reports_perturbations(self) -> None:
+        start, end = self.dates[40], self.dates[-1]
+        shadow, dates = run_shadow(self.prod, start, end)
+        self.assertEqual(dates, self.dates[40:])
+        self.assertEqual(diff_results(self.prod, shadow, start, end), [])
+
+        with shadow.cursor() as cur:
+            cur.execute("SELECT COUNT(*) AS n FROM trading_positions WHERE open_date BETWEEN %s AND %s", (start, end))
+            self.assertGreater(cur.fetchone()["n"], 0)
+
+        # 在“生产库”上制造差异，diff 应逐项报告
+        prod = self.prod
+        with prod.cursor() as cur:
+            cur.execute(
+                "SELECT variety_id, open_date, close_price FROM trading_positions "
+                "WHERE status='closed' AND open_date>=%s ORDER BY id LIMIT 1",
+                (start,),
+            )
+            pos = cur.fetchone()
+            cur.execute(
+                "UPDATE trading_positions SET close_price=%s WHERE variety_id=%s AND open_date=%s",
+                (pos["close_price"] * 1.001, pos["variety_id"], pos["open_date"]),
+            )
+            cur.execute(
+                "SELECT id, signal_date, variety_id, signal_type FROM trading_operations "
+                "WHERE signal_date>=%s ORDER BY id LIMIT 1",
+                (start,),
+            )
+            op = cur.fetchone()
+            cur.execute("UPDATE trading_operations SET reject_reason='手工改动' WHERE id=%s", (op["id"],))
+            cur.execute(
+                "SELECT s.id, s.signal_date, s.variety_id, s.signal_type FROM trading_signals s "
+                "WHERE s.signal_date>=%s AND s.signal_role='close' ORDER BY s.id LIMIT 1",
+                (start,),
+            )
+            sig = cur.fetchone()
+            cur.execute("DELETE FROM trading_signals WHERE id=%s", (sig["id"],))
+            cur.execute(
+                "UPDATE trading_account_daily SET equity=equity+1 WHERE record_date=%s", (self.dates[50],)
+            )
+        prod.commit()
+
+        diffs = diff_results(prod, shadow, start, end)
+        found = {(d["table"], tuple(d["key"]), d["field"]) for d in diffs}
+        sig_key = (sig["signal_date"], sig["variety_id"], sig["signal_type"])
+        self.assertIn(("positions", (pos["variety_id"], pos["open_date"]), "close_price"), found)
+        self.assertIn(("operations", (op["signal_date"], op["variety_id"], op["signal_type"]), "reject_reason"), found)
+        self.assertIn(("signals", sig_key, "_row"), found)
+        self.assertIn(("equity", (self.dates[50],), "equity"), found)
+        # 放宽容差后，equity+1（相对误差约 4e-5）不再报告
+        loose = diff_results(prod, shadow, start, end, tol=1e-3)
+        self.assertNotIn(("equity", [self.dates[50]], "equity"), [(d["table"], d["key"], d["field"]) for d in loose])
+        # 被删信号的引用方只报告引用字段，不影响其余比对
+        self.assertTrue(all(
+            d["field"] in ("close_price", "reject_reason", "_row", "equity", "close_signal_id", "signal_id")
+            for d in diffs
+        ), diffs)
+        shadow.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+from datetime import date
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from trading.strategies import signals
+from trading.strategies.signals import run_signals_for_all, save_signals_bulk, signal_rows
+
+
+class BulkCursor:
+    def __init__(self, conn: BulkConnection) -> None:
+        self.conn = conn
+        self.last_sql = ""
+
+    def __enter__(self) -> BulkCursor:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def execute(self, sql: str, args=None) -> None:
+        self.last_sql = " ".join(sql.split())
+        self.conn.statements.append((self.last_sql, args))
+
+    def executemany(self, sql: str, seq) -> None:
+        self.last_sql = " ".join(sql.split())
+        self.conn.statements.append((self.last_sql, [tuple(a) for a in seq]))
+
+    def fetchall(self):
+        if "FROM trading_signals" in self.last_sql and "signal_role='open'" in self.last_sql:
+            return self.conn.open_rows
+        return []
+
+
+class BulkConnection:
+    def __init__(self) -> None:
+        self.statements: list[tuple[str, object]] = []
+        self.open_rows: list[dict] = []
+        self.commits = 0
+
+    def cursor(self) -> BulkCursor:
+        return BulkCursor(self)
+
+    def commit(self) -> None:
+        self.commits += 1
+
+    def rollback(self) -> None:
+        raise AssertionError("unexpected rollback")
+
+
+def _signal_frame(signal_date: date, **row) -> pd.DataFrame:
+    base = {
+        "trade_date": pd.Timestamp(signal_date),
+        "main_force": 1.0,
+        "retail": -1.0,
+        "main_diff": 0.5,
+        "retail_diff": -0.5,
+        "m3": 1.0,
+        "cont3": True,
+        "cont7": True,
+        "A_OPEN_LONG": False,
+        "A_OPEN_SHORT": False,
+        "A_CLOSE_LONG": False,
+        "A_CLOSE_SHORT": False,
+        "main_score": np.nan,
+        "signal_role": None,
+        "direction": None,
+        "cycle_id": None,
+        "related_open_date": None,
+        "theory_state_before": "none",
+        "theory_state_after": "none",
+    }
+    base.update(row)
+    return pd.DataFrame([base])
+
+
+class SignalBulkWriterTest(unittest.TestCase):
+    def test_single_delete_prefetch_and_executemany_in_one_commit(self) -> None:
+        signal_date = date(2026, 4, 29)
+        entries = [
+            (
+                20,
+                "棕榈油",
+                _signal_frame(
+                    signal_date,
+                    A_CLOSE_LONG=True,
+                    signal_role="close",
+                    direction="LONG",
+                    cycle_id="20-LONG-2026-04-23",
+                    related_open_date=date(2026, 4, 23),
+                    theory_state_before="long",
+                ),
+            ),
+            (
+                21,
+                "豆粕",
+                _signal_frame(
+                    signal_date,
+                    A_OPEN_SHORT=True,
+                    main_score=0.9,
+                    signal_role="open",
+                    direction="SHORT",
+                    cycle_id="21-SHORT-2026-04-29",
+                    theory_state_after="short",
+                ),
+            ),
+            (22, "玉米", _signal_frame(signal_date)),
+        ]
+        conn = BulkConnection()
+        conn.open_rows = [
+            {"id": 50, "variety_id": 20, "cycle_id": "20-LONG-2026-04-23"},
+            {"id": 88, "variety_id": 20, "cycle_id": "20-LONG-2026-04-23"},
+        ]
+        state_rows = [(20, signal_date, "none", None, None)]
+
+        rows_by_variety = {vid: signal_rows(df, 0, vid, name) for vid, name, df in entries}
+        inserted = save_signals_bulk(conn, signal_date, rows_by_variety, state_rows)
+
+        self.assertEqual(inserted, 2)
+        self.assertEqual(conn.commits, 1)
+        sqls = [sql for sql, _ in conn.statements]
+        self.assertEqual(sum(sql.startswith("DELETE FROM trading_signals") for sql in sqls), 1)
+        self.assertEqual(conn.statements[0][1], (signal_date, 20, 21, 22))
+        self.assertEqual(sum("FROM trading_signals" in sql and sql.startswith("SELECT") for sql in sqls), 1)
+
+        insert_rows = next(args for sql, args in conn.statements if sql.startswith("INSERT INTO trading_signals"))
+        self.assertEqual(len(insert_rows), 2)
+        close_row = next(r for r in insert_rows if r[3] == "A_CLOSE_LONG")
+        open_row = next(r for r in insert_rows if r[3] == "A_OPEN_SHORT")
+        self.assertEqual(close_row[7], 88)
+        self.assertEqual(close_row[8], date(2026, 4, 23))
+        self.assertIsNone(close_row[11])
+        self.assertIsNone(open_row[7])
+        self.assertAlmostEqual(open_row[11], 0.9)
+
+        state_args = next(args for sql, args in conn.statements if sql.startswith("INSERT INTO trading_signal_state"))
+        self.assertEqual(state_args, state_rows)
+
+    def test_failing_variety_is_skipped_without_losing_the_batch(self) -> None:
+        signal_date = date(2026, 4, 29)
+        frames = {
+            20: _signal_frame(signal_date, A_OPEN_LONG=True, main_score=0.8, signal_role="open",
+                              direction="LONG", cycle_id="20-LONG-2026-04-29", theory_state_after="long"),
+            21: _signal_frame(signal_date, A_OPEN_SHORT=True, main_score=0.9, signal_role="open",
+                              direction="SHORT", cycle_id="21-SHORT-2026-04-29", theory_state_after="short"),
+        }
+        names = pd.DataFrame({"id": [20, 21], "name": ["棕榈油", "豆粕"]})
+
+        def rows(signal_df, idx_pos, variety_id, variety_name, cols=None):
+            if variety_id == 21:
+                raise ValueError("bad extra_json")
+            return signal_rows(signal_df, idx_pos, variety_id, variety_name, cols)
+
+        conn = BulkConnection()
+        with mock.patch("trading.strategies.data_loader.load_variety_map", return_value=names), \
+                mock.patch("trading.strategies.data_loader.load_all_varieties_data", return_value=frames), \
+                mock.patch.object(signals, "compute_frames", return_value=frames), \
+                mock.patch.object(signals, "signal_rows", side_effect=rows):
+            results = run_signals_for_all(conn, signal_date)
+
+        self.assertEqual(results, {"棕榈油": ["A_OPEN_LONG"]})
+        self.assertEqual(conn.commits, 1)
+        delete_args = next(args for sql, args in conn.statements if sql.startswith("DELETE FROM trading_signals"))
+        self.assertEqual(delete_args, (signal_date, 20))
+        insert_rows = next(args for sql, args in conn.statements if sql.startswith("INSERT INTO trading_signals"))
+        self.assertEqual([(r[1], r[3]) for r in insert_rows], [(20, "A_OPEN_LONG")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import json
+import math
+import unittest
+
+import numpy as np
+
+from trading.strategies.engine import SignalEngine
+from trading.strategies.signals import compute_signals
+from trading.strategies.tests.test_signal_state_machine import _random_strength_frame
+
+_COMPARED_COLS = (
+    "A_OPEN_LONG",
+    "A_OPEN_SHORT",
+    "A_CLOSE_LONG",
+    "A_CLOSE_SHORT",
+    "signal_role",
+    "direction",
+    "cycle_id",
+    "related_open_date",
+    "theory_state_before",
+    "theory_state_after",
+)
+
+
+class SignalEngineTest(unittest.TestCase):
+    def test_streaming_matches_compute_signals(self) -> None:
+        rng = np.random.default_rng(404)
+        frames = {vid: _random_strength_frame(rng, int(rng.integers(1, 300))) for vid in range(1, 7)}
+        expected = {vid: compute_signals(df, vid) for vid, df in frames.items()}
+
+        engine = SignalEngine()
+        # 各品种交替推入，中途经 JSON 序列化恢复引擎
+        longest = max(len(df) for df in frames.values())
+        total_events = 0
+        for i in range(longest):
+            if i == longest // 2:
+                engine = SignalEngine.from_dict(json.loads(json.dumps(engine.to_dict())))
+            for vid, df in frames.items():
+                if i >= len(df):
+                    continue
+                bar = df.iloc[i]
+                got = engine.update(vid, bar["trade_date"], bar["main_force"], bar["retail"], bar["close"])
+                exp = expected[vid].iloc[i]
+                for col in _COMPARED_COLS:
+                    exp_val = None if exp[col] is None or exp[col] != exp[col] else exp[col]
+                    self.assertEqual(got[col], exp_val, f"variety={vid} row={i} col={col}")
+                if math.isnan(exp["main_score"]):
+                    self.assertTrue(math.isnan(got["main_score"]))
+                else:
+                    self.assertEqual(got["main_score"], exp["main_score"])
+                total_events += got["signal_role"] is not None
+        self.assertGreater(total_events, 0)
+
+    def test_rejects_non_increasing_dates(self) -> None:
+        engine = SignalEngine()
+        engine.update(1, "2024-01-02", 1.0, -1.0, 100.0)
+        with self.assertRaises(ValueError):
+            engine.update(1, "2024-01-02", 2.0, -2.0, 101.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
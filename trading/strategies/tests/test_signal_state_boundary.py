@@ -14,6 +14,7 @@ class FakeCursor:
     def __init__(self, conn: FakeConnection) -> None:
         self.conn = conn
         self.last_sql = ""
+        self.last_args = None
 
     def __enter__(self) -> FakeCursor:
         return self
@@ -23,12 +24,17 @@ class FakeCursor:
 
     def execute(self, sql: str, args=None) -> None:
         self.last_sql = " ".join(sql.split())
+        self.last_args = args
         if self.last_sql.startswith("INSERT INTO trading_signals"):
             self.conn.inserted_signals.append(args)
             self.conn.lastrowid = len(self.conn.inserted_signals)
         elif self.last_sql.startswith("UPDATE trading_positions SET"):
             self.conn.position_updates.append(args)
 
+    def executemany(self, sql: str, seq) -> None:
+        for args in seq:
+            self.execute(sql, args)
+
     def fetchone(self):
         if "FROM trading_signals" in self.last_sql and "signal_role='open'" in self.last_sql:
             return self.conn.related_open_row
@@ -41,6 +47,8 @@ class FakeCursor:
             return self.conn.close_signals
         if "FROM trading_positions" in self.last_sql and "status='open'" in self.last_sql:
             return self.conn.open_positions
+        if "FROM fut_daily_close" in self.last_sql:
+            return [{"variety_id": vid, "close_price": 9780.0} for vid in self.last_args[1:]]
         return []
 
 
@@ -60,6 +68,9 @@ class FakeConnection:
     def commit(self) -> None:
         self.commits += 1
 
+    def rollback(self) -> None:
+        return None
+
 
 class SignalStateBoundaryTest(unittest.TestCase):
     def test_save_signals_persists_theoretical_close_with_own_cycle_metadata(self) -> None:
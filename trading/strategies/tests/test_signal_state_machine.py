@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from datetime import date
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from trading.strategies.signals import _scan_theory_state, compute_signals, make_cycle_id
+
+
+def _legacy_state_machine(
+    trade_dates: list[date],
+    open_long: np.ndarray,
+    open_short: np.ndarray,
+    close_long: np.ndarray,
+    close_short: np.ndarray,
+    variety_id: int | None,
+) -> dict[str, list]:
+    """原逐行状态机实现，作为等价性校验基准。"""
+    current_state = "none"
+    current_cycle_id: str | None = None
+    current_open_date: date | None = None
+    cols: dict[str, list] = {
+        "A_CLOSE_LONG": [],
+        "A_CLOSE_SHORT": [],
+        "signal_role": [],
+        "direction": [],
+        "cycle_id": [],
+        "related_open_date": [],
+        "theory_state_before": [],
+        "theory_state_after": [],
+    }
+    for i, trade_date in enumerate(trade_dates):
+        state_before = current_state
+        role = direction = row_cycle_id = row_open_date = None
+        close_long_allowed = close_short_allowed = False
+        if close_long[i] and current_state == "long":
+            role, direction = "close", "LONG"
+            row_cycle_id, row_open_date = current_cycle_id, current_open_date
+            close_long_allowed = True
+            current_state, current_cycle_id, current_open_date = "none", None, None
+        elif close_short[i] and current_state == "short":
+            role, direction = "close", "SHORT"
+            row_cycle_id, row_open_date = current_cycle_id, current_open_date
+            close_short_allowed = True
+            current_state, current_cycle_id, current_open_date = "none", None, None
+        elif open_long[i]:
+            role, direction = "open", "LONG"
+            row_cycle_id = make_cycle_id(variety_id, direction, trade_date)
+            current_state, current_cycle_id, current_open_date = "long", row_cycle_id, trade_date
+        elif open_short[i]:
+            role, direction = "open", "SHORT"
+            row_cycle_id = make_cycle_id(variety_id, direction, trade_date)
+            current_state, current_cycle_id, current_open_date = "short", row_cycle_id, trade_date
+        cols["A_CLOSE_LONG"].append(close_long_allowed)
+        cols["A_CLOSE_SHORT"].append(close_short_allowed)
+        cols["signal_role"].append(role)
+        cols["direction"].append(direction)
+        cols["cycle_id"].append(row_cycle_id)
+        cols["related_open_date"].append(row_open_date)
+        cols["theory_state_before"].append(state_before)
+        cols["theory_state_after"].append(current_state)
+    return cols
+
+
+def _random_strength_frame(rng: np.random.Generator, n: int) -> pd.DataFrame:
+    # 带周期摆动的随机序列，保证开仓条件能被触发
+    t = np.arange(n)
+    main_force = 20 * np.sin(t / rng.uniform(3, 8)) + rng.normal(0, 4, n)
+    retail = -0.5 * main_force + rng.normal(0, 3, n)
+    gaps = rng.choice([1, 1, 1, 1, 3, 9], size=n)
+    dates = pd.Timestamp("2020-01-01") + pd.to_timedelta(np.cumsum(gaps), unit="D")
+    return pd.DataFrame(
+        {
+            "trade_date": dates,
+            "main_force": main_force,
+            "retail": retail,
+            "close": 1000 + np.cumsum(rng.normal(0, 5, n)),
+        }
+    )
+
+
+class TheoryStateMachineEquivalenceTest(unittest.TestCase):
+    def test_scan_matches_legacy_loop_on_random_flags(self) -> None:
+        rng = np.random.default_rng(7)
+        for trial in range(50):
+            n = int(rng.integers(0, 300))
+            flags = [rng.random(n) < p for p in rng.uniform(0.02, 0.4, 4)]
+            dates = list(pd.date_range("2021-01-01", periods=n, freq="D").date)
+            expected = _legacy_state_machine(dates, *flags, variety_id=trial)
+
+            role, direction, state_after, open_pos = _scan_theory_state(*flags)
+            with self.subTest(trial=trial):
+                self.assertEqual([[None, "open", "close"][r] for r in role], expected["signal_role"])
+                self.assertEqual([[None, "LONG", "SHORT"][d] for d in direction], expected["direction"])
+                self.assertEqual(
+                    [["none", "long", "short"][s] for s in state_after], expected["theory_state_after"]
+                )
+                self.assertEqual(
+                    [dates[j] if r == 2 else None for r, j in zip(role, open_pos)],
+                    expected["related_open_date"],
+                )
+
+    def test_compute_signals_matches_legacy_loop_on_random_series(self) -> None:
+        rng = np.random.default_rng(2026)
+        checked_cols = [
+            "A_CLOSE_LONG",
+            "A_CLOSE_SHORT",
+            "signal_role",
+            "direction",
+            "cycle_id",
+            "related_open_date",
+            "theory_state_before",
+            "theory_state_after",
+        ]
+        total_opens = 0
+        for trial in range(30):
+            df = _random_strength_frame(rng, int(rng.integers(10, 600)))
+            out = compute_signals(df, variety_id=trial)
+            raw_close_long = (out["cont3"] & out["m3"].lt(0)).to_numpy(dtype=bool)
+            raw_close_short = (out["cont3"] & out["m3"].gt(0)).to_numpy(dtype=bool)
+            expected = _legacy_state_machine(
+                list(out["trade_date"].dt.date),
+                out["A_OPEN_LONG"].to_numpy(dtype=bool),
+                out["A_OPEN_SHORT"].to_numpy(dtype=bool),
+                raw_close_long,
+                raw_close_short,
+                variety_id=trial,
+            )
+            total_opens += int(out["A_OPEN_LONG"].sum() + out["A_OPEN_SHORT"].sum())
+            for col in checked_cols:
+                with self.subTest(trial=trial, col=col):
+                    # 原实现把 list 直接赋给列，这里用同样的方式构造基准列，连 dtype 一并比较
+                    pd.testing.assert_series_equal(
+                        out[col], pd.Series(expected[col], index=out.index, name=col)
+                    )
+            pd.testing.assert_series_equal(
+                out["signal_state"],
+                pd.Series(expected["theory_state_after"], index=out.index, name="signal_state"),
+            )
+        self.assertGreater(total_opens, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from trading.strategies.account import execute_close_signals, execute_open_operations, update_account_daily
+from trading.strategies.account_metrics import METRIC_COLUMNS
+from trading.strategies.operations import generate_operations
+from trading.strategies.signals import compute_signals, signal_rows
+from trading.strategies.simulator import build_signal_book, compare_with_database, simulate
+from trading.strategies.tests.test_signal_state_machine import _random_strength_frame
+
+SECTORS = ["有色金属", "黑色系", "化工能化", "农产品"]
+
+
+class PipelineCursor:
+    """覆盖 daily_run Step 2~5 全部 SQL 的内存表实现。"""
+
+    def __init__(self, conn: PipelineConnection) -> None:
+        self.conn = conn
+        self._rows: list[dict] = []
+
+    def __enter__(self) -> PipelineCursor:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def execute(self, sql: str, args=()) -> None:
+        sql = " ".join(sql.split())
+        c = self.conn
+        if sql.startswith("SELECT variety_id, variety_name, sector FROM trading_pool"):
+            self._rows = [{"variety_id": v, **p} for v, p in c.pool.items()]
+        elif sql.startswith("SELECT variety_id, variety_name, direction, sector FROM trading_positions"):
+            self._rows = [p for p in c.positions if p["status"] == "open" and p["open_date"] < args[0]]
+        elif sql.startswith("SELECT variety_id FROM trading_positions WHERE close_date=%s"):
+            self._rows = [p for p in c.positions if p["status"] == "closed" and p["close_date"] == args[0]]
+        elif sql.startswith("SELECT id, variety_id, variety_name, signal_type, direction, cycle_id, main_score"):
+            self._rows = [s for s in c.signals if s["signal_date"] == args[0] and s["signal_role"] == "open"]
+        elif sql.startswith("SELECT id, variety_id, direction, signal_type, cycle_id FROM trading_signals"):
+            self._rows = [s for s in c.signals if s["signal_date"] == args[0] and s["signal_role"] == "close"]
+        elif sql.startswith("DELETE FROM trading_operations"):
+            c.operations = [o for o in c.operations if not args[0] <= o["signal_date"] <= args[1]]
+        elif sql.startswith("SELECT id, variety_id, direction, open_price, theory_cycle_id FROM trading_positions"):
+            self._rows = [p for p in c.positions if p["status"] == "open"]
+        elif sql.startswith("SELECT variety_id, close_price FROM fut_daily_close WHERE trade_date=%s"):
+            self._rows = [
+                {"variety_id": v, "close_price": c.closes[v][args[0]]}
+                for v in args[1:] if args[0] in c.closes.get(v, {})
+            ]
+        elif sql.startswith("SELECT id, signal_id, variety_id, variety_name, sector, signal_type"):
+            self._rows = [o for o in c.operations if o["signal_date"] == args[0] and o["is_selected"] == 1]
+        elif sql.startswith("SELECT id, variety_id FROM trading_positions WHERE open_date=%s"):
+            self._rows = [
+                p for p in c.positions
+                if p["open_date"] == args[0] and p["status"] == "open" and p["variety_id"] in args[1:]
+            ]
+        elif sql.startswith("SELECT equity FROM trading_account_daily"):
+            before = [d for d in c.account if d < args[0]]
+            self._rows = [{"equity": c.account[max(before)]["equity"]}] if before else []
+        elif sql.startswith("SELECT variety_id, direction, open_price, open_date, size_pct, sector FROM trading_positions"):
+            self._rows = [p for p in c.positions if p["status"] == "open"]
+        elif sql.startswith("SELECT variety_id, direction, open_price, open_date, close_price, size_pct"):
+            self._rows = [p for p in c.positions if p["status"] == "closed" and p["close_date"] == args[0]]
+        elif sql.startswith("SELECT close_price FROM fut_daily_close WHERE variety_id=%s AND trade_date=%s"):
+            price = c.closes.get(args[0], {}).get(args[1])
+            self._rows = [{"close_price": price}] if price is not None else []
+        elif sql.startswith("SELECT close_price FROM fut_daily_close WHERE variety_id=%s AND trade_date<%s"):
+            prior = [d for d in c.closes.get(args[0], {}) if d < args[1]]
+            self._rows = [{"close_price": c.closes[args[0]][max(prior)]}] if prior else []
+        elif sql.startswith("INSERT INTO trading_account_daily"):
+            c.account[args[0]] = dict(zip(("equity", "cash", "position_val", "daily_pnl"), args[1:]))
+        elif sql.startswith("SELECT record_date, trading_days"):
+            before = [d for d in c.metrics if d < args[0]]
+            self._rows = [c.metrics[max(before)]] if before else []
+        elif sql.startswith("INSERT INTO trading_account_metrics"):
+            row = dict(zip(METRIC_COLUMNS, args))
+            c.metrics[row["record_date"]] = row
+        # compare_with_database 的三条读取
+        elif sql.startswith("SELECT signal_date, variety_id, signal_type, is_selected"):
+            self._rows = [o for o in c.operations if args[0] <= o["signal_date"] <= args[1]]
+        elif sql.startswith("SELECT variety_id, direction, open_date, open_price, status, close_date, close_price"):
+            self._rows = [p for p in c.positions if args[0] <= p["open_date"] <= args[1]]
+        elif sql.startswith("SELECT record_date, equity FROM trading_account_daily"):
+            self._rows = [{"record_date": d, **r} for d, r in c.account.items() if args[0] <= d <= args[1]]
+        else:
+            raise AssertionError(f"unexpected SQL: {sql}")
+
+    def executemany(self, sql: str, seq) -> None:
+        sql = " ".join(sql.split())
+        c = self.conn
+        for args in seq:
+            if sql.startswith("INSERT INTO trading_operations"):
+                keys = ("signal_id", "signal_date", "variety_id", "variety_name", "sector", "signal_type",
+                        "operation_type", "direction", "signal_cycle_id", "main_score", "is_selected",
+                        "reject_reason", "selection_rank", "extra_json")
+                c.operations.append({"id": c.next_id(), **dict(zip(keys, args))})
+            elif sql.startswith("UPDATE trading_positions SET status='closed'"):
+                pos = next(p for p in c.positions if p["id"] == args[4])
+                pos.update(
+                    status="closed", close_date=args[0], close_price=args[1], pnl_pct=args[2], close_signal_id=args[3]
+                )
+            elif sql.startswith("UPDATE trading_positions SET operation_id"):
+                pass
+            elif sql.startswith("INSERT INTO trading_positions"):
+                keys = ("operation_id", "open_operation_id", "open_signal_id", "theory_cycle_id", "variety_id",
+                        "variety_name", "sector", "direction", "open_date", "open_price", "size_pct")
+                c.positions.append({"id": c.next_id(), **dict(zip(keys, args)), "status": "open",
+                                    "close_date": None, "close_price": None})
+            else:
+                raise AssertionError(f"unexpected SQL: {sql}")
+
+    def fetchone(self) -> dict | None:
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self) -> list[dict]:
+        return self._rows
+
+
+class PipelineConnection:
+    def __init__(self) -> None:
+        self.pool: dict[int, dict] = {}
+        self.signals: list[dict] = []
+        self.operations: list[dict] = []
+        self.positions: list[dict] = []
+        self.closes: dict[int, dict] = {}
+        self.account: dict = {}
+        self.metrics: dict = {}
+        self._seq = 0
+
+    def next_id(self) -> int:
+        self._seq += 1
+        return self._seq
+
+    def cursor(self) -> PipelineCursor:
+        return PipelineCursor(self)
+
+    def commit(self) -> None:
+        return None
+
+    def rollback(self) -> None:
+        return None
+
+
+def _market(seed: int) -> tuple[dict[int, pd.DataFrame], dict[int, str], dict[int, dict], dict[int, pd.DataFrame]]:
+    rng = np.random.default_rng(seed)
+    names, frames, closes, pool = {}, {}, {}, {}
+    for vid in range(1, 11):
+        df = _random_strength_frame(rng, 300)
+        names[vid] = f"v{vid:02d}"
+        frames[vid] = compute_signals(df, vid)
+        closes[vid] = pd.DataFrame({"trade_date": df["trade_date"].dt.date, "close_price": df["close"]})
+        if vid <= 8:
+            pool[vid] = {"variety_name": names[vid], "sector": SECTORS[vid % 4]}
+    return frames, names, pool, closes
+
+
+def insert_signals(conn: PipelineConnection, frames, names, dates, row_at: dict | None = None) -> None:
+    """把 dates 各日的信号行（由生产写表逻辑 signal_rows 生成）逐日追加到内存表。"""
+    if row_at is None:
+        row_at = {vid: {d: i for i, d in enumerate(df["trade_date"].dt.date)} for vid, df in frames.items()}
+    for d in dates:
+        for vid in sorted(frames):
+            if d not in row_at[vid]:
+                continue
+            for args in signal_rows(frames[vid], row_at[vid][d], vid, names[vid]):
+                conn.signals.append({
+                    "id": conn.next_id(), "signal_date": args[0], "variety_id": args[1],
+                    "variety_name": args[2], "signal_type": args[3], "signal_role": args[4],
+                    "direction": args[5], "cycle_id": args[6], "main_score": args[11],
+                })
+
+
+def run_pipeline(conn: PipelineConnection, frames, names, pool, closes, dates: list | None = None) -> list:
+    """按 daily_run 的顺序逐日执行 Step 1~5，返回运行日期；dates 默认为全部交易日。"""
+    if dates is None:
+        dates = sorted({d for s in closes.values() for d in s["trade_date"]})
+    conn.pool = pool
+    conn.closes = {vid: dict(zip(s["trade_date"], s["close_price"])) for vid, s in closes.items()}
+    row_at = {vid: {d: i for i, d in enumerate(df["trade_date"].dt.date)} for vid, df in frames.items()}
+    for d in dates:
+        insert_signals(conn, frames, names, [d], row_at)
+        generate_operations(conn, d)
+        closed_today = execute_close_signals(conn, d)
+        execute_open_operations(conn, d, closed_today)
+        update_account_daily(conn, d)
+    return dates
+
+
+class SimulatorTest(unittest.TestCase):
+    def test_simulation_matches_daily_run_writes(self) -> None:
+        for seed in range(2):
+            frames, names, pool, closes = _market(seed)
+            conn = PipelineConnection()
+            dates = run_pipeline(conn, frames, names, pool, closes)
+
+            result = simulate(build_signal_book(frames, names), closes, pool, dates)
+
+            with self.subTest(seed=seed):
+                self.assertGreater(len(result["trades"]), 5)
+                self.assertIn(0, set(result["operations"]["is_selected"]))
+                self.assertEqual(compare_with_database(conn, result, dates[0], dates[-1], rel_tol=1e-12), [])
+                np.testing.assert_allclose(
+                    result["equity"]["cash"], [conn.account[d]["cash"] for d in dates], rtol=1e-12
+                )
+
+    def test_signal_book_matches_signal_rows(self) -> None:
+        frames, names, _, _ = _market(5)
+        book = build_signal_book(frames, names)
+        expected = []
+        for vid, df in frames.items():
+            for i in range(len(df)):
+                expected.extend(
+                    (a[0], a[1], a[3], a[4], a[5], a[6], a[11]) for a in signal_rows(df, i, vid, names[vid])
+                )
+        got = [
+            (s["signal_date"], s["variety_id"], s["signal_type"], s["signal_role"], s["direction"],
+             s["cycle_id"], s["main_score"])
+            for rows in book.values() for s in rows
+        ]
+        self.assertEqual(sorted(got, key=repr), sorted(expected, key=repr))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import json
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from trading.strategies.panel import compute_panel_signals, stack_variety_frames
+from trading.strategies.settings import LEVERAGE, TARGET_VARIETIES
+from trading.strategies.signals import compute_signals
+from trading.strategies.simulator import build_signal_book, simulate
+from trading.strategies.sweep import _pool_for, build_sweep_inputs, expand_grid, point_key, run_sweep, summarize
+from trading.strategies.tests.test_signal_state_machine import _random_strength_frame
+
+NAMES = ["沪铜", "沪铝", "沪金", "PTA", "豆粕", "玉米"]
+
+
+def _market(seed: int) -> tuple[dict[int, pd.DataFrame], dict[int, str], dict[int, pd.DataFrame]]:
+    rng = np.random.default_rng(seed)
+    frames, names, closes = {}, {}, {}
+    for vid, name in enumerate(NAMES, start=1):
+        df = _random_strength_frame(rng, 250)
+        frames[vid] = df
+        names[vid] = name
+        closes[vid] = pd.DataFrame({"trade_date": df["trade_date"].dt.date, "close_price": df["close"]})
+    return frames, names, closes
+
+
+class ExpandGridTest(unittest.TestCase):
+    def test_defaults_and_size_pct_per_slot(self) -> None:
+        points = expand_grid({"MAX_SLOTS": [2, 4], "SIZE_PCT": [None], "MOMENTUM_LOOKBACK": [30, 20]})
+        self.assertEqual([(p["MOMENTUM_LOOKBACK"], p["MAX_SLOTS"]) for p in points], [(20, 2), (20, 4), (30, 2), (30, 4)])
+        self.assertEqual([p["SIZE_PCT"] for p in points], [0.5, 0.25, 0.5, 0.25])
+        self.assertTrue(all(p["LEVERAGE"] == LEVERAGE and p["TARGET_POOL"] == TARGET_VARIETIES for p in points))
+
+        with self.assertRaises(ValueError):
+            expand_grid({"TURN_WINDOW": [3]})
+
+    def test_summarize(self) -> None:
+        equity = pd.DataFrame({
+            "record_date": [date(2020, 1, 1), date(2020, 7, 1), date(2021, 1, 1)],
+            "equity": [33000.0, 29700.0, 36000.0],
+        })
+        metrics = summarize(equity, pd.DataFrame(index=range(4)), 30000.0)
+        self.assertAlmostEqual(metrics["cagr"], 1.2 ** (365.25 / 366) - 1)
+        self.assertAlmostEqual(metrics["max_drawdown"], 0.1)
+        self.assertEqual((metrics["final_equity"], metrics["trades"]), (36000.0, 4))
+
+
+class BackgroundWindowTest(unittest.TestCase):
+    def test_background_columns_follow_window(self) -> None:
+        frames, _, _ = _market(3)
+        panel = stack_variety_frames(frames)
+        default = compute_panel_signals(panel)
+        for w in (3, 4, 6):
+            result = compute_panel_signals(panel, background_window=w)
+            for vid, df in frames.items():
+                out = result[vid]
+                for k in range(1, w + 1):
+                    np.testing.assert_array_equal(out[f"bg{k}"], df["main_force"].shift(w + 2 - k))
+                np.testing.assert_array_equal(out["m3"], default[vid]["m3"])
+                cont = out["date_cont"].astype(int).rolling(w + 1, min_periods=w + 1).sum().eq(w + 1)
+                np.testing.assert_array_equal(out["cont7"], cont)
+
+
+class RunSweepTest(unittest.TestCase):
+    def test_parallel_sweep_matches_direct_simulation_and_resumes(self) -> None:
+        frames, names, closes = _market(8)
+        inputs = build_sweep_inputs(stack_variety_frames(frames), names, closes)
+        points = expand_grid({
+            "MAX_SLOTS": [2, 3], "LEVERAGE": [5.0, 10.0], "MOMENTUM_LOOKBACK": [20, 30],
+            "TARGET_POOL": [NAMES[:4], NAMES],
+        })
+        dates = inputs["dates"]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp) / "results.jsonl"
+            self.assertEqual(run_sweep(inputs, points, out, workers=2, batch_size=3), len(points))
+            rows = {point_key(r): r for r in map(json.loads, out.read_text(encoding="utf-8").splitlines())}
+            self.assertEqual(len(rows), len(points))
+
+            for p in points:
+                book = build_signal_book(
+                    {vid: compute_signals(df, vid, p["MOMENTUM_LOOKBACK"]) for vid, df in frames.items()}, names
+                )
+                result = simulate(
+                    book, closes, _pool_for(names, p["TARGET_POOL"]), dates,
+                    max_slots=p["MAX_SLOTS"], size_pct=p["SIZE_PCT"], leverage=p["LEVERAGE"],
+                )
+                expected = summarize(result["equity"], result["trades"])
+                got = rows[point_key(p)]
+                self.assertEqual(got["trades"], expected["trades"])
+                for key in ("final_equity", "cagr", "max_drawdown"):
+                    self.assertAlmostEqual(got[key], expected[key], places=9)
+
+            # 续扫：已完成的组合跳过，只补跑缺失的行
+            self.assertEqual(run_sweep(inputs, points, out, workers=2), 0)
+            lines = out.read_text(encoding="utf-8").splitlines()
+            out.write_text("\n".join(lines[:-5]) + "\n", encoding="utf-8")
+            self.assertEqual(run_sweep(inputs, points, out, workers=1), 5)
+            content = out.read_text(encoding="utf-8")
+            self.assertEqual(len(content.splitlines()), len(points))
+            spans = {(r["start"], r["end"]) for r in map(json.loads, content.splitlines())}
+            self.assertEqual(spans, {(dates[0].isoformat(), dates[-1].isoformat())})
+
+            # 换了区间的续扫被拒绝，结果文件不变
+            with self.assertRaises(ValueError):
+                run_sweep(inputs, points, out, workers=1, end=dates[-10])
+            self.assertEqual(out.read_text(encoding="utf-8"), content)
+
+
+if __name__ == "__main__":
+    unittest.main()
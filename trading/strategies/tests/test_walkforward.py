@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from trading.strategies import walkforward
+from trading.strategies.account import close_pnl_pct
+from trading.strategies.signals import compute_signals
+from trading.strategies.tests.test_signal_state_machine import _random_strength_frame
+from trading.strategies.walkforward import (
+    evaluate_walk_forward,
+    load_variety_trades,
+    out_of_sample_ranking,
+    theory_trades,
+    walk_forward_windows,
+)
+
+
+def _trades(rows: list[tuple[date, float]]) -> pd.DataFrame:
+    return pd.DataFrame(
+        [(d, d, "LONG", 100.0, 100.0 * (1 + r), r) for d, r in rows], columns=walkforward.TRADE_COLUMNS
+    )
+
+
+class TheoryTradesTest(unittest.TestCase):
+    def test_pairs_each_close_with_its_cycle_open(self) -> None:
+        rng = np.random.default_rng(4)
+        sig = compute_signals(_random_strength_frame(rng, 1500), 1)
+        trades = theory_trades(sig)
+
+        closes = sig[sig["signal_role"] == "close"]
+        self.assertGreater(len(closes), 2)
+        self.assertEqual(len(trades), len(closes))
+        price = dict(zip(sig["trade_date"].dt.date, sig["close"]))
+        for t, (_, c) in zip(trades.itertuples(index=False), closes.iterrows()):
+            self.assertEqual(c["cycle_id"], f"1-{t.direction}-{t.open_date.isoformat()}")
+            self.assertEqual(t.close_date, c["trade_date"].date())
+            self.assertEqual(t.pnl_pct, close_pnl_pct(t.direction, price[t.open_date], price[t.close_date]))
+
+
+class TradeCacheTest(unittest.TestCase):
+    def test_only_changed_varieties_are_recomputed(self) -> None:
+        rng = np.random.default_rng(9)
+        frames = {vid: _random_strength_frame(rng, 300) for vid in range(1, 5)}
+        real = walkforward.compute_panel_signals
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(
+            walkforward, "compute_panel_signals", side_effect=real
+        ) as spy:
+            cache = Path(tmp)
+            first = load_variety_trades(frames, cache)
+            second = load_variety_trades(frames, cache)
+            self.assertEqual(spy.call_count, 1)
+            for vid in frames:
+                pd.testing.assert_frame_equal(second[vid], first[vid], check_dtype=False)
+
+            frames[3] = frames[3].assign(main_force=frames[3]["main_force"] * 1.5)
+            third = load_variety_trades(frames, cache)
+            self.assertEqual(spy.call_count, 2)
+            recomputed = spy.call_args[0][0].index.get_level_values("variety_id").unique().tolist()
+            self.assertEqual(recomputed, [3])
+            pd.testing.assert_frame_equal(third[3], theory_trades(compute_signals(frames[3], 3)), check_dtype=False)
+
+
+class EvaluateWalkForwardTest(unittest.TestCase):
+    def test_windows(self) -> None:
+        self.assertEqual(
+            walk_forward_windows(date(2020, 1, 15), date(2021, 2, 1), 12, 6),
+            [(date(2020, 1, 15), date(2021, 1, 15), date(2021, 7, 15))],
+        )
+        self.assertEqual(len(walk_forward_windows(date(2020, 1, 1), date(2022, 12, 31), 12, 3)), 8)
+
+    def test_rank_select_and_out_of_sample(self) -> None:
+        names = {1: "沪铜", 2: "沪铝", 3: "沪锌", 4: "豆粕", 5: "玉米"}
+        train = [date(2020, 2, 1), date(2020, 5, 1), date(2020, 9, 1)]
+        test = [date(2021, 2, 1), date(2021, 3, 1), date(2021, 4, 1)]
+        trades = {
+            1: _trades([(d, 0.05) for d in train] + [(d, -0.01) for d in test]),
+            2: _trades([(d, 0.04) for d in train] + [(d, 0.02) for d in test]),
+            3: _trades([(d, 0.03) for d in train]),
+            4: _trades([(d, -0.02) for d in train] + [(test[0], 0.10)]),
+            5: _trades([(train[0], 0.50), (date(2020, 1, 1), 0.0)] + [(d, 0.01) for d in test]),
+        }
+        detail = evaluate_walk_forward(trades, names, 12, 6, pool_size=3, max_per_sector=2, min_trades=3)
+
+        self.assertEqual(detail["test_start"].unique().tolist(), [date(2021, 1, 1)])
+        by_name = detail.set_index("variety_name")
+        # 玉米训练期只有 2 笔，排到最后；沪锌受同板块上限约束落选；豆粕训练期亏损落选
+        self.assertEqual(by_name["rank"].to_dict(), {"沪铜": 1, "沪铝": 2, "沪锌": 3, "豆粕": 4, "玉米": 5})
+        self.assertEqual(by_name["selected"].to_dict(), {"沪铜": 1, "沪铝": 1, "沪锌": 0, "豆粕": 0, "玉米": 0})
+        self.assertAlmostEqual(by_name.loc["沪铜", "train_ret"], 1.05 ** 3 - 1)
+        self.assertAlmostEqual(by_name.loc["沪铝", "test_ret"], 1.02 ** 3 - 1)
+        self.assertEqual(by_name.loc["玉米", "train_trades"], 2)
+
+        ranking = out_of_sample_ranking(detail)
+        self.assertEqual(ranking["variety_name"].tolist(), ["豆粕", "沪铝", "玉米", "沪锌", "沪铜"])
+        self.assertEqual(ranking.set_index("variety_name")["in_pool_windows"].to_dict()["沪铜"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
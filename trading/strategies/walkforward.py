@@ -0,0 +1,295 @@
+"""
+池子 A 成员的滚动样本外评估（walk-forward）。
+对 VARIETY_SECTORS 中的全部品种逐个计算 A 通道理论周期，按信号日收盘价开平得到每笔理论交易的收益，
+结果按品种缓存到本地 .npz（以行情数据指纹失效）；之后按 (训练期, 测试期) 滚动窗口只做聚合：
+在训练期按收益排序给出建议池子，在紧随其后的测试期统计样本外表现。修改窗口长度重跑时不重算信号。
+
+缓存目录：--cache-dir 指定，默认 trading/.walkforward_cache。
+运行：python -m trading.strategies.walkforward [--train-months 24] [--test-months 6] [--pool-size 12] [--out DIR]
+      结果只作建议，不改动 trading_pool；启用 / 停用仍通过 PATCH /trading/pool/variety/<id>
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import numpy as np
+import pandas as pd
+import pymysql
+
+from trading.strategies.account import close_pnl_pct
+from trading.strategies.panel import compute_panel_signals, stack_variety_frames
+from trading.strategies.settings import BACKGROUND_WINDOW, DEFAULT_SECTOR, TARGET_POOL, VARIETY_SECTORS
+
+logger = logging.getLogger("walkforward")
+
+_DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / ".walkforward_cache"
+_FINGERPRINT_FILE = "meta.json"
+TRADE_COLUMNS = ["open_date", "close_date", "direction", "open_price", "close_price", "pnl_pct"]
+
+
+def theory_trades(signal_df: pd.DataFrame) -> pd.DataFrame:
+    """由 compute_signals 结果提取已平仓的理论周期：信号日收盘价开仓、平仓信号日收盘价平仓。"""
+    if signal_df.empty:
+        return pd.DataFrame(columns=TRADE_COLUMNS)
+    dates = signal_df["trade_date"].dt.date.to_numpy()
+    closes = signal_df["close"].to_numpy(dtype=float)
+    row_of = {d: i for i, d in enumerate(dates)}
+    is_close = (signal_df["signal_role"] == "close").to_numpy()
+    rows = []
+    for i, direction, open_date in zip(
+        np.flatnonzero(is_close),
+        signal_df["direction"].to_numpy()[is_close],
+        signal_df["related_open_date"].to_numpy()[is_close],
+    ):
+        j = row_of.get(open_date)
+        if j is None or closes[j] == 0:
+            continue
+        rows.append((open_date, dates[i], direction, closes[j], closes[i], close_pnl_pct(direction, closes[j], closes[i])))
+    return pd.DataFrame(rows, columns=TRADE_COLUMNS)
+
+
+def _fingerprint(df: pd.DataFrame, background_window: int) -> str:
+    h = hashlib.sha1(str(background_window).encode())
+    h.update(df["trade_date"].to_numpy(dtype="datetime64[D]").tobytes())
+    for col in ("main_force", "retail", "close"):
+        h.update(df[col].to_numpy(dtype=float).tobytes())
+    return h.hexdigest()
+
+
+def _trades_path(root: Path, variety_id: int) -> Path:
+    return root / f"trades_{variety_id}.npz"
+
+
+def _read_trades(path: Path) -> pd.DataFrame:
+    with np.load(path) as data:
+        return pd.DataFrame(
+            {
+                "open_date": data["open_day"].astype("datetime64[D]").astype(object),
+                "close_date": data["close_day"].astype("datetime64[D]").astype(object),
+                "direction": np.where(data["long"], "LONG", "SHORT"),
+                "open_price": data["open_price"],
+                "close_price": data["close_price"],
+                "pnl_pct": data["pnl_pct"],
+            },
+            columns=TRADE_COLUMNS,
+        )
+
+
+def _read_fingerprints(root: Path) -> dict[str, str]:
+    """缓存目录中各品种缓存对应的行情指纹 {variety_id: sha1}。"""
+    path = root / _FINGERPRINT_FILE
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _write_fingerprints(root: Path, prints: dict[str, str]) -> None:
+    tmp = root / f"{_FINGERPRINT_FILE}.tmp"
+    tmp.write_text(json.dumps(prints, indent=2), encoding="utf-8")
+    os.replace(tmp, root / _FINGERPRINT_FILE)
+
+
+def _write_trades(path: Path, trades: pd.DataFrame) -> None:
+    tmp = path.with_name(path.stem + ".tmp.npz")
+    np.savez(tmp, **{
+        "open_day": np.array(trades["open_date"].tolist(), dtype="datetime64[D]").astype(np.int64),
+        "close_day": np.array(trades["close_date"].tolist(), dtype="datetime64[D]").astype(np.int64),
+        "long": (trades["direction"] == "LONG").to_numpy(),
+        "open_price": trades["open_price"].to_numpy(dtype=float),
+        "close_price": trades["close_price"].to_numpy(dtype=float),
+        "pnl_pct": trades["pnl_pct"].to_numpy(dtype=float),
+    })
+    os.replace(tmp, path)
+
+
+def load_variety_trades(
+    frames: dict[int, pd.DataFrame],
+    cache_dir: Path | None = _DEFAULT_CACHE_DIR,
+    background_window: int = BACKGROUND_WINDOW,
+) -> dict[int, pd.DataFrame]:
+    """返回 {variety_id: 理论交易表}；数据指纹未变的品种直接读缓存，其余用面板引擎一次算完并写回缓存。"""
+    meta = _read_fingerprints(cache_dir) if cache_dir is not None else {}
+    prints = {vid: _fingerprint(df, background_window) for vid, df in frames.items() if not df.empty}
+    result: dict[int, pd.DataFrame] = {}
+    stale: dict[int, pd.DataFrame] = {}
+    for vid, fp in prints.items():
+        if cache_dir is not None and meta.get(str(vid)) == fp and _trades_path(cache_dir, vid).exists():
+            result[vid] = _read_trades(_trades_path(cache_dir, vid))
+        else:
+            stale[vid] = frames[vid]
+    logger.info("理论交易：缓存命中 %d 个品种，重算 %d 个", len(result), len(stale))
+    if not stale:
+        return result
+
+    signals = compute_panel_signals(stack_variety_frames(stale), background_window=background_window)
+    for vid, sig_df in signals.items():
+        result[vid] = theory_trades(sig_df)
+    if cache_dir is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        for vid in signals:
+            _write_trades(_trades_path(cache_dir, vid), result[vid])
+            meta[str(vid)] = prints[vid]
+        _write_fingerprints(cache_dir, meta)
+    return result
+
+
+def walk_forward_windows(first: date, last: date, train_months: int, test_months: int) -> list[tuple[date, date, date]]:
+    """返回 [(train_start, test_start, test_end)]，训练期 [train_start, test_start)，测试期 [test_start, test_end)。"""
+    windows = []
+    test_start = pd.Timestamp(first) + pd.DateOffset(months=train_months)
+    while test_start <= pd.Timestamp(last):
+        train_start = test_start - pd.DateOffset(months=train_months)
+        test_end = test_start + pd.DateOffset(months=test_months)
+        windows.append((train_start.date(), test_start.date(), test_end.date()))
+        test_start = test_end
+    return windows
+
+
+def _period_stats(trades: dict[int, pd.DataFrame], lo: date, hi: date) -> dict[int, tuple[int, float, float]]:
+    """按平仓日落在 [lo, hi) 统计每个品种的 (笔数, 复利收益, 胜率)。"""
+    stats = {}
+    for vid, t in trades.items():
+        in_period = t.loc[(t["close_date"] >= lo) & (t["close_date"] < hi), "pnl_pct"].to_numpy(dtype=float)
+        n = len(in_period)
+        ret = float(np.prod(1 + in_period) - 1) if n else 0.0
+        stats[vid] = (n, ret, float((in_period > 0).mean()) if n else 0.0)
+    return stats
+
+
+def evaluate_walk_forward(
+    trades: dict[int, pd.DataFrame],
+    names: dict[int, str],
+    train_months: int = 24,
+    test_months: int = 6,
+    pool_size: int = len(TARGET_POOL),
+    max_per_sector: int = 3,
+    min_trades: int = 3,
+) -> pd.DataFrame:
+    """逐窗口在训练期排序并选出建议池子，附上同一批品种在测试期的样本外表现。
+
+    排序按训练期复利收益降序，训练期笔数不足 min_trades 的排在最后且不入选；
+    入选还要求训练期收益为正、同板块不超过 max_per_sector 个，最多 pool_size 个。
+    """
+    columns = [
+        "test_start", "train_start", "test_end", "variety_id", "variety_name", "sector", "rank", "selected",
+        "train_trades", "train_ret", "train_win_rate", "test_trades", "test_ret", "test_win_rate",
+    ]
+    closes = [d for t in trades.values() for d in t["close_date"]]
+    if not closes:
+        return pd.DataFrame(columns=columns)
+
+    rows = []
+    for train_start, test_start, test_end in walk_forward_windows(min(closes), max(closes), train_months, test_months):
+        train = _period_stats(trades, train_start, test_start)
+        test = _period_stats(trades, test_start, test_end)
+        order = sorted(trades, key=lambda v: (train[v][0] < min_trades, -train[v][1], names.get(v, "")))
+        per_sector: dict[str, int] = {}
+        picked = 0
+        for rank, vid in enumerate(order, start=1):
+            name = names.get(vid, str(vid))
+            sector = VARIETY_SECTORS.get(name, DEFAULT_SECTOR)
+            selected = (
+                picked < pool_size
+                and train[vid][0] >= min_trades
+                and train[vid][1] > 0
+                and per_sector.get(sector, 0) < max_per_sector
+            )
+            if selected:
+                picked += 1
+                per_sector[sector] = per_sector.get(sector, 0) + 1
+            rows.append((test_start, train_start, test_end, vid, name, sector, rank, int(selected), *train[vid], *test[vid]))
+    return pd.DataFrame(rows, columns=columns)
+
+
+def out_of_sample_ranking(detail: pd.DataFrame) -> pd.DataFrame:
+    """把各窗口测试期（互不重叠）首尾相接，按样本外复利收益给全部品种排序；in_pool_windows 为入选建议池子的窗口数。"""
+    if detail.empty:
+        return pd.DataFrame(columns=["variety_id", "variety_name", "sector", "oos_trades", "oos_ret", "in_pool_windows"])
+    ranking = (
+        detail.groupby(["variety_id", "variety_name", "sector"], as_index=False)
+        .agg(
+            oos_trades=("test_trades", "sum"),
+            oos_ret=("test_ret", lambda r: float(np.prod(1 + r.to_numpy(dtype=float)) - 1)),
+            in_pool_windows=("selected", "sum"),
+        )
+        .sort_values(["oos_ret", "variety_name"], ascending=[False, True])
+        .reset_index(drop=True)
+    )
+    return ranking
+
+
+def _load_all(conn: pymysql.Connection) -> tuple[dict[int, pd.DataFrame], dict[int, str]]:
+    from trading.strategies.data_loader import load_variety_map, load_varieties_data
+
+    variety_df = load_variety_map(conn)
+    names = {int(v): str(n) for v, n in zip(variety_df["id"], variety_df["name"]) if n in VARIETY_SECTORS}
+    return load_varieties_data(conn, list(names)), names
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description="池子 A 成员的滚动样本外评估")
+    parser.add_argument("--train-months", type=int, default=24, help="训练期月数")
+    parser.add_argument("--test-months", type=int, default=6, help="测试期月数，同时是窗口步长")
+    parser.add_argument("--pool-size", type=int, default=len(TARGET_POOL), help="建议池子最多品种数")
+    parser.add_argument("--max-per-sector", type=int, default=3, help="同板块最多入选品种数")
+    parser.add_argument("--min-trades", type=int, default=3, help="训练期最少理论交易笔数")
+    parser.add_argument("--cache-dir", default=str(_DEFAULT_CACHE_DIR), help="理论交易缓存目录")
+    parser.add_argument("--out", default=None, help="输出目录，写出 windows.csv / ranking.csv")
+    args = parser.parse_args()
+
+    from trading.strategies.db import get_connection
+    from trading.strategies.operations import get_pool_varieties
+
+    conn = get_connection()
+    try:
+        frames, names = _load_all(conn)
+        active = {names.get(v, str(v)) for v in get_pool_varieties(conn)}
+    finally:
+        conn.close()
+
+    trades = load_variety_trades(frames, Path(args.cache_dir))
+    detail = evaluate_walk_forward(
+        trades, names, args.train_months, args.test_months, args.pool_size, args.max_per_sector, args.min_trades
+    )
+    if detail.empty:
+        logger.info("没有可评估的理论交易")
+        return
+    ranking = out_of_sample_ranking(detail)
+
+    for test_start, g in detail.groupby("test_start"):
+        chosen = g[g["selected"] == 1]
+        logger.info(
+            "窗口 %s：建议 %d 个品种，测试期平均收益 %.2f%%（全品种 %.2f%%）：%s",
+            test_start, len(chosen),
+            100 * chosen["test_ret"].mean() if len(chosen) else 0.0, 100 * g["test_ret"].mean(),
+            "、".join(chosen["variety_name"]),
+        )
+    latest = detail[detail["test_start"] == detail["test_start"].max()]
+    proposed = set(latest.loc[latest["selected"] == 1, "variety_name"])
+    logger.info("最新窗口建议启用：%s", "、".join(sorted(proposed - active)) or "无")
+    logger.info("最新窗口建议停用：%s", "、".join(sorted(active - proposed)) or "无")
+
+    if args.out:
+        out = Path(args.out)
+        out.mkdir(parents=True, exist_ok=True)
+        detail.to_csv(out / "windows.csv", index=False)
+        ranking.to_csv(out / "ranking.csv", index=False)
+        logger.info("结果已写出到 %s", out)
+
+
+if __name__ == "__main__":
+    main()
@@ -83,6 +83,7 @@ export const getTradingPositionsApi = `${BASE_URL_API_A}/trading/positions`;
 export const getTradingPositionsHistoryApi = `${BASE_URL_API_A}/trading/positions/history`;
 export const getTradingAccountCurveApi = `${BASE_URL_API_A}/trading/account/curve`;
 export const getTradingAccountSummaryApi = `${BASE_URL_API_A}/trading/account/summary`;
+export const getTradingAccountMetricsApi = `${BASE_URL_API_A}/trading/account/metrics`;
 export const getTradingPoolApi = `${BASE_URL_API_A}/trading/pool`;
 export const patchTradingPoolApi = (varietyId) => `${BASE_URL_API_A}/trading/pool/variety/${varietyId}`;
 export const getTradingMarketContextApi = `${BASE_URL_API_A}/trading/market-context`;